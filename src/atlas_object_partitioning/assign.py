@@ -0,0 +1,260 @@
+from typing import Dict, Iterable, Iterator, List, Mapping, Tuple, Union
+
+import os
+
+import awkward as ak
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import yaml
+
+from atlas_object_partitioning.columns import CountTable
+from atlas_object_partitioning.composite import (
+    composite_components,
+    composite_values,
+    is_composite,
+)
+from atlas_object_partitioning.histograms import (
+    BinBoundaries,
+    MergedCellGroup,
+    _MAX_LOOKUP_RANGE,
+    cell_group_labels,
+)
+
+# Events read from the input parquet file at a time.
+DEFAULT_ASSIGN_CHUNK_SIZE = 1_000_000
+
+# Rows per parquet row group in group-partitioned datasets; smaller row groups
+# give readers finer-grained min/max statistics to skip on.
+DEFAULT_ROW_GROUP_SIZE = 64 * 1024
+
+# Axes with at most this many edges are binned by comparing against each edge.
+_MAX_COMPARE_EDGES = 16
+
+# Events routed together through all axes before moving on.
+_BLOCK_SIZE = 1 << 15
+
+Columns = Union[CountTable, ak.Array, pa.RecordBatch, pa.Table, Mapping[str, np.ndarray]]
+
+
+def _fields(data: Columns) -> List[str]:
+    if isinstance(data, (pa.RecordBatch, pa.Table)):
+        return list(data.schema.names)
+    if isinstance(data, (CountTable, ak.Array)):
+        return list(data.fields)
+    return list(data)
+
+
+def _column(data: Columns, axis: str) -> np.ndarray:
+    if is_composite(axis) and axis not in _fields(data):
+        # Counts saved before fusing hold only the components.
+        components = composite_components(axis)
+        return composite_values({c: _column(data, c) for c in components}, axis)
+    if isinstance(data, (pa.RecordBatch, pa.Table)):
+        column = data.column(axis)
+        if isinstance(column, pa.ChunkedArray):
+            return column.to_numpy()
+        return column.to_numpy(zero_copy_only=False)
+    if isinstance(data, ak.Array):
+        return ak.to_numpy(data[axis])
+    return np.asarray(data[axis])
+
+
+def _group_dtype(n_groups: int) -> np.dtype:
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_groups <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class PartitionAssigner:
+    """Route events to the merged group of the grid cell they fall in.
+
+    Everything that does not depend on the events is precomputed: per axis, a
+    table from bin index to the offset of that bin in the raveled grid (fused
+    with the value -> bin lookup table for integer axes), and the cell -> group
+    label array. Offsets of out-of-range values are large enough that any event
+    outside the grid lands on a sentinel cell whose label is -1, so assigning a
+    chunk is a couple of passes per axis with no masking.
+
+    With ``clip_overflow`` values past the last (first) edge go to the last
+    (first) bin instead, as they do when tail-capped counts are binned.
+    """
+
+    def __init__(
+        self,
+        boundaries: Dict[str, List[float]],
+        groups: List[MergedCellGroup],
+        clip_overflow: bool = False,
+    ):
+        self.boundaries = {axis: list(edges) for axis, edges in boundaries.items()}
+        self.axes = list(self.boundaries)
+        self.shape = tuple(len(edges) - 1 for edges in self.boundaries.values())
+        self.n_groups = len(groups)
+        self.dtype = _group_dtype(self.n_groups)
+        self._n_cells = int(np.prod(self.shape))
+        # Per axis: bin index (0 underflow, len(edges) overflow) -> cell offset.
+        self._offsets: Dict[str, np.ndarray] = {}
+        # Per integer-edged axis: (first value - 1, value position -> cell offset).
+        self._lookups: Dict[str, Tuple[int, np.ndarray]] = {}
+        strides = np.cumprod((self.shape[1:] + (1,))[::-1])[::-1]
+        for axis, size, stride in zip(self.axes, self.shape, strides):
+            offsets = np.full(size + 2, self._n_cells, dtype=np.int64)
+            offsets[1:-1] = np.arange(size, dtype=np.int64) * int(stride)
+            if clip_overflow:
+                offsets[0], offsets[-1] = offsets[1], offsets[-2]
+            self._offsets[axis] = offsets
+            edges = self.boundaries[axis]
+            lo, hi = edges[0], edges[-1]
+            if all(float(edge).is_integer() for edge in edges) and hi - lo <= _MAX_LOOKUP_RANGE:
+                values = np.arange(int(lo) - 1, int(hi) + 1)
+                bins = np.searchsorted(np.asarray(edges, dtype=float), values, side="right")
+                self._lookups[axis] = (int(lo) - 1, offsets[bins])
+        labels = cell_group_labels(groups, self.axes, self.shape)
+        self._labels = np.append(labels, -1).astype(self.dtype)
+
+    def _add_axis_offsets(self, axis: str, values: np.ndarray, cells: np.ndarray) -> None:
+        if axis in self._lookups and np.issubdtype(values.dtype, np.integer):
+            start, lookup = self._lookups[axis]
+            positions = np.subtract(values, start, dtype=np.int64)
+            np.clip(positions, 0, len(lookup) - 1, out=positions)
+            cells += lookup.take(positions)
+            return
+        edges = self.boundaries[axis]
+        if len(edges) <= _MAX_COMPARE_EDGES:
+            # Counting edges <= value is searchsorted(side="right") without the
+            # binary search; NaN counts as underflow, which is outside the grid too.
+            idx = np.zeros(len(values), dtype=np.int8)
+            for edge in edges:
+                idx += values >= edge
+        else:
+            idx = np.searchsorted(np.asarray(edges, dtype=float), values, side="right")
+        cells += self._offsets[axis].take(idx)
+
+    @classmethod
+    def from_yaml(cls, file_path: str, clip_overflow: bool = False) -> "PartitionAssigner":
+        """Load boundaries and merged groups from a ``bin_boundaries.yaml`` file."""
+        with open(file_path) as f:
+            data = BinBoundaries.model_validate(yaml.safe_load(f))
+        if data.merged_cells is None:
+            raise ValueError(f"{file_path} does not contain merged cell groups.")
+        return cls(
+            {axis: list(edges) for axis, edges in data.axes.items()},
+            data.merged_cells.groups,
+            clip_overflow=clip_overflow,
+        )
+
+    def cells(self, data: Columns) -> np.ndarray:
+        """Raveled cell index per event, or ``n_cells`` for events outside the grid."""
+        columns = [_column(data, axis) for axis in self.axes]
+        n_events = len(columns[0]) if columns else 0
+        cells = np.zeros(n_events, dtype=np.int64)
+        # Work through the events in blocks so the temporaries of every axis
+        # stay in cache instead of streaming full-length arrays through memory.
+        for start in range(0, n_events, _BLOCK_SIZE):
+            block = slice(start, start + _BLOCK_SIZE)
+            for axis, values in zip(self.axes, columns):
+                self._add_axis_offsets(axis, values[block], cells[block])
+        return np.minimum(cells, self._n_cells, out=cells)
+
+    def groups_of_cells(self, cells: np.ndarray) -> np.ndarray:
+        """Merged-group id for each :meth:`cells` index."""
+        return self._labels[cells]
+
+    def assign(self, data: Columns) -> np.ndarray:
+        """Merged-group id per event (-1 outside the grid or in no group)."""
+        return self.groups_of_cells(self.cells(data))
+
+    def assign_batches(self, batches: Iterable[Columns]) -> Iterator[np.ndarray]:
+        for batch in batches:
+            yield self.assign(batch)
+
+
+def assign_parquet(
+    assigner: PartitionAssigner,
+    input_file: str,
+    output_file: str,
+    column: str = "group",
+    chunk_size: int = DEFAULT_ASSIGN_CHUNK_SIZE,
+) -> np.ndarray:
+    """Stream ``input_file`` in chunks and write one group-id column per event
+    to ``output_file``, in input order. Returns the number of events per group,
+    with events in no group counted in the last entry."""
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be >= 1")
+    parquet_file = pq.ParquetFile(input_file)
+    # Composite axes not stored in the file are computed from their components.
+    names = parquet_file.schema_arrow.names
+    read_axes = list(
+        dict.fromkeys(
+            c
+            for axis in assigner.axes
+            for c in ([axis] if axis in names else composite_components(axis))
+        )
+    )
+    missing = [axis for axis in read_axes if axis not in names]
+    if missing:
+        raise ValueError(f"{input_file} is missing axes: {', '.join(missing)}")
+    schema = pa.schema([(column, pa.from_numpy_dtype(assigner.dtype))])
+    totals = np.zeros(assigner.n_groups + 1, dtype=np.int64)
+    with pq.ParquetWriter(output_file, schema) as writer:
+        batches = parquet_file.iter_batches(batch_size=chunk_size, columns=read_axes)
+        for groups in assigner.assign_batches(batches):
+            in_group = np.where(groups >= 0, groups, assigner.n_groups)
+            totals += np.bincount(in_group, minlength=assigner.n_groups + 1)
+            writer.write_table(pa.table({column: groups}, schema=schema))
+    return totals
+
+
+def _to_table(chunk: Columns) -> pa.Table:
+    if isinstance(chunk, pa.Table):
+        return chunk
+    if isinstance(chunk, CountTable):
+        return chunk.to_arrow()
+    if isinstance(chunk, pa.RecordBatch):
+        return pa.Table.from_batches([chunk])
+    if isinstance(chunk, ak.Array):
+        return ak.to_arrow_table(chunk, extensionarray=False)
+    return pa.table({name: np.asarray(values) for name, values in chunk.items()})
+
+
+def write_group_dataset(
+    assigner: PartitionAssigner,
+    chunks: Iterable[Columns],
+    base_dir: str,
+    column: str = "group",
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> np.ndarray:
+    """Write every column of ``chunks`` as a hive-style parquet dataset
+    partitioned by merged-group id (``base_dir/group=<id>/part-<chunk>.parquet``).
+
+    Within each file rows are sorted by grid cell, so the min/max statistics of
+    each row group are tight on the partition axes. Read back with
+    ``pyarrow.dataset.dataset(base_dir, partitioning="hive")`` and filter on
+    ``column`` to open only the groups a selection needs. Returns the number of
+    events per group, with events in no group counted in the last entry.
+    """
+    if os.path.isdir(base_dir) and os.listdir(base_dir):
+        raise ValueError(f"{base_dir} already exists and is not empty.")
+    totals = np.zeros(assigner.n_groups + 1, dtype=np.int64)
+    for index, chunk in enumerate(chunks):
+        table = _to_table(chunk)
+        if column in table.column_names:
+            raise ValueError(f"Counts already have a column named {column}.")
+        cells = assigner.cells(table)
+        groups = assigner.groups_of_cells(cells)
+        order = np.lexsort((cells, groups))
+        groups = groups[order]
+        table = table.take(pa.array(order))
+        ids, starts, sizes = np.unique(groups, return_index=True, return_counts=True)
+        for gid, start, size in zip(ids.tolist(), starts.tolist(), sizes.tolist()):
+            group_dir = os.path.join(base_dir, f"{column}={gid}")
+            os.makedirs(group_dir, exist_ok=True)
+            pq.write_table(
+                table.slice(start, size),
+                os.path.join(group_dir, f"part-{index}.parquet"),
+                row_group_size=row_group_size,
+                write_statistics=True,
+            )
+            totals[gid if gid >= 0 else assigner.n_groups] += size
+    return totals
@@ -0,0 +1,73 @@
+import re
+from typing import Dict, Optional, Union
+
+import yaml
+from pydantic import BaseModel, model_validator
+
+from atlas_object_partitioning.composite import COMPOSITE_SEPARATOR
+
+_AXIS_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class AxisDefinition(BaseModel):
+    """One axis of an axis catalog.
+
+    Either a full FuncADL ``expression`` in terms of the event ``e``, or the
+    number of objects of ``collection`` (e.g. ``Jets('AnalysisLargeRJets')``)
+    passing the optional ``where`` condition on the object ``o``.
+    """
+
+    expression: Optional[str] = None
+    collection: Optional[str] = None
+    where: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _one_source(self) -> "AxisDefinition":
+        if (self.expression is None) == (self.collection is None):
+            raise ValueError("an axis needs exactly one of 'expression' and 'collection'.")
+        if self.where is not None and self.collection is None:
+            raise ValueError("'where' needs a 'collection'.")
+        return self
+
+    def to_expression(self) -> str:
+        if self.expression is not None:
+            return self.expression
+        objects = f"e.{self.collection}"
+        if self.where is not None:
+            objects += f".Where(lambda o: {self.where})"
+        return f"{objects}.Count()"
+
+
+class AxisCatalog(BaseModel):
+    axes: Dict[str, Union[str, AxisDefinition]]
+
+
+def catalog_expressions(catalog: AxisCatalog) -> Dict[str, str]:
+    """FuncADL expression per axis, in catalog order."""
+    if not catalog.axes:
+        raise ValueError("The axis catalog has no axes.")
+    bad = [name for name in catalog.axes if not _AXIS_NAME.match(name)]
+    if bad:
+        raise ValueError(f"Axis names must be identifiers: {', '.join(bad)}")
+    reserved = [name for name in catalog.axes if COMPOSITE_SEPARATOR in name]
+    if reserved:
+        raise ValueError(
+            f"Axis names cannot contain '{COMPOSITE_SEPARATOR}', which names composite axes: "
+            f"{', '.join(reserved)}"
+        )
+    return {
+        name: axis if isinstance(axis, str) else axis.to_expression()
+        for name, axis in catalog.axes.items()
+    }
+
+
+def load_axis_catalog(file_path: str) -> Dict[str, str]:
+    """Load an axis catalog YAML file into a FuncADL expression per axis.
+
+    Every axis of the catalog is computed by one count query (see
+    :func:`scan_ds.build_count_query_lambda`), so the catalog can hold several
+    variants of a count (pT thresholds, mass windows, lepton working points)
+    and any subset of them can be partitioned on without a new transform.
+    """
+    with open(file_path) as f:
+        return catalog_expressions(AxisCatalog.model_validate(yaml.safe_load(f)))
@@ -0,0 +1,146 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import uproot
+from hist import BaseHist
+
+from atlas_object_partitioning.columns import CountTable, _is_parquet, _tree_name
+from atlas_object_partitioning.histograms import apply_tail_caps, build_nd_histogram
+from atlas_object_partitioning.sketches import (
+    DEFAULT_KLL_K,
+    Sketch,
+    build_sketches,
+    cap_sketches,
+    merge_sketches,
+)
+
+# Number of events read from a delivered file at a time.
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+
+def iterate_count_file(
+    path: str,
+    fields: List[str],
+    step_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[CountTable]:
+    """Yield the ``fields`` of one delivered count file, ``step_size`` events at a time.
+
+    Chunks always have ``fields`` in the order given, whatever the file layout.
+    Parquet batches are wrapped without copying; ROOT chunks share the arrays
+    uproot decodes.
+    """
+    if _is_parquet(path):
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=step_size, columns=fields):
+            yield CountTable(pa.Table.from_batches([batch]))[fields]
+    else:
+        tree = f"{path}:{_tree_name(path)}"
+        for chunk in uproot.iterate(tree, fields, step_size=step_size, library="np"):
+            yield CountTable.from_columns({field: chunk[field] for field in fields})
+
+
+def _file_chunks(path, fields, step_size, caps) -> Iterator[CountTable]:
+    for chunk in iterate_count_file(path, fields, step_size):
+        if caps:
+            chunk, _ = apply_tail_caps(chunk, caps=caps)
+        yield chunk
+
+
+def _file_sketches(path, fields, step_size, caps, k) -> Dict[str, Sketch]:
+    sketches = merge_sketches(
+        build_sketches(chunk, axes=fields, k=k)
+        for chunk in iterate_count_file(path, fields, step_size)
+    )
+    return cap_sketches(sketches, caps) if sketches else sketches
+
+
+def _file_histogram(path, fields, step_size, caps, boundaries) -> Optional[BaseHist]:
+    hist = None
+    for chunk in iterate_count_file(path, fields, step_size):
+        # Files are already spread over worker processes, so fill on one thread.
+        chunk_hist = build_nd_histogram(chunk, boundaries, threads=1, caps=caps)
+        hist = chunk_hist if hist is None else hist + chunk_hist
+    return hist
+
+
+class ChunkedCounts:
+    """Lazy, out-of-core view of the per-event counts in a set of delivered files.
+
+    Nothing is loaded up front. Each operation streams every file in chunks of
+    ``step_size`` events, so memory is bounded by the chunk size (times the
+    number of workers) rather than by the dataset size. Files are processed in
+    parallel on ``workers`` local processes and the per-file results (sketches,
+    histograms) are merged. Tail caps are applied when chunks are binned or
+    sketched; only iterating over a capped view materializes capped chunks.
+    """
+
+    def __init__(
+        self,
+        paths: List[str],
+        fields: List[str],
+        step_size: int = DEFAULT_CHUNK_SIZE,
+        workers: Optional[int] = None,
+        caps: Optional[Dict[str, float]] = None,
+    ):
+        if step_size < 1:
+            raise ValueError("step_size must be >= 1")
+        self.paths = list(paths)
+        self._fields = list(fields)
+        self.step_size = step_size
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.caps: Dict[str, float] = dict(caps) if caps else {}
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self._fields)
+
+    def with_caps(self, caps: Dict[str, float]) -> "ChunkedCounts":
+        """Return a view of the counts capped at ``caps``."""
+        return ChunkedCounts(
+            self.paths, self._fields, self.step_size, self.workers, {**self.caps, **caps}
+        )
+
+    def __iter__(self) -> Iterator[CountTable]:
+        for path in self.paths:
+            yield from _file_chunks(path, self._fields, self.step_size, self.caps)
+
+    def _map_files(self, func: Callable, *args) -> list:
+        jobs = [(path, self._fields, self.step_size, self.caps) + args for path in self.paths]
+        if self.workers <= 1 or len(jobs) <= 1:
+            return [func(*job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+            futures = [pool.submit(func, *job) for job in jobs]
+            return [future.result() for future in futures]
+
+    def sketches(self, k: int = DEFAULT_KLL_K) -> Dict[str, Sketch]:
+        """Build per-file sketches and merge them."""
+        return merge_sketches(s for s in self._map_files(_file_sketches, k) if s)
+
+    def build_nd_histogram(self, boundaries: Dict[str, List[float]]) -> BaseHist:
+        """Chunked equivalent of :func:`build_nd_histogram`."""
+        hists = [h for h in self._map_files(_file_histogram, boundaries) if h is not None]
+        if not hists:
+            return build_nd_histogram(
+                CountTable.from_columns({ax: np.zeros(0) for ax in boundaries}), boundaries
+            )
+        total = hists[0]
+        for h in hists[1:]:
+            total = total + h
+        return total
+
+    def to_parquet(self, file_path: str) -> None:
+        """Stream all chunks into a single parquet file."""
+        writer = None
+        try:
+            for chunk in self:
+                table = chunk.to_arrow()
+                if writer is None:
+                    writer = pq.ParquetWriter(file_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
@@ -0,0 +1,144 @@
+from typing import Dict, List, Mapping, Optional, Sequence, Union
+
+import awkward as ak
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import uproot
+
+
+def _is_parquet(path: str) -> bool:
+    return ".parquet" in path or path.endswith(".pq")
+
+
+def _tree_name(path: str) -> str:
+    with uproot.open(path) as f:
+        for key, classname in f.classnames().items():
+            if "TTree" in classname or "RNTuple" in classname:
+                return key.split(";")[0]
+    raise RuntimeError(f"No TTree or RNTuple found in {path}.")
+
+
+class CountTable:
+    """Per-event counts held in an Arrow table.
+
+    Every column is kept as a single contiguous Arrow buffer and ``table[axis]``
+    hands it to NumPy as a read-only zero-copy view, so boundaries, histograms
+    and sketches read the delivered buffers directly rather than an awkward
+    copy of them. The table supports the parts of the :class:`awkward.Array`
+    interface the partitioning code relies on: ``fields``, ``len``,
+    ``table[axis]``, ``table[[axes]]`` and ``table[start:stop]``, the last two
+    also without copying.
+    """
+
+    def __init__(self, table: pa.Table):
+        # Columns that are already a single chunk are not copied.
+        self._table = table.combine_chunks()
+        self._views: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_columns(cls, columns: Mapping[str, np.ndarray]) -> "CountTable":
+        """Wrap NumPy columns; the table shares their memory."""
+        return cls(pa.table({name: np.asarray(values) for name, values in columns.items()}))
+
+    @classmethod
+    def from_awkward(cls, data: ak.Array) -> "CountTable":
+        """Wrap a flat awkward record array; the table shares its buffers."""
+        return cls(ak.to_arrow_table(data, extensionarray=False).replace_schema_metadata())
+
+    @classmethod
+    def from_parquet(cls, file_path: str, columns: Optional[List[str]] = None) -> "CountTable":
+        return cls(pq.read_table(file_path, columns=columns))
+
+    @classmethod
+    def concatenate(cls, tables: Sequence["CountTable"]) -> "CountTable":
+        """Stack tables with the same fields, in the field order of the first
+        (one copy of every column)."""
+        if not tables:
+            return cls(pa.table({}))
+        fields = tables[0].fields
+        return cls(pa.concat_tables([table.to_arrow().select(fields) for table in tables]))
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self._table.column_names)
+
+    def __len__(self) -> int:
+        return self._table.num_rows
+
+    def __repr__(self) -> str:
+        return f"CountTable({len(self):,} events: {', '.join(self.fields)})"
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only NumPy view of one column (a copy only for nulls or booleans)."""
+        view = self._views.get(name)
+        if view is None:
+            view = self._table.column(name).to_numpy()
+            self._views[name] = view
+        return view
+
+    def __getitem__(self, key: Union[str, slice, Sequence[str]]):
+        if isinstance(key, str):
+            return self.column(key)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("CountTable slices must be contiguous.")
+            return CountTable(self._table.slice(start, max(stop - start, 0)))
+        return CountTable(self._table.select(list(key)))
+
+    def with_columns(self, columns: Mapping[str, np.ndarray]) -> "CountTable":
+        """Return a table with ``columns`` appended (or replaced)."""
+        table = self._table
+        for name, values in columns.items():
+            array = pa.array(np.asarray(values))
+            if name in table.column_names:
+                table = table.set_column(table.column_names.index(name), name, array)
+            else:
+                table = table.append_column(name, array)
+        return CountTable(table)
+
+    def to_arrow(self) -> pa.Table:
+        return self._table
+
+    def to_parquet(self, file_path: str) -> None:
+        pq.write_table(self._table, file_path)
+
+
+CountsLike = Union[CountTable, ak.Array, pa.Table, pa.RecordBatch, Mapping[str, np.ndarray]]
+
+
+def as_count_table(data: CountsLike) -> CountTable:
+    """View ``data`` as a :class:`CountTable`, sharing its memory where possible."""
+    if isinstance(data, CountTable):
+        return data
+    if isinstance(data, ak.Array):
+        return CountTable.from_awkward(data)
+    if isinstance(data, pa.Table):
+        return CountTable(data)
+    if isinstance(data, pa.RecordBatch):
+        return CountTable(pa.Table.from_batches([data]))
+    return CountTable.from_columns(data)
+
+
+def read_count_file(path: str, fields: Optional[List[str]] = None) -> CountTable:
+    """Read one delivered count file (parquet or ROOT) into a :class:`CountTable`.
+
+    Parquet pages are decoded straight into Arrow buffers. ROOT baskets are
+    decoded by uproot into NumPy arrays, which the table then shares.
+    """
+    if _is_parquet(path):
+        return CountTable.from_parquet(path, columns=fields)
+    with uproot.open(path) as f:
+        tree = f[_tree_name(path)]
+        names = fields if fields is not None else list(tree.keys())
+        arrays = tree.arrays(names, library="np")
+    return CountTable.from_columns({name: arrays[name] for name in names})
+
+
+def read_count_files(paths: List[str], fields: Optional[List[str]] = None) -> CountTable:
+    """Read and stack delivered count files; a single file is not copied again."""
+    tables = [read_count_file(path, fields) for path in paths]
+    if len(tables) == 1:
+        return tables[0]
+    return CountTable.concatenate(tables)
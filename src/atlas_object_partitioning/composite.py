@@ -0,0 +1,147 @@
+import math
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from atlas_object_partitioning.columns import CountsLike, CountTable, as_count_table
+
+# Composite axes are named after their components joined with this separator. It
+# must survive URL query strings (where "+" is a space) and shells unquoted.
+COMPOSITE_SEPARATOR = "__"
+
+# A composite value is a number in this base whose digits are the counts of every
+# component but the first, then the total. Each count must be below it.
+COMPOSITE_RADIX = 1000
+
+
+def composite_axis_name(components: Sequence[str]) -> str:
+    return COMPOSITE_SEPARATOR.join(components)
+
+
+def composite_components(axis: str) -> List[str]:
+    """Components of ``axis``; a plain axis is its own single component."""
+    return axis.split(COMPOSITE_SEPARATOR)
+
+
+def is_composite(axis: str) -> bool:
+    return COMPOSITE_SEPARATOR in axis
+
+
+def input_axes(axes: Sequence[str]) -> List[str]:
+    """The count columns needed to compute ``axes``, in order and without repeats."""
+    return list(dict.fromkeys(c for axis in axes for c in composite_components(axis)))
+
+
+def composite_total(columns: Dict[str, np.ndarray], axis: str) -> np.ndarray:
+    """Total number of objects over the components of a composite axis."""
+    total = np.zeros(len(columns[composite_components(axis)[0]]), dtype=np.int64)
+    for component in composite_components(axis):
+        values = columns[component]
+        if not np.issubdtype(values.dtype, np.integer):
+            raise ValueError(f"Composite axes combine object counts; {component} is not a count.")
+        total += values
+    return total
+
+
+def composite_values(columns: Dict[str, np.ndarray], axis: str) -> np.ndarray:
+    """Value of a composite axis: the component counts as one lexicographic code.
+
+    The code orders events by each component but the first, then by the total,
+    so every interval of codes holds a known set of component counts.
+    """
+    components = composite_components(axis)
+    digits = {c: columns[c] for c in components[1:]}
+    digits[f"the total of {axis}"] = composite_total(columns, axis)
+    code = np.zeros(len(columns[components[0]]), dtype=np.int64)
+    for name, values in digits.items():
+        if len(values) and (values.min() < 0 or values.max() >= COMPOSITE_RADIX):
+            raise ValueError(
+                f"Composite axes need counts from 0 to {COMPOSITE_RADIX - 1}; "
+                f"{name} is out of range."
+            )
+        code = code * COMPOSITE_RADIX + values
+    return code
+
+
+def can_pass(axis: str, lo: float, hi: float, cuts: Dict[str, float]) -> bool:
+    """Whether values of ``axis`` in ``[lo, hi)`` can belong to events passing the
+    inclusive (>= value) ``cuts``.
+
+    On a composite axis the cuts on its components are evaluated on the counts
+    the codes in the interval stand for, and a cut on the axis itself is a cut
+    on their total.
+    """
+    if not is_composite(axis):
+        return axis not in cuts or hi > cuts[axis]
+    components = composite_components(axis)
+    n_digits = len(components)
+    first = max(math.ceil(lo), 0)
+    last = min(math.ceil(hi) - 1, COMPOSITE_RADIX**n_digits - 1)
+    if first > last:
+        return False
+
+    def digits(code: int) -> List[int]:
+        return [
+            code // COMPOSITE_RADIX ** (n_digits - 1 - i) % COMPOSITE_RADIX
+            for i in range(n_digits)
+        ]
+
+    first_digits, last_digits = digits(first), digits(last)
+    minimum = [max(math.ceil(cuts.get(c, 0)), 0) for c in components]
+    min_total = math.ceil(cuts.get(axis, 0))
+
+    def search(i: int, low: bool, high: bool, used: int) -> bool:
+        # Digits before ``i`` are chosen and sum to ``used``; ``low`` and ``high``
+        # say whether they equal the leading digits of ``first`` and ``last``.
+        lo_digit = first_digits[i] if low else 0
+        hi_digit = last_digits[i] if high else COMPOSITE_RADIX - 1
+        if i == n_digits - 1:
+            # The total leaves the first component its count, so take it largest.
+            return max(lo_digit, min_total, minimum[0] + used) <= hi_digit
+        # Smaller counts leave more room for the total; one more frees the digits
+        # after this one from the lower end of the interval.
+        start = max(lo_digit, minimum[i + 1])
+        return any(
+            search(i + 1, low and d == first_digits[i], high and d == last_digits[i], used + d)
+            for d in (start, start + 1)
+            if d <= hi_digit
+        )
+
+    return search(0, True, True, 0)
+
+
+def add_composite_axes(data: CountsLike, composites: List[List[str]]) -> CountTable:
+    """Append one column per composite axis to the counts in ``data``.
+
+    A composite axis fuses correlated counts (e.g. jets and large-R jets) into
+    one grid dimension. Its value (see :func:`composite_values`) orders events
+    on the joint counts, so equal-frequency bins of it are equal-frequency
+    regions of the joint distribution. That leaves none of the structurally
+    empty cells that binning the counts as independent axes gives.
+    """
+    table = as_count_table(data)
+    used: List[str] = []
+    for components in composites:
+        if len(components) < 2:
+            raise ValueError("A composite axis needs at least two components.")
+        nested = [c for c in components if is_composite(c)]
+        if nested:
+            raise ValueError(
+                f"Composite components cannot contain '{COMPOSITE_SEPARATOR}': {', '.join(nested)}"
+            )
+        missing = [c for c in components if c not in table.fields]
+        if missing:
+            raise ValueError(f"Counts are missing composite components: {', '.join(missing)}")
+        shared = [c for c in components if c in used or components.count(c) > 1]
+        if shared:
+            raise ValueError(f"Axes are in more than one composite axis: {', '.join(shared)}")
+        used += components
+    columns = {c: table[c] for c in used}
+    return table.with_columns(
+        {
+            composite_axis_name(components): composite_values(
+                columns, composite_axis_name(components)
+            )
+            for components in composites
+        }
+    )
@@ -0,0 +1,257 @@
+import json
+from typing import Dict, Iterable, List, Tuple
+
+import awkward as ak
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from atlas_object_partitioning.assign import PartitionAssigner
+
+# Default file names, written next to bin_boundaries.yaml.
+DEFAULT_EVENT_INDEX_FILE = "event_index.parquet"
+DEFAULT_FILE_COMPOSITION_FILE = "file_composition.parquet"
+
+
+class EventIndex:
+    """Per merged group, the entry ranges ``[start, stop)`` its events occupy in
+    each source (input PHYSLITE) file.
+
+    Consecutive entries of a group in a file collapse into one range, so the
+    index is a run-length encoded bitmap of (group, file, entry): small when
+    groups cluster in entry order and never bigger than one row per event.
+    Events outside the grid are kept under group -1.
+
+    ``exact`` is False when the entries were not checked against the input
+    files (see :func:`scan_ds.check_entries`), so the ranges are approximate.
+    """
+
+    def __init__(
+        self,
+        files: List[str],
+        group: np.ndarray,
+        file_index: np.ndarray,
+        start: np.ndarray,
+        stop: np.ndarray,
+        exact: bool = True,
+    ):
+        self.files = list(files)
+        self.exact = exact
+        self.group = np.asarray(group, dtype=np.int32)
+        self.file_index = np.asarray(file_index, dtype=np.int32)
+        self.start = np.asarray(start, dtype=np.int64)
+        self.stop = np.asarray(stop, dtype=np.int64)
+
+    @classmethod
+    def build(
+        cls,
+        files: List[str],
+        group: np.ndarray,
+        file_index: np.ndarray,
+        entry: np.ndarray,
+        exact: bool = True,
+    ) -> "EventIndex":
+        """Build the index from the group, file index and entry of every event."""
+        group = np.asarray(group, dtype=np.int64)
+        file_index = np.asarray(file_index, dtype=np.int64)
+        entry = np.asarray(entry, dtype=np.int64)
+        if len(group) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(files, empty, empty, empty, empty, exact)
+        if file_index.min() < 0 or file_index.max() >= len(files):
+            raise ValueError("file_index values must index into files.")
+        order = np.lexsort((entry, file_index, group))
+        group, file_index, entry = group[order], file_index[order], entry[order]
+        # A new range starts wherever the group or file changes or entries skip.
+        new_run = np.ones(len(entry), dtype=bool)
+        new_run[1:] = (
+            (group[1:] != group[:-1])
+            | (file_index[1:] != file_index[:-1])
+            | (entry[1:] != entry[:-1] + 1)
+        )
+        starts = np.flatnonzero(new_run)
+        ends = np.append(starts[1:], len(entry)) - 1
+        return cls(files, group[starts], file_index[starts], entry[starts], entry[ends] + 1, exact)
+
+    @classmethod
+    def from_counts(
+        cls,
+        assigner: PartitionAssigner,
+        counts: ak.Array,
+        files: List[str],
+        exact: bool = True,
+    ) -> "EventIndex":
+        """Index counts that carry ``file_index`` and ``entry`` columns (see
+        :func:`scan_ds.collect_object_counts_with_provenance`)."""
+        missing = [name for name in ("file_index", "entry") if name not in counts.fields]
+        if missing:
+            raise ValueError(f"Counts have no provenance columns: {', '.join(missing)}")
+        return cls.build(
+            files,
+            assigner.assign(counts),
+            ak.to_numpy(counts["file_index"]),
+            ak.to_numpy(counts["entry"]),
+            exact,
+        )
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def ranges(self, groups: Iterable[int]) -> Dict[str, List[Tuple[int, int]]]:
+        """Sorted, coalesced entry ranges to read per file for ``groups``."""
+        mask = np.isin(self.group, np.fromiter(groups, dtype=np.int64))
+        file_index, start, stop = self.file_index[mask], self.start[mask], self.stop[mask]
+        order = np.lexsort((start, file_index))
+        result: Dict[str, List[Tuple[int, int]]] = {}
+        for fi, lo, hi in zip(
+            file_index[order].tolist(), start[order].tolist(), stop[order].tolist()
+        ):
+            file_ranges = result.setdefault(self.files[fi], [])
+            if file_ranges and file_ranges[-1][1] >= lo:
+                file_ranges[-1] = (file_ranges[-1][0], max(file_ranges[-1][1], hi))
+            else:
+                file_ranges.append((lo, hi))
+        return result
+
+    def n_entries(self, groups: Iterable[int]) -> int:
+        mask = np.isin(self.group, np.fromiter(groups, dtype=np.int64))
+        return int((self.stop[mask] - self.start[mask]).sum())
+
+    def write(self, file_path: str) -> None:
+        table = pa.table(
+            {
+                "group": self.group,
+                "file_index": self.file_index,
+                "start": self.start,
+                "stop": self.stop,
+            }
+        )
+        table = table.replace_schema_metadata(
+            {"files": json.dumps(self.files), "exact": json.dumps(self.exact)}
+        )
+        pq.write_table(table, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> "EventIndex":
+        table = pq.read_table(file_path)
+        metadata = table.schema.metadata or {}
+        if b"files" not in metadata:
+            raise ValueError(f"{file_path} is not an event index file.")
+        return cls(
+            json.loads(metadata[b"files"]),
+            table.column("group").to_numpy(),
+            table.column("file_index").to_numpy(),
+            table.column("start").to_numpy(),
+            table.column("stop").to_numpy(),
+            json.loads(metadata.get(b"exact", b"true")),
+        )
+
+
+class FileComposition:
+    """Number of events of each merged group in each source file.
+
+    ``counts[file, group]`` holds the events of ``group`` in ``files[file]``; the
+    last column counts events outside the grid. This is what decides how many
+    files a selection touches when storage is read file by file, so ``files``
+    are the input PHYSLITE files (see :func:`local_mode.source_files`), not the
+    delivered count files.
+    """
+
+    def __init__(self, files: List[str], counts: np.ndarray):
+        counts = np.asarray(counts, dtype=np.int64)
+        if counts.ndim != 2 or counts.shape[0] != len(files) or counts.shape[1] < 1:
+            raise ValueError("counts must have one row per file and one column per group.")
+        self.files = list(files)
+        self.counts = counts
+
+    @property
+    def n_groups(self) -> int:
+        return self.counts.shape[1] - 1
+
+    @classmethod
+    def build(
+        cls, files: List[str], n_groups: int, group: np.ndarray, file_index: np.ndarray
+    ) -> "FileComposition":
+        """Build from the group and file index of every event."""
+        group = np.asarray(group, dtype=np.int64)
+        file_index = np.asarray(file_index, dtype=np.int64)
+        if len(file_index) and (file_index.min() < 0 or file_index.max() >= len(files)):
+            raise ValueError("file_index values must index into files.")
+        column = np.where(group >= 0, group, n_groups)
+        flat = np.bincount(
+            file_index * (n_groups + 1) + column, minlength=len(files) * (n_groups + 1)
+        )
+        return cls(files, flat.reshape(len(files), n_groups + 1))
+
+    @classmethod
+    def from_counts(
+        cls, assigner: PartitionAssigner, counts: ak.Array, files: List[str]
+    ) -> "FileComposition":
+        """Compose counts that carry a ``file_index`` column."""
+        if "file_index" not in counts.fields:
+            raise ValueError("Counts have no provenance column: file_index")
+        return cls.build(
+            files, assigner.n_groups, assigner.assign(counts), ak.to_numpy(counts["file_index"])
+        )
+
+    @classmethod
+    def from_event_index(cls, index: EventIndex, n_groups: int) -> "FileComposition":
+        column = np.where(index.group >= 0, index.group, n_groups).astype(np.int64)
+        counts = np.zeros((len(index.files), n_groups + 1), dtype=np.int64)
+        np.add.at(counts, (index.file_index, column), index.stop - index.start)
+        return cls(index.files, counts)
+
+    def read_cost(self, groups: Iterable[int]) -> Dict[str, float]:
+        """Files and events read to get every event of ``groups``.
+
+        ``files`` / ``events`` are for the current layout, where any file with
+        an event of a selected group is read whole. ``grouped_files`` /
+        ``grouped_events`` are for the same data rewritten with one set of files
+        per group, at the current mean number of events per file.
+        """
+        selected = np.unique(np.fromiter(groups, dtype=np.int64))
+        if len(selected) and (selected.min() < 0 or selected.max() >= self.n_groups):
+            raise ValueError("Group ids are out of range for this file composition.")
+        events_per_file = self.counts.sum(axis=1)
+        touched = self.counts[:, selected].sum(axis=1) > 0
+        mean_file_events = float(events_per_file.mean()) if len(self.files) else 0.0
+        group_events = self.counts[:, selected].sum(axis=0)
+        grouped_files = (
+            int(np.ceil(group_events / mean_file_events).sum()) if mean_file_events > 0 else 0
+        )
+        return {
+            "total_files": len(self.files),
+            "total_events": int(events_per_file.sum()),
+            "files": int(touched.sum()),
+            "events": int(events_per_file[touched].sum()),
+            "selected_events": int(group_events.sum()),
+            "grouped_files": grouped_files,
+            "grouped_events": int(group_events.sum()),
+        }
+
+    def write(self, file_path: str) -> None:
+        file_index, group = np.nonzero(self.counts)
+        table = pa.table(
+            {
+                "file_index": file_index.astype(np.int32),
+                "group": np.where(group < self.n_groups, group, -1).astype(np.int32),
+                "count": self.counts[file_index, group],
+            }
+        )
+        metadata = {"files": json.dumps(self.files), "n_groups": str(self.n_groups)}
+        pq.write_table(table.replace_schema_metadata(metadata), file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> "FileComposition":
+        table = pq.read_table(file_path)
+        metadata = table.schema.metadata or {}
+        if b"files" not in metadata or b"n_groups" not in metadata:
+            raise ValueError(f"{file_path} is not a file composition file.")
+        files = json.loads(metadata[b"files"])
+        n_groups = int(metadata[b"n_groups"])
+        group = table.column("group").to_numpy()
+        counts = np.zeros((len(files), n_groups + 1), dtype=np.int64)
+        counts[table.column("file_index").to_numpy(), np.where(group >= 0, group, n_groups)] = (
+            table.column("count").to_numpy()
+        )
+        return cls(files, counts)
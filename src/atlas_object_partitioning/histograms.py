@@ -1,5 +1,7 @@
+import os
 import pickle
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 
 import awkward as ak
 import numpy as np
@@ -9,14 +11,51 @@ from pydantic import BaseModel, Field
 from rich.console import Console
 from rich.table import Table
 
+from atlas_object_partitioning import kernels
+from atlas_object_partitioning.columns import CountTable
+from atlas_object_partitioning.composite import can_pass
+
+
+# Number of events per slice when filling histograms from several threads.
+DEFAULT_FILL_CHUNK_SIZE = 1_000_000
+
+# Integer axes whose edges span more values than this use a binary search rather
+# than a value -> bin lookup table.
+_MAX_LOOKUP_RANGE = 1 << 20
+
+# Continuous axes draw at most this many values when computing equal-frequency
+# boundaries, which keeps memory bounded regardless of the number of events.
+DEFAULT_CONTINUOUS_SAMPLE_SIZE = 1_000_000
+
+
+def edge_value(edge) -> Union[int, float]:
+    """Return ``edge`` as an ``int`` when it is integral, else as a ``float``."""
+    value = float(edge)
+    if value.is_integer():
+        return int(value)
+    return value
+
+
+def _is_continuous(values: np.ndarray) -> bool:
+    return bool(np.issubdtype(values.dtype, np.floating))
+
 
-def _compute_boundaries(values: ak.Array, n_bins: int) -> List[int]:
+def _compute_boundaries(
+    values: np.ndarray,
+    n_bins: int,
+    weights: Optional[np.ndarray] = None,
+    cap: Optional[float] = None,
+) -> List[int]:
     """Compute boundary values that split the distribution into ``n_bins`` bins.
 
     Parameters
     ----------
-    values: ak.Array
+    values: np.ndarray
         Array of values for a single axis.
+    weights: np.ndarray, optional
+        Per-event weights; bins then hold equal total weight instead of equal counts.
+    cap: float, optional
+        Tail cap; values above it count as the cap value.
     Returns
     -------
     List[int]
@@ -26,16 +65,45 @@ def _compute_boundaries(values: ak.Array, n_bins: int) -> List[int]:
         raise ValueError("n_bins must be >= 1")
     if len(values) == 0:
         return []
-    min_val = int(ak.min(values))
-    max_val = int(ak.max(values))
-    bins = np.arange(min_val, max_val + 2)
-    hist, edges = np.histogram(values, bins=bins)
-    cdf = np.cumsum(hist)
+    # Count only the distinct values, so memory scales with the number of distinct
+    # counts rather than with the value range.
+    if weights is None:
+        unique_vals, unique_counts = np.unique(
+            np.asarray(values, dtype=np.int64), return_counts=True
+        )
+    else:
+        unique_vals, inverse = np.unique(np.asarray(values, dtype=np.int64), return_inverse=True)
+        unique_counts = np.bincount(inverse, weights=weights, minlength=len(unique_vals))
+    if cap is not None:
+        unique_vals, unique_counts = _fold_value_counts(unique_vals, unique_counts, int(cap))
+    return _boundaries_from_value_counts(unique_vals, unique_counts, n_bins)
+
+
+def _fold_value_counts(
+    unique_vals: np.ndarray, unique_counts: np.ndarray, cap: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct values and counts after capping the values at ``cap``."""
+    below = unique_vals < cap
+    if below.all():
+        return unique_vals, unique_counts
+    return (
+        np.append(unique_vals[below], cap),
+        np.append(unique_counts[below], unique_counts[~below].sum()),
+    )
+
+
+def _boundaries_from_value_counts(
+    unique_vals: np.ndarray, unique_counts: np.ndarray, n_bins: int
+) -> List[int]:
+    """Equal-population integer boundaries from sorted distinct values and their counts."""
+    min_val = int(unique_vals[0])
+    max_val = int(unique_vals[-1])
+    cdf = np.cumsum(unique_counts)
     step = cdf[-1] / n_bins
     boundaries: List[int] = []
     for i in range(1, n_bins):
         idx = int(np.searchsorted(cdf, step * i))
-        boundaries.append(int(edges[idx + 1]))
+        boundaries.append(int(unique_vals[idx]) + 1)
 
     # Always return [min, ...boundaries..., max+1]
     boundaries = [min_val] + boundaries + [max_val + 1]
@@ -46,22 +114,116 @@ def _compute_boundaries(values: ak.Array, n_bins: int) -> List[int]:
     return boundaries
 
 
+def _compute_continuous_boundaries(
+    values: np.ndarray,
+    n_bins: int,
+    sample_size: Optional[int] = DEFAULT_CONTINUOUS_SAMPLE_SIZE,
+    weights: Optional[np.ndarray] = None,
+    cap: Optional[float] = None,
+) -> List[float]:
+    """Compute equal-frequency float boundaries for a continuous axis.
+
+    If there are more than ``sample_size`` values a uniform random sample (fixed
+    seed) is used; the boundaries are then exact order statistics of that
+    sample, found with a partial sort. ``sample_size=None`` uses every value.
+    The first edge is the minimum and the last edge is just above the maximum,
+    so every value falls inside the ``[lo, hi)`` bins. With ``weights`` the
+    boundaries are weighted quantiles of the sample instead. Values above
+    ``cap`` count as the cap value.
+    """
+    if n_bins < 1:
+        raise ValueError("n_bins must be >= 1")
+    if len(values) == 0:
+        return []
+    min_val = float(np.min(values))
+    max_val = float(np.max(values))
+    if cap is not None:
+        min_val, max_val = min(min_val, cap), min(max_val, cap)
+    if sample_size is not None and len(values) > sample_size:
+        rng = np.random.default_rng(0)
+        picked = rng.choice(len(values), size=sample_size, replace=False)
+        sample = values[picked]
+        sample_weights = weights[picked] if weights is not None else None
+    else:
+        sample = np.array(values, dtype=float, copy=True)
+        sample_weights = weights
+    if cap is not None:
+        # The sample is already a copy, so cap it in place.
+        np.minimum(sample, cap, out=sample)
+    boundaries: List[float] = []
+    if sample_weights is not None:
+        order = np.argsort(sample, kind="stable")
+        sample = sample[order]
+        cumulative = np.cumsum(sample_weights[order], dtype=float)
+        targets = [cumulative[-1] * i / n_bins for i in range(1, n_bins)]
+        ranks = np.minimum(np.searchsorted(cumulative, targets, side="right"), len(sample) - 1)
+        boundaries = [float(sample[r]) for r in ranks]
+    else:
+        ranks = [int(len(sample) * i // n_bins) for i in range(1, n_bins)]
+        if ranks:
+            sample = np.partition(sample, ranks)
+            boundaries = [float(sample[r]) for r in ranks]
+    upper = float(np.nextafter(max_val, np.inf))
+    boundaries = [min_val] + [b for b in boundaries if min_val < b <= max_val] + [upper]
+    return sorted(set(boundaries))
+
+
 def compute_bin_boundaries(
     data: ak.Array,
     ignore_axes: Optional[List[str]] = None,
     bins_per_axis: int = 4,
     bins_per_axis_overrides: Optional[Dict[str, int]] = None,
-) -> Dict[str, List[int]]:
-    """Compute bin boundaries for all axes in the awkward array."""
+    continuous_sample_size: Optional[int] = DEFAULT_CONTINUOUS_SAMPLE_SIZE,
+    weights: Optional[np.ndarray] = None,
+    caps: Optional[Dict[str, float]] = None,
+) -> Dict[str, List[float]]:
+    """Compute bin boundaries for all axes in the awkward array (or :class:`CountTable`).
+
+    Integer axes get integer edges. Floating point axes (e.g. ``met``) get
+    equal-frequency float edges computed from at most ``continuous_sample_size``
+    values (``None`` to use all of them). With per-event ``weights`` (e.g. from
+    :func:`event_costs`) each bin holds an equal share of the total weight.
+    With tail ``caps`` (see :func:`compute_tail_caps`) the boundaries are those
+    of the capped counts, without building a capped copy of them.
+    """
+    if caps is None:
+        caps = {}
     if ignore_axes is None:
         ignore_axes = []
     if bins_per_axis_overrides is None:
         bins_per_axis_overrides = {}
-    missing = [ax for ax in ignore_axes if ax not in data.fields]
+    _check_axis_options(data.fields, ignore_axes, bins_per_axis_overrides)
+
+    result: Dict[str, List[float]] = {}
+    good_data_fields = [ax for ax in data.fields if ax not in ignore_axes]
+    for axis in good_data_fields:
+        axis_bins = bins_per_axis_overrides.get(axis, bins_per_axis)
+        values = ak.to_numpy(data[axis])
+        if _is_continuous(values):
+            result[axis] = _compute_continuous_boundaries(
+                values,
+                axis_bins,
+                sample_size=continuous_sample_size,
+                weights=weights,
+                cap=caps.get(axis),
+            )
+        else:
+            result[axis] = _compute_boundaries(
+                values, axis_bins, weights=weights, cap=caps.get(axis)
+            )
+    return result
+
+
+def _check_axis_options(
+    fields: List[str],
+    ignore_axes: List[str],
+    bins_per_axis_overrides: Dict[str, int],
+) -> None:
+    missing = [ax for ax in ignore_axes if ax not in fields]
     if len(missing) > 0:
         raise ValueError(f"Cannot ignore missing axes: {', '.join(missing)}")
     override_missing = [
-        ax for ax in bins_per_axis_overrides.keys() if ax not in data.fields
+        ax for ax in bins_per_axis_overrides.keys() if ax not in fields
     ]
     if len(override_missing) > 0:
         raise ValueError(
@@ -74,47 +236,72 @@ def compute_bin_boundaries(
             "Cannot override bins for ignored axes: " f"{', '.join(override_ignored)}"
         )
 
-    result: Dict[str, List[int]] = {}
-    good_data_fields = [ax for ax in data.fields if ax not in ignore_axes]
-    for axis in good_data_fields:
-        axis_bins = bins_per_axis_overrides.get(axis, bins_per_axis)
-        result[axis] = _compute_boundaries(data[axis], axis_bins)
-    return result
-
 
-def apply_tail_caps(
+def compute_tail_caps(
     data: ak.Array,
     ignore_axes: Optional[List[str]] = None,
     tail_cap_quantile: Optional[float] = None,
-) -> Tuple[ak.Array, Dict[str, int]]:
-    """Cap per-axis counts at a quantile to reduce long tails."""
+) -> Dict[str, float]:
+    """Cap value per axis at a quantile, for axes whose maximum lies above it.
+
+    The counts are left untouched; pass the caps to :func:`compute_bin_boundaries`
+    and :func:`build_nd_histogram` to bin the counts as if they were capped.
+    """
     if ignore_axes is None:
         ignore_axes = []
     if tail_cap_quantile is None or tail_cap_quantile >= 1.0:
-        return data, {}
+        return {}
     if not 0.0 < tail_cap_quantile <= 1.0:
         raise ValueError("tail_cap_quantile must be between 0 and 1.")
-
-    capped: Dict[str, ak.Array] = {}
-    caps: Dict[str, int] = {}
+    caps: Dict[str, float] = {}
     for axis in data.fields:
-        values = data[axis]
-        if axis in ignore_axes or len(values) == 0:
-            capped[axis] = values
+        if axis in ignore_axes or len(data) == 0:
             continue
-        values_np = ak.to_numpy(values)
-        cap_value = int(np.quantile(values_np, tail_cap_quantile))
-        max_value = int(values_np.max())
+        values = ak.to_numpy(data[axis])
+        if _is_continuous(values):
+            cap_value: Union[int, float] = float(np.quantile(values, tail_cap_quantile))
+            max_value: Union[int, float] = float(values.max())
+        else:
+            cap_value = int(np.quantile(values, tail_cap_quantile))
+            max_value = int(values.max())
         if cap_value < max_value:
             caps[axis] = cap_value
-            capped[axis] = ak.where(values > cap_value, cap_value, values)
-        else:
-            capped[axis] = values
-    return ak.zip(capped, depth_limit=1), caps
+    return caps
+
+
+def apply_tail_caps(
+    data: ak.Array,
+    ignore_axes: Optional[List[str]] = None,
+    tail_cap_quantile: Optional[float] = None,
+    caps: Optional[Dict[str, float]] = None,
+) -> Tuple[ak.Array, Dict[str, float]]:
+    """Cap per-axis counts at a quantile to reduce long tails.
+
+    If ``caps`` is given (e.g. from :func:`tail_caps_from_sketches`) those cap
+    values are applied as-is and no quantiles are computed from ``data``.
+    This returns a capped copy of the capped axes (of the same kind as
+    ``data``); binning code takes the caps directly instead.
+    """
+    if caps is None:
+        caps = compute_tail_caps(data, ignore_axes, tail_cap_quantile)
+    if not caps:
+        return data, {}
+    capped = {
+        axis: np.minimum(ak.to_numpy(data[axis]), caps[axis])
+        if axis in caps
+        else ak.to_numpy(data[axis])
+        for axis in data.fields
+    }
+    if isinstance(data, ak.Array):
+        return ak.zip(capped, depth_limit=1), dict(caps)
+    return CountTable.from_columns(capped), dict(caps)
 
 
 class MergedCellGroup(BaseModel):
-    cells: List[Dict[str, int]]
+    # Either the grid cells of the group, or for box-shaped groups (see
+    # :func:`merge_sparse_boxes`) the ``[first, last + 1)`` bin index range per axis.
+    cells: List[Dict[str, int]] = Field(default_factory=list)
+    box: Optional[Dict[str, List[int]]] = None
     count: int
     fraction: float
 
@@ -124,64 +311,327 @@ class MergedCells(BaseModel):
     groups: List[MergedCellGroup]
 
 
+class CostModel(BaseModel):
+    """Estimated read cost of an event, in bytes:
+    ``base + sum(weights[axis] * count)`` over the object-count axes."""
+
+    base: float = 0.0
+    weights: Dict[str, float] = Field(default_factory=dict)
+
+
+class KDTreeNodes(BaseModel):
+    """A kd-tree stored as flat per-node lists.
+
+    Node ``i`` sends events with ``axes[split_axis[i]] < split_value[i]`` to
+    node ``left[i]`` and the rest to node ``right[i]``; node 0 is the root.
+    Leaf nodes have ``split_axis == -1`` and their leaf id in ``left``.
+    ``counts`` and ``fractions`` are per leaf.
+    """
+
+    axes: List[str]
+    leaf_fraction: float
+    split_axis: List[int]
+    split_value: List[float]
+    left: List[int]
+    right: List[int]
+    counts: List[int]
+    fractions: List[float]
+
+
 class BinBoundaries(BaseModel):
-    axes: Dict[str, List[int]]
+    axes: Dict[str, List[Union[int, float]]]
     merged_cells: Optional[MergedCells] = None
     commands: List[str] = Field(default_factory=list)
+    # Set when counts and fractions are estimated bytes rather than events.
+    cost_model: Optional[CostModel] = None
+    # Set for kd-tree partitions; ``axes`` then holds one bin spanning each axis.
+    kdtree: Optional[KDTreeNodes] = None
+    # Bins requested per axis; ``axes`` has fewer where repeated values share edges.
+    bins_per_axis: Optional[Dict[str, int]] = None
 
 
 def write_bin_boundaries_yaml(
-    boundaries: Dict[str, List[int]],
+    boundaries: Dict[str, List[float]],
     file_path: str,
     merged_cells: Optional[MergedCells] = None,
     commands: Optional[List[str]] = None,
+    cost_model: Optional[CostModel] = None,
+    kdtree: Optional[KDTreeNodes] = None,
+    bins_per_axis: Optional[Dict[str, int]] = None,
 ) -> None:
     """Write the bin boundaries to ``file_path`` in YAML format."""
     if commands is None:
         commands = []
-    data = BinBoundaries(axes=boundaries, merged_cells=merged_cells, commands=commands)
+    data = BinBoundaries(
+        axes=boundaries,
+        merged_cells=merged_cells,
+        commands=commands,
+        cost_model=cost_model,
+        kdtree=kdtree,
+        bins_per_axis=bins_per_axis,
+    )
+    # Optional sections are left out rather than written as null.
+    optional = (("cost_model", cost_model), ("kdtree", kdtree), ("bins_per_axis", bins_per_axis))
+    exclude = {name for name, value in optional if value is None}
+    if kdtree is not None and merged_cells is None:
+        exclude.add("merged_cells")
+    dumped = data.model_dump(exclude=exclude)
+    has_boxes = False
+    if dumped.get("merged_cells") is not None:
+        # Box groups are written as their ranges only, and cell groups as before.
+        for group in dumped["merged_cells"]["groups"]:
+            has_boxes = has_boxes or group["box"] is not None
+            del group["box" if group["box"] is None else "cells"]
     with open(file_path, "w") as f:
-        yaml.safe_dump(data.model_dump(), f)
+        # Flow style puts each kd-tree node list and box range on one line.
+        yaml.safe_dump(
+            dumped,
+            f,
+            default_flow_style=None if kdtree is not None or has_boxes else False,
+        )
+
+
+def event_costs(data: ak.Array, cost_model: CostModel) -> np.ndarray:
+    """Per-event cost under ``cost_model``, rounded to whole bytes.
+
+    Integer costs keep cost-weighted histograms and merged-group counts integral.
+    """
+    missing = [axis for axis in cost_model.weights if axis not in data.fields]
+    if missing:
+        raise ValueError(f"Cost model axes are missing from the counts: {', '.join(missing)}")
+    costs = np.full(len(data), float(cost_model.base))
+    for axis, weight in cost_model.weights.items():
+        costs += weight * ak.to_numpy(data[axis])
+    if np.any(costs < 0):
+        raise ValueError("Event costs must be non-negative.")
+    return np.rint(costs).astype(np.int64)
 
 
-def build_nd_histogram(data: ak.Array, boundaries: Dict[str, List[int]]) -> BaseHist:
+def _empty_histogram(boundaries: Dict[str, List[float]]) -> BaseHist:
+    # Build the histogram using ``hist`` which leverages boost-histogram
+    h_builder = Hist.new
+    for ax in boundaries:
+        h_builder = h_builder.Var(boundaries[ax], name=ax, label=ax)
+    h_builder = h_builder.Int64()  # type: ignore
+    return h_builder  # type: ignore
+
+
+def _axis_bin_indices(
+    values: np.ndarray, edges: List[float], cap: Optional[float] = None
+) -> np.ndarray:
+    """Bin index of each value along one axis, with 0 as the underflow bin and
+    ``len(edges)`` as the overflow bin (the regular bins are ``1..len(edges) - 1``).
+
+    Integer values with integer edges use a precomputed value -> bin lookup
+    table; anything else falls back to a binary search over the edges.
+
+    With a tail ``cap`` values are binned as ``min(value, cap)``. Binning is
+    monotone, so that is the smaller of the value's bin and the cap's bin: the
+    cap is folded into the lookup table, or clamps the searched indices.
+    """
+    edges_arr = np.asarray(edges, dtype=float)
+    cap_bin = None if cap is None else int(np.searchsorted(edges_arr, cap, side="right"))
+    lo = edges_arr[0]
+    hi = edges_arr[-1]
+    use_lookup = (
+        np.issubdtype(values.dtype, np.integer)
+        and all(float(edge).is_integer() for edge in edges)
+        and hi - lo <= _MAX_LOOKUP_RANGE
+    )
+    if not use_lookup:
+        idx = np.searchsorted(edges_arr, values, side="right")
+        if cap_bin is not None:
+            np.minimum(idx, cap_bin, out=idx)
+        return idx
+    lo_int = int(lo)
+    in_range = np.arange(lo_int, int(hi))
+    lookup = np.concatenate(
+        [[0], np.searchsorted(edges_arr, in_range, side="right"), [len(edges)]]
+    ).astype(np.int64)
+    if cap_bin is not None:
+        np.minimum(lookup, cap_bin, out=lookup)
+    positions = np.clip(values.astype(np.int64) - (lo_int - 1), 0, len(lookup) - 1)
+    return lookup[positions]
+
+
+def _axis_columns(data: ak.Array, axes: List[str]) -> Dict[str, np.ndarray]:
+    """NumPy view of each axis column (zero-copy for flat awkward and Arrow columns)."""
+    return {axis: ak.to_numpy(data[axis]) for axis in axes}
+
+
+def _ravel_bin_indices(
+    columns: Dict[str, np.ndarray],
+    boundaries: Dict[str, List[float]],
+    flow: bool,
+    caps: Optional[Dict[str, float]] = None,
+) -> np.ndarray:
+    if caps is None:
+        caps = {}
+    n_events = len(next(iter(columns.values()))) if columns else 0
+    cells = np.zeros(n_events, dtype=np.int64)
+    valid = np.ones(n_events, dtype=bool)
+    for axis, edges in boundaries.items():
+        idx = _axis_bin_indices(columns[axis], edges, cap=caps.get(axis))
+        if flow:
+            cells = cells * (len(edges) + 1) + idx
+        else:
+            valid &= (idx > 0) & (idx < len(edges))
+            cells = cells * (len(edges) - 1) + (idx - 1)
+    if not flow:
+        cells[~valid] = -1
+    return cells
+
+
+def compute_cell_indices(data: ak.Array, boundaries: Dict[str, List[float]]) -> np.ndarray:
+    """Raveled (C-order) grid cell index of each event, or -1 if the event is
+    outside the grid. The grid shape is ``len(edges) - 1`` per axis, in the
+    order of ``boundaries``."""
+    return _ravel_bin_indices(_axis_columns(data, list(boundaries)), boundaries, flow=False)
+
+
+def count_cells(cell_indices: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+    """Count events per grid cell from :func:`compute_cell_indices` output."""
+    valid = cell_indices[cell_indices >= 0]
+    return np.bincount(valid, minlength=int(np.prod(shape))).reshape(shape)
+
+
+def cell_group_labels(
+    groups: List["MergedCellGroup"],
+    axes: List[str],
+    shape: Tuple[int, ...],
+) -> np.ndarray:
+    """Label array mapping each raveled grid cell to the index of its merged
+    group in ``groups`` (-1 for cells in no group).
+
+    Combined with :func:`compute_cell_indices` this assigns events to groups
+    (``labels[cells]``) and recounts groups without walking their cells again.
+    """
+    labels = np.full(int(np.prod(shape)), -1, dtype=np.int64)
+    grid = labels.reshape(shape)
+    for gid, group in enumerate(groups):
+        if group.box is not None:
+            grid[_box_slices(group.box, axes, shape)] = gid
+        for cell in group.cells:
+            if any(axis not in cell for axis in axes):
+                raise ValueError("Merged cell group is missing axis entries.")
+            idx = tuple(int(cell[axis]) for axis in axes)
+            if any(i < 0 or i >= size for i, size in zip(idx, shape)):
+                raise ValueError("Merged cell group has out-of-range cell indices.")
+            labels[np.ravel_multi_index(idx, shape)] = gid
+    return labels
+
+
+def _box_slices(
+    box: Dict[str, List[int]], axes: List[str], shape: Tuple[int, ...]
+) -> Tuple[slice, ...]:
+    if any(axis not in box for axis in axes):
+        raise ValueError("Merged cell group box is missing axis entries.")
+    slices = []
+    for axis, size in zip(axes, shape):
+        lo, hi = (int(i) for i in box[axis])
+        if not 0 <= lo < hi <= size:
+            raise ValueError("Merged cell group box has out-of-range bin indices.")
+        slices.append(slice(lo, hi))
+    return tuple(slices)
+
+
+def group_counts_from_labels(
+    labels: np.ndarray, cell_counts: np.ndarray, n_groups: int
+) -> np.ndarray:
+    """Sum ``cell_counts`` (any shape, raveled in C order) into ``n_groups`` groups."""
+    flat = np.asarray(cell_counts).ravel()
+    if kernels.JIT_ENABLED:
+        return kernels.label_totals(labels, flat.astype(np.int64), n_groups)
+    in_group = labels >= 0
+    totals = np.zeros(n_groups, dtype=np.int64)
+    np.add.at(totals, labels[in_group], flat[in_group].astype(np.int64))
+    return totals
+
+
+def build_nd_histogram(
+    data: ak.Array,
+    boundaries: Dict[str, List[float]],
+    threads: Optional[int] = None,
+    chunk_size: int = DEFAULT_FILL_CHUNK_SIZE,
+    weights: Optional[np.ndarray] = None,
+    caps: Optional[Dict[str, float]] = None,
+) -> BaseHist:
     """Build an n-dimensional histogram using ``boundaries`` and return a
     :class:`hist.Hist` object.
 
+    Each event is mapped to a raveled cell index (lookup tables for integer
+    axes, binary search for continuous ones) and the cells are counted with
+    :func:`numpy.bincount`. Out-of-range events land in the flow bins, as with
+    :meth:`hist.Hist.fill`. Each axis column is read through a NumPy view once
+    and sliced from there, so no copy of ``data`` is made.
+
     Parameters
     ----------
     data:
         Event-by-event counts of objects.
     boundaries:
         Mapping from axis name to bin boundaries.
+    threads:
+        Number of fill threads (``None`` for one per core). The events are cut
+        into ``chunk_size`` slices; each thread counts its slices privately and
+        the counts are summed at the end.
+    chunk_size:
+        Number of events per fill slice.
+    weights:
+        Optional integer weight per event (e.g. from :func:`event_costs`); each
+        cell then holds the summed weight instead of the number of events.
+    caps:
+        Optional tail cap per axis (see :func:`compute_tail_caps`), applied as
+        the events are binned.
 
     Returns
     -------
     ``hist.Hist`` instance populated with the supplied data.
     """
-    axes = list(boundaries.keys())
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be >= 1")
+    h = _empty_histogram(boundaries)
+    flow_shape = tuple(len(edges) + 1 for edges in boundaries.values())
+    n_flow_cells = int(np.prod(flow_shape))
+    columns = _axis_columns(data, list(boundaries))
 
-    # Build the histogram using ``hist`` which leverages boost-histogram
-    h_builder = Hist.new
-    for ax in axes:
-        h_builder = h_builder.Var(boundaries[ax], name=ax, label=ax)
-    h_builder = h_builder.Int64()  # type: ignore
-    h = h_builder  # type: BaseHist
+    def count_slice(start: int, stop: int) -> np.ndarray:
+        sliced = {axis: values[start:stop] for axis, values in columns.items()}
+        cells = _ravel_bin_indices(sliced, boundaries, flow=True, caps=caps)
+        if weights is None:
+            return np.bincount(cells, minlength=n_flow_cells)
+        counts = np.bincount(cells, weights=weights[start:stop], minlength=n_flow_cells)
+        return np.rint(counts).astype(np.int64)
 
-    # Fill with event counts
-    fill_dict = {ax: ak.to_numpy(data[ax]) for ax in axes}
-    h.fill(**fill_dict)
+    n_events = len(data)
+    n_chunks = -(-n_events // chunk_size)
+    if threads is None:
+        threads = os.cpu_count() or 1
+    threads = max(1, min(threads, n_chunks))
+    if threads == 1:
+        counts = count_slice(0, n_events)
+    else:
+        # numpy releases the GIL in the heavy loops, so the threads run in parallel.
+        def count_slices(worker: int) -> np.ndarray:
+            private = np.zeros(n_flow_cells, dtype=np.int64)
+            for start in range(worker * chunk_size, n_events, threads * chunk_size):
+                private += count_slice(start, start + chunk_size)
+            return private
 
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            counts = sum(pool.map(count_slices, range(threads)))
+
+    h.view(flow=True)[...] = np.asarray(counts).reshape(flow_shape)
     return h
 
 
-def histogram_boundaries(hist: BaseHist) -> Dict[str, List[int]]:
+def histogram_boundaries(hist: BaseHist) -> Dict[str, List[float]]:
     """Extract axis boundaries from a histogram."""
-    boundaries: Dict[str, List[int]] = {}
+    boundaries: Dict[str, List[float]] = {}
     for ax in hist.axes:
         name = ax.name if ax.name is not None else ""
         edges = np.asarray(ax.edges)
-        boundaries[name] = [int(edge) for edge in edges.tolist()]
+        boundaries[name] = [edge_value(edge) for edge in edges.tolist()]
     return boundaries
 
 
@@ -194,6 +644,8 @@ def _merge_group_sizes(
     n_bins = int(counts.size)
     if total == 0 or n_bins <= min_bins or min_fraction <= 0.0:
         return [1] * n_bins
+    if kernels.JIT_ENABLED:
+        return kernels.merge_bin_sizes(counts.astype(np.int64), min_fraction, min_bins).tolist()
 
     group_sizes = [1] * n_bins
     counts_list = counts.astype(int).tolist()
@@ -402,6 +854,15 @@ def merge_sparse_cells(
     axes_names = [
         ax.name if ax.name is not None else f"axis_{i}" for i, ax in enumerate(hist.axes)
     ]
+    if kernels.JIT_ENABLED:
+        labels = kernels.merge_cell_labels(
+            flat.astype(np.int64), np.asarray(shape, dtype=np.int64), float(min_fraction)
+        )
+        group_records = _group_records_from_labels(labels, flat, shape, axes_names, total)
+        summary = _summary_from_counts(
+            np.array([record.count for record in group_records], dtype=int)
+        )
+        return group_records, summary
     cells = list(np.ndindex(shape))
     groups: Dict[int, Dict[str, object]] = {}
     cell_to_group: Dict[Tuple[int, ...], int] = {}
@@ -457,6 +918,102 @@ def merge_sparse_cells(
     return group_records, summary
 
 
+def merge_sparse_boxes(
+    hist: BaseHist,
+    min_fraction: float,
+) -> Tuple[List[MergedCellGroup], Dict[str, float]]:
+    """Split the grid into boxes of cells that each hold at least ``min_fraction``.
+
+    Starting from the whole grid, each box is cut in two at the most even cut,
+    over all axes, that leaves both sides at or above ``min_fraction``; a box
+    with no such cut becomes a group. Unlike :func:`merge_sparse_cells` every
+    group is an axis-aligned box, stored as per-axis index ranges, so
+    membership and usage tests are range comparisons.
+    """
+    if not 0.0 <= min_fraction <= 1.0:
+        raise ValueError("min_fraction must be between 0 and 1.")
+
+    counts = np.asarray(hist.view())
+    if counts.size == 0:
+        return [], _summary_from_counts(counts.flatten())
+    axes_names = [
+        ax.name if ax.name is not None else f"axis_{i}" for i, ax in enumerate(hist.axes)
+    ]
+    total = int(counts.sum())
+    threshold = min_fraction * total
+
+    boxes: List[Tuple[Tuple[Tuple[int, int], ...], int]] = []
+    stack = [tuple((0, size) for size in counts.shape)]
+    while stack:
+        box = stack.pop()
+        sub = counts[tuple(slice(lo, hi) for lo, hi in box)]
+        box_total = int(sub.sum())
+        best = None
+        for axis, (lo, hi) in enumerate(box):
+            if hi - lo < 2:
+                continue
+            others = tuple(i for i in range(sub.ndim) if i != axis)
+            below = np.cumsum(sub.sum(axis=others))[:-1]
+            smaller = np.minimum(below, box_total - below)
+            smaller = np.where(smaller >= threshold, smaller, -1)
+            cut = int(np.argmax(smaller))
+            if smaller[cut] < 0:
+                continue
+            # Most even cut first, then the longer axis.
+            key = (int(smaller[cut]), hi - lo)
+            if best is None or key > best[0]:
+                best = (key, axis, lo + cut + 1)
+        if best is None:
+            boxes.append((box, box_total))
+            continue
+        _, axis, cut = best
+        lo, hi = box[axis]
+        for half in ((lo, cut), (cut, hi)):
+            parts = list(box)
+            parts[axis] = half
+            stack.append(tuple(parts))
+
+    records = [
+        MergedCellGroup(
+            box={axis: [lo, hi] for axis, (lo, hi) in zip(axes_names, box)},
+            count=box_total,
+            fraction=0.0 if total == 0 else float(box_total) / float(total),
+        )
+        for box, box_total in sorted(boxes)
+    ]
+    summary = _summary_from_counts(np.array([record.count for record in records], dtype=int))
+    return records, summary
+
+
+def _group_records_from_labels(
+    labels: np.ndarray,
+    flat_counts: np.ndarray,
+    shape: Tuple[int, ...],
+    axes_names: List[str],
+    total: int,
+) -> List[MergedCellGroup]:
+    """Group records for per-cell group ``labels``, in the order and format of
+    :func:`_build_group_records`."""
+    order = np.argsort(labels, kind="stable")
+    starts = np.flatnonzero(np.diff(labels[order])) + 1
+    members = sorted(np.split(order, starts), key=lambda cells: int(cells[0]))
+    records: List[MergedCellGroup] = []
+    for cells in members:
+        indices = np.unravel_index(cells, shape)
+        count = int(flat_counts[cells].sum())
+        records.append(
+            MergedCellGroup(
+                cells=[
+                    {axis: int(idx[i]) for axis, idx in zip(axes_names, indices)}
+                    for i in range(len(cells))
+                ],
+                count=count,
+                fraction=0.0 if total == 0 else float(count) / float(total),
+            )
+        )
+    return records
+
+
 def _build_group_records(
     groups: Dict[int, Dict[str, object]],
     axes_names: List[str],
@@ -479,3 +1036,69 @@ def _build_group_records(
             MergedCellGroup(cells=cell_list, count=count, fraction=fraction)
         )
     return records
+
+
+def selected_groups(
+    boundaries: Dict[str, List[float]],
+    merged_groups: List[Dict[str, object]],
+    cuts: Dict[str, float],
+) -> List[int]:
+    """Indices of the merged groups that can contain events passing the
+    inclusive (>= value) ``cuts``. Cuts on the components of a composite axis
+    are evaluated on the counts each of its bins holds."""
+    allowed_bins_by_axis: Dict[str, set[int]] = {
+        axis: {
+            idx
+            for idx in range(len(edges) - 1)
+            if can_pass(axis, edges[idx], edges[idx + 1], cuts)
+        }
+        for axis, edges in boundaries.items()
+    }
+
+    if any(not bins for bins in allowed_bins_by_axis.values()):
+        return []
+
+    axes = list(boundaries)
+    shape = tuple(len(edges) - 1 for edges in boundaries.values())
+    selected: List[int] = []
+    for gid, group in enumerate(merged_groups):
+        box = group.get("box")
+        if box is not None:
+            # A box can hold passing events iff one of its bins on each axis can.
+            slices = _box_slices(box, axes, shape)
+            if all(
+                not allowed_bins_by_axis[axis].isdisjoint(range(s.start, s.stop))
+                for s, axis in zip(slices, axes)
+            ):
+                selected.append(gid)
+            continue
+        cells = group["cells"]
+        for cell in cells:
+            if any(axis not in cell for axis in boundaries):
+                raise ValueError(
+                    "Merged cell group is missing axis entries for usage calculation."
+                )
+            if any(
+                cell[axis] < 0 or cell[axis] >= len(boundaries[axis]) - 1
+                for axis in boundaries
+            ):
+                raise ValueError(
+                    "Merged cell group has out-of-range bin indices."
+                )
+            if all(cell[axis] in allowed_bins_by_axis[axis] for axis in boundaries):
+                selected.append(gid)
+                break
+    return selected
+
+
+def calc_usage_fraction(
+    boundaries: Dict[str, List[float]],
+    merged_groups: List[Dict[str, object]],
+    cuts: Dict[str, float],
+) -> float:
+    """Fraction of events in merged groups that can contain events passing
+    the inclusive (>= value) ``cuts``."""
+    usage = 0.0
+    for gid in selected_groups(boundaries, merged_groups, cuts):
+        usage += float(merged_groups[gid]["fraction"])
+    return usage
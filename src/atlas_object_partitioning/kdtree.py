@@ -0,0 +1,283 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import awkward as ak
+import numpy as np
+
+from atlas_object_partitioning.assign import _BLOCK_SIZE, Columns, _column, _group_dtype
+from atlas_object_partitioning.composite import can_pass, input_axes, is_composite
+from atlas_object_partitioning.histograms import (
+    _MAX_LOOKUP_RANGE,
+    KDTreeNodes,
+    compute_bin_boundaries,
+    edge_value,
+)
+
+# Leaves stop splitting once they hold at most this fraction of events; leaves
+# end up between half and all of it, so this gives a few dozen leaves.
+DEFAULT_KDTREE_LEAF_FRACTION = 0.05
+
+# Depth limit, for populations that cannot be split down to the leaf fraction.
+DEFAULT_KDTREE_MAX_DEPTH = 24
+
+# Smallest share of a node's weight either side of a split may get; axes whose
+# median split is more lopsided than this are only used when no other axis is.
+_MIN_SPLIT_BALANCE = 0.2
+
+
+def _best_split(
+    values: np.ndarray, weights: Optional[np.ndarray]
+) -> Optional[Tuple[float, float]]:
+    """Threshold ``t`` for which ``values < t`` holds closest to half the weight,
+    with the weight below ``t``; ``None`` if all values are equal."""
+    if np.issubdtype(values.dtype, np.integer):
+        lo, hi = int(values.min()), int(values.max())
+        if lo == hi:
+            return None
+        if hi - lo <= _MAX_LOOKUP_RANGE:
+            cumulative = np.cumsum(np.bincount(values - lo, weights=weights))
+            best = int(np.argmin(np.abs(2 * cumulative[:-1] - cumulative[-1])))
+            return float(lo + best + 1), float(cumulative[best])
+    unique, inverse = np.unique(values, return_inverse=True)
+    if len(unique) < 2:
+        return None
+    cumulative = np.cumsum(np.bincount(inverse, weights=weights))
+    below = cumulative[:-1]
+    best = int(np.argmin(np.abs(2 * below - cumulative[-1])))
+    return float(unique[best + 1]), float(below[best])
+
+
+class KDTree:
+    """Partition events into the leaves of a kd-tree.
+
+    Each node splits its events at the weighted median of one axis. Among the
+    axes whose median split is reasonably even, it picks the one split least
+    often above the node (then the most even), so that like a classic kd-tree
+    the splits cycle through the axes and a selection on any axis can rule out
+    leaves. Nodes stop splitting once they hold at most ``leaf_fraction`` of the
+    total, so leaves are balanced without building (and re-merging) the full
+    grid of per-axis bins.
+
+    A tree routes every event to a leaf, including values beyond the range it
+    was built on. It offers the same ``axes`` / ``n_groups`` / ``assign``
+    interface as :class:`~atlas_object_partitioning.assign.PartitionAssigner`,
+    with leaves as groups.
+    """
+
+    def __init__(
+        self,
+        bounds: Dict[str, List[float]],
+        nodes: KDTreeNodes,
+    ):
+        if sorted(bounds) != sorted(nodes.axes):
+            raise ValueError("kd-tree axes do not match the bounds.")
+        n_nodes = len(nodes.split_axis)
+        if n_nodes == 0 or any(
+            len(column) != n_nodes for column in (nodes.split_value, nodes.left, nodes.right)
+        ):
+            raise ValueError("kd-tree node lists must be non-empty and of equal length.")
+        self.bounds = {axis: [bounds[axis][0], bounds[axis][-1]] for axis in nodes.axes}
+        self.nodes = nodes
+        self.axes = list(nodes.axes)
+        self.split_axis = np.asarray(nodes.split_axis, dtype=np.int64)
+        self.split_value = np.asarray(nodes.split_value, dtype=float)
+        is_leaf = self.split_axis < 0
+        self.n_groups = int(is_leaf.sum())
+        if len(nodes.counts) != self.n_groups or len(nodes.fractions) != self.n_groups:
+            raise ValueError("kd-tree needs one count and fraction per leaf.")
+        self.dtype = _group_dtype(self.n_groups)
+        # Lookup tables where leaves point at themselves, so routing a block of
+        # events for ``depth`` steps leaves every event on its leaf. Children are
+        # interleaved: node ``i`` goes to ``_children[2 * i + (value >= split)]``.
+        own = np.arange(n_nodes)
+        self._children = np.stack(
+            [np.where(is_leaf, own, nodes.left), np.where(is_leaf, own, nodes.right)], axis=1
+        ).ravel()
+        if np.any(self._children < 0) or np.any(self._children >= n_nodes):
+            raise ValueError("kd-tree child indices are out of range.")
+        self._axis = np.where(is_leaf, 0, self.split_axis)
+        self._value = np.where(is_leaf, np.inf, self.split_value)
+        self._leaf_of_node = np.where(is_leaf, nodes.left, -1)
+        self.lower, self.upper, self.depth = self._leaf_boxes()
+
+    def _leaf_boxes(self) -> Tuple[np.ndarray, np.ndarray, int]:
+        """``[lower, upper)`` box of each leaf, clipped to the bounds, and the depth."""
+        lower = np.empty((self.n_groups, len(self.axes)))
+        upper = np.empty((self.n_groups, len(self.axes)))
+        root_lo = np.array([edges[0] for edges in self.bounds.values()], dtype=float)
+        root_hi = np.array([edges[1] for edges in self.bounds.values()], dtype=float)
+        depth = 0
+        stack = [(0, root_lo, root_hi, 0)]
+        while stack:
+            node, lo, hi, level = stack.pop()
+            if level > len(self.split_axis):
+                raise ValueError("kd-tree has a cycle.")
+            depth = max(depth, level)
+            axis = self.split_axis[node]
+            if axis < 0:
+                leaf = self._leaf_of_node[node]
+                lower[leaf], upper[leaf] = lo, hi
+                continue
+            value = self.split_value[node]
+            left_hi, right_lo = hi.copy(), lo.copy()
+            left_hi[axis] = min(hi[axis], value)
+            right_lo[axis] = max(lo[axis], value)
+            stack.append((self.nodes.left[node], lo, left_hi, level + 1))
+            stack.append((self.nodes.right[node], right_lo, hi, level + 1))
+        return lower, upper, depth
+
+    @classmethod
+    def build(
+        cls,
+        data: ak.Array,
+        ignore_axes: Optional[List[str]] = None,
+        leaf_fraction: float = DEFAULT_KDTREE_LEAF_FRACTION,
+        max_depth: int = DEFAULT_KDTREE_MAX_DEPTH,
+        weights: Optional[np.ndarray] = None,
+    ) -> "KDTree":
+        """Grow a tree over the events in ``data``.
+
+        With per-event ``weights`` (e.g. from :func:`histograms.event_costs`)
+        splits and leaves balance total weight instead of events.
+        """
+        if not 0.0 < leaf_fraction <= 1.0:
+            raise ValueError("leaf_fraction must be between 0 and 1.")
+        if max_depth < 0:
+            raise ValueError("max_depth must be >= 0.")
+        if ignore_axes is None:
+            ignore_axes = []
+        bounds = compute_bin_boundaries(data, ignore_axes=ignore_axes, bins_per_axis=1)
+        axes = list(bounds)
+        columns = [ak.to_numpy(data[axis]) for axis in axes]
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+            if len(weights) != len(data):
+                raise ValueError("weights must have one entry per event.")
+        total = float(len(data)) if weights is None else float(weights.sum())
+        limit = leaf_fraction * total
+
+        split_axis: List[int] = []
+        split_value: List[float] = []
+        left: List[int] = []
+        right: List[int] = []
+        counts: List[int] = []
+
+        def grow(events: np.ndarray, level: int, path_splits: Tuple[int, ...]) -> int:
+            node = len(split_axis)
+            split_axis.append(-1)
+            split_value.append(0.0)
+            left.append(len(counts))
+            right.append(len(counts))
+            node_weights = weights[events] if weights is not None else None
+            weight = float(len(events)) if node_weights is None else float(node_weights.sum())
+            best = None
+            if weight > limit and level < max_depth and len(events) > 1:
+                for axis, column in enumerate(columns):
+                    split = _best_split(column[events], node_weights)
+                    if split is None:
+                        continue
+                    balance = min(split[1], weight - split[1]) / weight
+                    key = (balance >= _MIN_SPLIT_BALANCE, -path_splits[axis], balance)
+                    if best is None or key > best[0]:
+                        best = (key, axis, split[0])
+            if best is None:
+                counts.append(int(round(weight)))
+                return node
+            _, axis, value = best
+            below = columns[axis][events] < value
+            splits = list(path_splits)
+            splits[axis] += 1
+            split_axis[node] = axis
+            split_value[node] = value
+            left[node] = grow(events[below], level + 1, tuple(splits))
+            right[node] = grow(events[~below], level + 1, tuple(splits))
+            return node
+
+        grow(np.arange(len(data)), 0, (0,) * len(axes))
+        nodes = KDTreeNodes(
+            axes=axes,
+            leaf_fraction=leaf_fraction,
+            split_axis=split_axis,
+            split_value=[edge_value(value) for value in split_value],
+            left=left,
+            right=right,
+            counts=counts,
+            fractions=[count / total if total > 0 else 0.0 for count in counts],
+        )
+        return cls(bounds, nodes)
+
+    @property
+    def counts(self) -> np.ndarray:
+        return np.asarray(self.nodes.counts, dtype=np.int64)
+
+    @property
+    def fractions(self) -> np.ndarray:
+        return np.asarray(self.nodes.fractions, dtype=float)
+
+    def cells(self, data: Columns) -> np.ndarray:
+        """Leaf id per event (the leaves are the cells of a tree partition)."""
+        columns = [_column(data, axis) for axis in self.axes]
+        n_events = len(columns[0]) if columns else 0
+        leaves = np.empty(n_events, dtype=np.int64)
+        for start in range(0, n_events, _BLOCK_SIZE):
+            block = slice(start, start + _BLOCK_SIZE)
+            size = min(_BLOCK_SIZE, n_events - start)
+            # Axis-major copy of the block, so each step is one flat gather.
+            values = np.empty((len(columns), size))
+            for i, column in enumerate(columns):
+                values[i] = column[block]
+            flat = values.ravel()
+            axis_offsets = self._axis * size
+            positions = np.arange(size)
+            node = np.zeros(size, dtype=np.intp)
+            for _ in range(self.depth):
+                right = flat.take(axis_offsets.take(node) + positions) >= self._value.take(node)
+                node = self._children.take(2 * node + right)
+            leaves[block] = self._leaf_of_node.take(node)
+        return leaves
+
+    def groups_of_cells(self, cells: np.ndarray) -> np.ndarray:
+        return cells.astype(self.dtype)
+
+    def assign(self, data: Columns) -> np.ndarray:
+        """Leaf id per event."""
+        return self.groups_of_cells(self.cells(data))
+
+    def assign_batches(self, batches: Iterable[Columns]) -> Iterator[np.ndarray]:
+        for batch in batches:
+            yield self.assign(batch)
+
+    def selected_leaves(self, cuts: Dict[str, float]) -> List[int]:
+        """Leaves that can contain events passing the inclusive (>= value) ``cuts``."""
+        unknown = [axis for axis in cuts if axis not in input_axes(self.axes) + self.axes]
+        if unknown:
+            raise ValueError(f"kd-tree has no axes: {', '.join(unknown)}")
+        selected = np.ones(self.n_groups, dtype=bool)
+        for i, axis in enumerate(self.axes):
+            if is_composite(axis):
+                # Codes do not order the component counts; test each leaf's interval.
+                selected &= [
+                    can_pass(axis, lo, hi, cuts)
+                    for lo, hi in zip(self.lower[:, i], self.upper[:, i])
+                ]
+            elif axis in cuts:
+                selected &= self.upper[:, i] > cuts[axis]
+        return np.flatnonzero(selected).tolist()
+
+    def usage_fraction(self, cuts: Dict[str, float]) -> float:
+        """Fraction of events in leaves that can contain events passing ``cuts``."""
+        return float(self.fractions[self.selected_leaves(cuts)].sum())
+
+    def leaf_records(self) -> List[Dict[str, object]]:
+        """Box, count and fraction of every leaf, in the format of
+        :func:`histograms.top_bins`."""
+        return [
+            {
+                "bin": {
+                    axis: (edge_value(self.lower[leaf, i]), edge_value(self.upper[leaf, i]))
+                    for i, axis in enumerate(self.axes)
+                },
+                "count": int(self.nodes.counts[leaf]),
+                "fraction": float(self.nodes.fractions[leaf]),
+            }
+            for leaf in range(self.n_groups)
+        ]
@@ -0,0 +1,124 @@
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# The merge and recount loops below work on flat arrays so numba can compile them.
+# When it is installed, histograms calls them instead of its NumPy/Python code,
+# with identical results; set this to False to force the NumPy path. Without
+# numba the kernels still run uncompiled, which is how the tests compare paths.
+JIT_ENABLED = numba is not None
+
+
+def _jit(function):
+    if numba is None:
+        return function
+    return numba.njit(cache=True, nogil=True)(function)
+
+
+@_jit
+def merge_cell_labels(counts: np.ndarray, shape: np.ndarray, min_fraction: float) -> np.ndarray:
+    """Group label of every cell of the raveled grid ``counts`` after merging
+    sparse groups into their smallest neighbour, as in :func:`merge_sparse_cells`.
+
+    Each group keeps a linked list of its cells, so merging two groups is
+    constant time. Neighbours are found from the strides of ``shape``.
+    """
+    n_cells = counts.size
+    labels = np.arange(n_cells)
+    total = counts.sum()
+    if total == 0 or min_fraction <= 0.0:
+        return labels
+    group_counts = counts.copy()
+    alive = np.ones(n_cells, dtype=np.bool_)
+    head = np.arange(n_cells)
+    tail = np.arange(n_cells)
+    following = np.full(n_cells, -1)
+    ndim = shape.size
+    strides = np.ones(ndim, dtype=np.int64)
+    for axis in range(ndim - 2, -1, -1):
+        strides[axis] = strides[axis + 1] * shape[axis + 1]
+
+    while True:
+        # Smallest sparse group, lowest id first on ties.
+        gid = -1
+        for group in range(n_cells):
+            if alive[group] and group_counts[group] / total < min_fraction:
+                if gid < 0 or group_counts[group] < group_counts[gid]:
+                    gid = group
+        if gid < 0:
+            break
+        # Smallest neighbouring group, lowest id first on ties.
+        neighbor = -1
+        cell = head[gid]
+        while cell >= 0:
+            for axis in range(ndim):
+                position = (cell // strides[axis]) % shape[axis]
+                for step in (-1, 1):
+                    if 0 <= position + step < shape[axis]:
+                        other = labels[cell + step * strides[axis]]
+                        if other != gid and (
+                            neighbor < 0
+                            or group_counts[other] < group_counts[neighbor]
+                            or (group_counts[other] == group_counts[neighbor] and other < neighbor)
+                        ):
+                            neighbor = other
+            cell = following[cell]
+        if neighbor < 0:
+            break
+        group_counts[gid] += group_counts[neighbor]
+        cell = head[neighbor]
+        while cell >= 0:
+            labels[cell] = gid
+            cell = following[cell]
+        following[tail[gid]] = head[neighbor]
+        tail[gid] = tail[neighbor]
+        alive[neighbor] = False
+    return labels
+
+
+@_jit
+def merge_bin_sizes(counts: np.ndarray, min_fraction: float, min_bins: int) -> np.ndarray:
+    """Number of original bins in each merged bin, as in :func:`_merge_group_sizes`."""
+    n_bins = counts.size
+    total = counts.sum()
+    sizes = np.ones(n_bins, dtype=np.int64)
+    if total == 0 or n_bins <= min_bins or min_fraction <= 0.0:
+        return sizes
+    merged = counts.copy()
+    length = n_bins
+    while length > min_bins:
+        idx = 0
+        for i in range(1, length):
+            if merged[i] < merged[idx]:
+                idx = i
+        if merged[idx] / total >= min_fraction or length == 1:
+            break
+        if idx == 0:
+            neighbor = 1
+        elif idx == length - 1:
+            neighbor = idx - 1
+        elif merged[idx - 1] <= merged[idx + 1]:
+            neighbor = idx - 1
+        else:
+            neighbor = idx + 1
+        keep, drop = min(idx, neighbor), max(idx, neighbor)
+        merged[keep] += merged[drop]
+        sizes[keep] += sizes[drop]
+        for i in range(drop, length - 1):
+            merged[i] = merged[i + 1]
+            sizes[i] = sizes[i + 1]
+        length -= 1
+    return sizes[:length]
+
+
+@_jit
+def label_totals(labels: np.ndarray, counts: np.ndarray, n_groups: int) -> np.ndarray:
+    """Sum ``counts`` per label, skipping cells labelled -1."""
+    totals = np.zeros(n_groups, dtype=np.int64)
+    for cell in range(labels.size):
+        if labels[cell] >= 0:
+            totals[labels[cell]] += counts[cell]
+    return totals
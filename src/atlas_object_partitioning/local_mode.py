@@ -1,16 +1,52 @@
+import getpass
+import glob
+import hashlib
 import logging
 import os
 import re
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
 from servicex import Sample, ServiceXSpec, dataset, deliver as sx_deliver
 
 # ServiceX-Local imports
 try:
     from servicex_local import DockerScienceImage, LocalXAODCodegen, SXLocalAdaptor
+    from servicex_local.science_images import (
+        run_command_with_logging,
+        write_file_runner_script,
+        write_kickoff_script,
+    )
 except ImportError:
     DockerScienceImage = LocalXAODCodegen = SXLocalAdaptor = None
+    run_command_with_logging = write_file_runner_script = write_kickoff_script = None
+
+XAOD_TRANSFORMER_IMAGE = "sslhep/servicex_func_adl_xaod_transformer:25.2.41"
+
+# Generated code and the containers of local runs are shared between runs with
+# the same query, from this directory.
+LOCAL_CACHE_DIR = Path(tempfile.gettempdir()) / f"atlas_object_partitioning_{getpass.getuser()}"
+
+# Seconds a warm transformer container stays up after it is started. A file is
+# only sent to a container with at least half of this left (see WarmDockerPool).
+DEFAULT_WARM_SECONDS = 3600
+
+
+# Suffixes of text files that list the files of a local dataset, one path per line.
+FILE_LIST_SUFFIXES = (".txt", ".list")
+
+# Files picked up from a directory dataset.
+DIRECTORY_PATTERN = "*.root*"
+
+# ServiceX names the output of each input file after the input path, with long
+# names cut to a 40 character hash and the last characters of the path.
+OUTPUT_NAME_MAX_LEN = 60
+_HASHED_OUTPUT_NAME = re.compile(r"^_[0-9a-f]{40}")
 
 
 class SXLocationOptions(Enum):
@@ -19,8 +55,46 @@ class SXLocationOptions(Enum):
     anyLocation = "anyLocation"
 
 
+def _has_glob(path: str) -> bool:
+    return any(char in path for char in "*?[")
+
+
+def local_files(path: str) -> List[str]:
+    """Absolute paths of the files of a local dataset, in sorted order.
+
+    ``path`` is a file, a directory (its ``*.root*`` files), a glob pattern, or a
+    ``.txt``/``.list`` file with one path (or pattern) per line. Relative paths
+    in a list file are relative to the list file.
+    """
+    if _has_glob(path):
+        files = sorted(str(Path(f).absolute()) for f in glob.glob(path) if Path(f).is_file())
+    else:
+        file = Path(path).absolute()
+        if file.is_dir():
+            files = sorted(str(f) for f in file.glob(DIRECTORY_PATTERN) if f.is_file())
+        elif file.suffix in FILE_LIST_SUFFIXES:
+            files = []
+            for line in file.read_text().splitlines():
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    entry = Path(line) if Path(line).is_absolute() else file.parent / line
+                    files += local_files(str(entry))
+        elif file.exists():
+            files = [str(file)]
+        else:
+            raise ValueError(f"This local file {file} does not exist.")
+    if not files:
+        raise ValueError(f"No files found for local dataset {path}.")
+    return files
+
+
 def find_dataset(ds_name: str, prefer_local: bool = False):
-    """Heuristics to determine dataset type."""
+    """Heuristics to determine dataset type.
+
+    Local datasets may be a file, a directory, a glob pattern or a file list (see
+    :func:`local_files`); they become one ``FileList`` that local runs spread over
+    their transformer containers (or, with ``--native``, worker processes).
+    """
     if re.match(r"^https?://", ds_name):
         url = ds_name
         if not prefer_local:
@@ -40,18 +114,14 @@ def find_dataset(ds_name: str, prefer_local: bool = False):
         file_path = unquote(parsed_uri.path)
         if os.name == "nt" and file_path.startswith("/"):
             file_path = file_path[1:]
-        file = Path(file_path).absolute()
-        if file.exists():
-            return dataset.FileList([str(file)]), SXLocationOptions.mustUseLocal
-        else:
-            raise ValueError(f"This local file {file} does not exist.")
+        return dataset.FileList(local_files(file_path)), SXLocationOptions.mustUseLocal
     elif re.match(r"^rucio://", ds_name):
         did = ds_name[8:]
         return dataset.Rucio(did), SXLocationOptions.mustUseRemote
     else:
         file = Path(ds_name).absolute()
-        if file.exists():
-            return dataset.FileList([str(file)]), SXLocationOptions.mustUseLocal
+        if file.exists() or (_has_glob(ds_name) and glob.glob(ds_name)):
+            return dataset.FileList(local_files(ds_name)), SXLocationOptions.mustUseLocal
         else:
             if os.path.sep in ds_name:
                 raise ValueError(f"{ds_name} looks like a file path, but the file does not exist")
@@ -59,19 +129,254 @@ def find_dataset(ds_name: str, prefer_local: bool = False):
             return dataset.Rucio(did), SXLocationOptions.mustUseRemote
 
 
-def install_sx_local():
+def _safe_name(name: str) -> str:
+    return name.replace("*", "_").replace(";", "_").replace(":", "_")
+
+
+def output_file_name(input_file: str) -> str:
+    """Name of the file ServiceX delivers for ``input_file``."""
+    name = input_file.replace("/", ":")
+    if len(name) > OUTPUT_NAME_MAX_LEN:
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+        name = f"_{digest}{name[-(OUTPUT_NAME_MAX_LEN - len(digest) - 1):]}"
+    return _safe_name(name)
+
+
+def rucio_files(did: str) -> List[str]:
+    """The files (as ``scope:name`` DIDs) of a rucio dataset or container."""
+    try:
+        from rucio.client import Client
+    except ImportError as exc:
+        raise ImportError(
+            "Listing the files of a rucio dataset needs the rucio client; install it or "
+            "count local files with --native."
+        ) from exc
+    scope, name = did.split(":", 1)
+    return [f"{f['scope']}:{f['name']}" for f in Client().list_files(scope, name)]
+
+
+def source_files(ds_name: str, delivered: List[str]) -> List[str]:
+    """The input file each of the ``delivered`` files of ``ds_name`` was made from.
+
+    Delivered files are named by :func:`output_file_name`. The inputs of a
+    file-list dataset are its files, and each delivered file is the one named
+    after an input. The inputs of a rucio dataset are the files rucio lists;
+    they are read from replicas whose paths are not known here, so a delivered
+    file is matched on the end of the replica path its name keeps, which ends
+    with the file name.
+    """
+    dataset_obj, _ = find_dataset(ds_name)
+    named: Optional[Dict[str, str]] = None
+    if isinstance(dataset_obj, dataset.FileList):
+        named = {output_file_name(source): source for source in dataset_obj.files}
+    else:
+        file_names = {
+            did: _safe_name(did.split(":", 1)[1]) for did in rucio_files(dataset_obj.dataset)
+        }
+    sources = []
+    for path in delivered:
+        name = Path(path).name
+        if name.endswith(".parquet"):
+            name = name[: -len(".parquet")]
+        if named is not None:
+            matches = [named[name]] if name in named else []
+        else:
+            tail = _HASHED_OUTPUT_NAME.sub("", name)
+            matches = [
+                did
+                for did, file_name in file_names.items()
+                if tail.endswith(file_name) or file_name.endswith(tail)
+            ]
+        if len(matches) != 1:
+            raise ValueError(f"Cannot tell which input file of {ds_name} produced {path}.")
+        sources.append(matches[0])
+    return sources
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode()).hexdigest()[:16]
+
+
+def _directory_hash(directory: Path) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(directory.rglob("*")):
+        if path.is_file():
+            digest.update(path.relative_to(directory).as_posix().encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class CachedCodegen:
+    """Code generator that keeps the code generated for each query, keyed by
+    :func:`query_hash`, and copies it out on later requests for the same query."""
+
+    def __init__(self, codegen, cache_dir: Path = LOCAL_CACHE_DIR / "codegen"):
+        self.codegen = codegen
+        self.cache_dir = cache_dir
+
+    def gen_code(
+        self, query: str, directory: Path, transformer_capabilities_file: Optional[Path] = None
+    ) -> Path:
+        cached = self.cache_dir / query_hash(query)
+        if not cached.exists():
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            staging = Path(tempfile.mkdtemp(dir=self.cache_dir))
+            self.codegen.gen_code(query, staging, transformer_capabilities_file)
+            try:
+                staging.rename(cached)
+            except OSError:
+                # Another run cached the same query first.
+                shutil.rmtree(staging, ignore_errors=True)
+        else:
+            logging.info(f"Reusing generated code for query {cached.name}")
+        shutil.copytree(cached, directory, dirs_exist_ok=True)
+        return directory
+
+
+def _docker(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["docker", *args], capture_output=True, text=True)
+
+
+class WarmDockerPool:
+    """Science runner that transforms files in long-lived transformer containers.
+
+    The transformer compiles the generated code the first time it runs in a
+    container, so rather than one fresh container per file (as
+    ``DockerScienceImage`` does), the pool keeps ``workers`` containers per
+    generated code and mount set up for ``warm_seconds`` and runs every file in
+    one of them with ``docker exec``. Containers are named after the code hash,
+    so later runs of the same query (also from other processes) find them
+    compiled. Files are split over the containers and transformed concurrently.
+
+    A container exits ``warm_seconds`` after it starts, so its name also holds
+    the half of ``warm_seconds`` it was started in, and each file goes to the
+    container of the current half. That container has at least half its time
+    left, and a container near its end is left to finish the files already
+    sent to it rather than being replaced under them.
+    """
+
+    def __init__(
+        self,
+        image: str = XAOD_TRANSFORMER_IMAGE,
+        workers: Optional[int] = None,
+        warm_seconds: int = DEFAULT_WARM_SECONDS,
+        cache_dir: Path = LOCAL_CACHE_DIR / "generated",
+    ):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("workers must be >= 1.")
+        self.image = image
+        self.workers = workers
+        self.warm_seconds = warm_seconds
+        self.cache_dir = cache_dir
+
+    def _stable_code_dir(self, generated_files_dir: Path) -> Tuple[str, Path]:
+        key = _directory_hash(generated_files_dir)
+        code_dir = self.cache_dir / key
+        if not code_dir.exists():
+            shutil.copytree(generated_files_dir, code_dir, dirs_exist_ok=True)
+        write_file_runner_script(code_dir)
+        write_kickoff_script(code_dir)
+        return key, code_dir
+
+    def _mounts(
+        self, code_dir: Path, input_files: List[str], output_directory: Path
+    ) -> Tuple[List[str], List[str]]:
+        """Volume options of a container, and the in-container path of each input."""
+        volumes = ["-v", f"{code_dir.absolute()}:/generated"]
+        volumes += ["-v", f"{output_directory.parent.absolute()}:/servicex/output"]
+        x509up_path = Path(os.getenv("TEMP", "/tmp")) / "x509up"
+        if x509up_path.exists():
+            volumes += ["-v", f"{x509up_path}:/tmp/grid-security/x509up"]
+        input_dirs: Dict[Path, str] = {}
+        container_paths = []
+        for input_file in input_files:
+            if input_file.startswith(("root://", "http://", "https://")):
+                container_paths.append(input_file)
+                continue
+            input_path = Path(input_file).absolute()
+            if not input_path.exists():
+                raise FileNotFoundError(f"Input file for local transform {input_file} not found.")
+            if input_path.parent not in input_dirs:
+                input_dirs[input_path.parent] = f"/input/{len(input_dirs)}"
+                volumes += ["-v", f"{input_path.parent}:{input_dirs[input_path.parent]}:ro"]
+            container_paths.append(f"{input_dirs[input_path.parent]}/{input_path.name}")
+        return volumes, container_paths
+
+    def _container_name(self, key: str, mount_key: str, shard: int) -> str:
+        generation = int(time.time() // max(self.warm_seconds // 2, 1))
+        return f"aop_transformer_{key}_{mount_key}_{shard}_{generation}"
+
+    def _container(self, name: str, volumes: List[str]) -> str:
+        running = _docker("inspect", "-f", "{{.State.Running}}", name)
+        if running.returncode == 0 and running.stdout.strip() == "true":
+            logging.info(f"Reusing warm transformer container {name}")
+            return name
+        _docker("rm", "-f", name)
+        options = ["-d", "--rm", "--name", name, "--platform", "linux/amd64", *volumes]
+        started = _docker("run", *options, self.image, "sleep", str(self.warm_seconds))
+        if started.returncode != 0:
+            raise RuntimeError(f"Failed to start transformer container {name}: {started.stderr}")
+        return name
+
+    def transform(
+        self,
+        generated_files_dir: Path,
+        input_files: List[str],
+        output_directory: Path,
+        output_format: str,
+    ) -> List[Path]:
+        key, code_dir = self._stable_code_dir(generated_files_dir)
+        volumes, container_paths = self._mounts(code_dir, input_files, output_directory)
+        mount_key = hashlib.sha256(" ".join(volumes).encode()).hexdigest()[:8]
+        output_directory.mkdir(parents=True, exist_ok=True)
+        jobs = list(zip(container_paths, input_files))
+        n_shards = min(self.workers, len(jobs))
+
+        def run_shard(shard: int) -> None:
+            for container_path, input_file in jobs[shard::n_shards]:
+                name = self._container(self._container_name(key, mount_key, shard), volumes)
+                command = ["docker", "exec", name, "bash", "/generated/file_runner.sh"]
+                output = f"/servicex/output/{output_directory.name}/{output_file_name(input_file)}"
+                run_command_with_logging(
+                    command + [container_path, output, output_format],
+                    log_file=code_dir / f"docker_log_{shard}.txt",
+                )
+
+        with ThreadPoolExecutor(max_workers=max(n_shards, 1)) as pool:
+            list(pool.map(run_shard, range(n_shards)))
+        # Outputs are named after the whole input path, as ServiceX names them, so
+        # inputs with the same name in different directories do not collide.
+        output_files = [
+            output_directory / output_file_name(input_file) for input_file in input_files
+        ]
+        missing = [str(path) for path in output_files if not path.exists()]
+        if missing:
+            raise RuntimeError(f"Local transform produced no output for: {', '.join(missing)}")
+        return output_files
+
+
+# One adaptor per worker count, so a process (e.g. ``serve``) reuses its
+# runner and warm containers across deliveries.
+_LOCAL_ADAPTORS: Dict[int, Tuple[str, str, object]] = {}
+
+
+def install_sx_local(workers: Optional[int] = None):
     codegen_name = "atlasr22-local"
     if None in (LocalXAODCodegen, DockerScienceImage, SXLocalAdaptor):
         raise ImportError("servicex-local is not installed or could not be imported.")
-    codegen = LocalXAODCodegen()  # type: ignore
-    science_runner = DockerScienceImage(
-        "sslhep/servicex_func_adl_xaod_transformer:25.2.41",
-    )  # type: ignore
-    adaptor = SXLocalAdaptor(
-        codegen, science_runner, codegen_name, "http://localhost:5001"
-    )  # type: ignore
-    logging.info(f"Using local ServiceX endpoint: codegen {codegen_name}")
-    return codegen_name, "local-backend", adaptor
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers not in _LOCAL_ADAPTORS:
+        codegen = CachedCodegen(LocalXAODCodegen())  # type: ignore
+        science_runner = WarmDockerPool(XAOD_TRANSFORMER_IMAGE, workers=workers)
+        adaptor = SXLocalAdaptor(
+            codegen, science_runner, codegen_name, "http://localhost:5001"
+        )  # type: ignore
+        logging.info(f"Using local ServiceX endpoint: codegen {codegen_name}")
+        _LOCAL_ADAPTORS[workers] = (codegen_name, "local-backend", adaptor)
+    return _LOCAL_ADAPTORS[workers]
 
 
 def build_sx_spec(
@@ -81,6 +386,7 @@ def build_sx_spec(
     backend_name: Optional[str] = None,
     n_files: Optional[int] = None,
     title: str = "MySample",
+    local_workers: Optional[int] = None,
 ):
     dataset_obj, location_options = find_dataset(ds_name, prefer_local=prefer_local)
     if location_options == SXLocationOptions.mustUseRemote:
@@ -91,7 +397,7 @@ def build_sx_spec(
         use_local = False
     adaptor = None
     if use_local:
-        codegen_name, backend_name_local, adaptor = install_sx_local()
+        codegen_name, backend_name_local, adaptor = install_sx_local(local_workers)
         backend = backend_name_local
     else:
         backend = backend_name
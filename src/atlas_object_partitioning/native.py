@@ -0,0 +1,136 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Optional
+
+import awkward as ak
+import numpy as np
+import uproot
+
+from atlas_object_partitioning.columns import CountTable
+from atlas_object_partitioning.local_mode import SXLocationOptions, find_dataset
+
+# Event tree of PHYSLITE files.
+PHYSLITE_TREE = "CollectionTree"
+
+# Per count axis, a branch with one entry per object of the collection the
+# ServiceX count query reads (see ``scan_ds.AXIS_EXPRESSIONS``). Only the
+# entry offsets of the branch are used.
+AXIS_BRANCHES: Dict[str, str] = {
+    "n_jets": "AnalysisJetsAuxDyn.pt",
+    "n_large_jets": "AnalysisLargeRJetsAuxDyn.pt",
+    "n_electrons": "AnalysisElectronsAuxDyn.pt",
+    "n_muons": "AnalysisMuonsAuxDyn.pt",
+    "n_taus": "AnalysisTauJetsAuxDyn.pt",
+    "n_photons": "AnalysisPhotonsAuxDyn.pt",
+}
+
+# ``met`` is the magnitude of the first term of the MissingET container in GeV,
+# as in the count query (PHYSLITE is not recalibrated).
+MET_BRANCHES = ("MET_Core_AnalysisMETAuxDyn.mpx", "MET_Core_AnalysisMETAuxDyn.mpy")
+
+EVENT_ID_BRANCHES: Dict[str, str] = {
+    "run_number": "EventInfoAuxDyn.runNumber",
+    "event_number": "EventInfoAuxDyn.eventNumber",
+}
+
+# Amount of branch data uproot decompresses at a time.
+DEFAULT_NATIVE_STEP_SIZE = "200 MB"
+
+
+def local_physlite_files(ds_name: str, n_files: int = 1) -> List[str]:
+    """Paths of the local files of ``ds_name`` (the first ``n_files``, 0 for all)."""
+    dataset_obj, location = find_dataset(ds_name, prefer_local=True)
+    if location != SXLocationOptions.mustUseLocal:
+        raise ValueError(f"{ds_name} is not a local dataset.")
+    files = list(dataset_obj.files)
+    return files if n_files == 0 else files[:n_files]
+
+
+def physlite_entries(path: str) -> int:
+    """Number of events (``CollectionTree`` entries) in one PHYSLITE file."""
+    with uproot.open(path) as f:
+        if PHYSLITE_TREE not in f:
+            raise ValueError(f"{path} has no {PHYSLITE_TREE} tree; is it a PHYSLITE file?")
+        return int(f[PHYSLITE_TREE].num_entries)
+
+
+def _needed_branches(axes: List[str], with_event_ids: bool) -> List[str]:
+    unknown = [ax for ax in axes if ax not in AXIS_BRANCHES and ax != "met"]
+    if unknown:
+        raise ValueError(f"Unknown axes: {', '.join(unknown)}")
+    branches = [AXIS_BRANCHES[ax] for ax in axes if ax in AXIS_BRANCHES]
+    if "met" in axes:
+        branches += list(MET_BRANCHES)
+    if with_event_ids:
+        branches += list(EVENT_ID_BRANCHES.values())
+    return branches
+
+
+def _first_met(mpx: ak.Array, mpy: ak.Array) -> np.ndarray:
+    # Events without a MissingET term get 0.
+    px = ak.to_numpy(ak.fill_none(ak.firsts(mpx), 0.0)).astype(np.float32)
+    py = ak.to_numpy(ak.fill_none(ak.firsts(mpy), 0.0)).astype(np.float32)
+    return np.hypot(px, py).astype(np.float64) / 1000.0
+
+
+def count_physlite_file(
+    path: str,
+    axes: List[str],
+    with_event_ids: bool = False,
+    step_size: str = DEFAULT_NATIVE_STEP_SIZE,
+) -> CountTable:
+    """Count the objects of ``axes`` in every event of one PHYSLITE file.
+
+    Reads only the branches that carry the collection sizes (and the MissingET
+    components for ``met``), so no transformer or container is needed. The
+    columns match those of the ServiceX count query, in the order of ``axes``.
+    """
+    branches = _needed_branches(axes, with_event_ids)
+    with uproot.open(path) as f:
+        if PHYSLITE_TREE not in f:
+            raise ValueError(f"{path} has no {PHYSLITE_TREE} tree; is it a PHYSLITE file?")
+        tree = f[PHYSLITE_TREE]
+        missing = [branch for branch in branches if branch not in tree]
+        if missing:
+            raise ValueError(f"{path} is missing PHYSLITE branches: {', '.join(missing)}")
+        names = list(axes) + (list(EVENT_ID_BRANCHES) if with_event_ids else [])
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        for chunk in tree.iterate(branches, step_size=step_size, library="ak"):
+            for axis in axes:
+                if axis == "met":
+                    values = _first_met(chunk[MET_BRANCHES[0]], chunk[MET_BRANCHES[1]])
+                else:
+                    values = ak.to_numpy(ak.num(chunk[AXIS_BRANCHES[axis]], axis=1))
+                    values = values.astype(np.int32)
+                parts[axis].append(values)
+            if with_event_ids:
+                for name, branch in EVENT_ID_BRANCHES.items():
+                    parts[name].append(ak.to_numpy(chunk[branch]))
+    return CountTable.from_columns(
+        {
+            name: (
+                np.concatenate(values)
+                if values
+                else np.zeros(0, dtype=np.float64 if name == "met" else np.int32)
+            )
+            for name, values in parts.items()
+        }
+    )
+
+
+def count_physlite_files(
+    paths: List[str],
+    axes: List[str],
+    with_event_ids: bool = False,
+    workers: Optional[int] = None,
+) -> List[CountTable]:
+    """Count the objects of ``axes`` in each file, one file per local worker
+    process (``None`` for one per core). Returns one table per file."""
+    _needed_branches(axes, with_event_ids)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(paths) <= 1:
+        return [count_physlite_file(path, axes, with_event_ids) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        return list(pool.map(count_physlite_file, paths, repeat(axes), repeat(with_event_ids)))
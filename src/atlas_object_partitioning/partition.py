@@ -1,35 +1,104 @@
-from typing import Dict, List, Optional, Tuple
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+import os
 import shlex
 import sys
+import time
 import numpy as np
 import awkward as ak
 import typer
 import yaml
-from hist import BaseHist
 from rich.console import Console
 from rich.table import Table
 
+from atlas_object_partitioning.assign import (
+    DEFAULT_ASSIGN_CHUNK_SIZE,
+    PartitionAssigner,
+    assign_parquet,
+    write_group_dataset,
+)
+from atlas_object_partitioning.catalog import load_axis_catalog
+from atlas_object_partitioning.chunked import DEFAULT_CHUNK_SIZE, ChunkedCounts
+from atlas_object_partitioning.columns import CountTable
+from atlas_object_partitioning.composite import (
+    add_composite_axes,
+    composite_axis_name,
+    composite_components,
+    input_axes,
+    is_composite,
+)
+from atlas_object_partitioning.event_index import (
+    DEFAULT_EVENT_INDEX_FILE,
+    DEFAULT_FILE_COMPOSITION_FILE,
+    EventIndex,
+    FileComposition,
+)
 from atlas_object_partitioning.histograms import (
-    apply_tail_caps,
     bottom_bins,
-    build_nd_histogram,
-    compute_bin_boundaries,
+    calc_usage_fraction,
+    cell_group_labels,
+    CostModel,
+    DEFAULT_FILL_CHUNK_SIZE,
+    edge_value,
+    group_counts_from_labels,
     histogram_summary,
-    histogram_boundaries,
+    KDTreeNodes,
     MergedCellGroup,
     MergedCells,
-    merge_sparse_bins,
-    merge_sparse_cells,
     print_bin_table,
+    selected_groups,
     top_bins,
     write_bin_boundaries_yaml,
-    write_histogram_pickle,
 )
-from atlas_object_partitioning.scan_ds import collect_object_counts
+from atlas_object_partitioning.kdtree import DEFAULT_KDTREE_LEAF_FRACTION, KDTree
+from atlas_object_partitioning.partitioner import Partitioner
+from atlas_object_partitioning.scan_ds import (
+    ALL_AXES,
+    collect_object_counts,
+    collect_object_counts_chunked,
+    collect_object_counts_with_provenance,
+    collect_object_counts_with_sketches,
+    select_axes,
+)
+from atlas_object_partitioning.service import (
+    LoadedPartition,
+    PartitionService,
+    create_server,
+)
+from atlas_object_partitioning.sketches import (
+    DEFAULT_KLL_K,
+    Sketch,
+    compute_bin_boundaries_from_sketches,
+    load_sketches_yaml,
+    merge_sketches,
+    write_sketches_yaml,
+)
+from atlas_object_partitioning.stability import (
+    DEFAULT_CONFIDENCE,
+    DEFAULT_REPLICATES,
+    bootstrap_stability,
+)
 
 app = typer.Typer()
 
 
+class CountsBackend(str, Enum):
+    memory = "memory"
+    chunked = "chunked"
+
+
+class PartitionMode(str, Enum):
+    grid = "grid"
+    kdtree = "kdtree"
+
+
+class PruneScore(str, Enum):
+    entropy = "entropy"
+    variance = "variance"
+
+
 def _parse_bins_per_axis_overrides(entries: List[str]) -> Dict[str, int]:
     overrides: Dict[str, int] = {}
     for entry in entries:
@@ -62,9 +131,116 @@ def _parse_bins_per_axis_overrides(entries: List[str]) -> Dict[str, int]:
     return overrides
 
 
+def _parse_cost_weights(entries: List[str], known_axes: List[str]) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for entry in entries:
+        axis, sep, value = entry.partition("=")
+        if not sep or not axis:
+            raise typer.BadParameter(
+                f"Invalid --cost-weight value '{entry}'. Expected AXIS=BYTES."
+            )
+        if axis not in known_axes:
+            raise typer.BadParameter(f"Invalid --cost-weight value '{entry}'. Unknown axis.")
+        try:
+            weight = float(value)
+        except ValueError as exc:
+            raise typer.BadParameter(
+                f"Invalid --cost-weight value '{entry}'. Bytes must be a number."
+            ) from exc
+        if weight < 0:
+            raise typer.BadParameter(f"Invalid --cost-weight value '{entry}'. Bytes must be >= 0.")
+        if axis in weights:
+            raise typer.BadParameter(f"Duplicate --cost-weight axis '{axis}'.")
+        weights[axis] = weight
+    return weights
+
+
+def _parse_composite_axes(entries: List[str], axes: List[str]) -> List[List[str]]:
+    composites: List[List[str]] = []
+    used: List[str] = []
+    for entry in entries:
+        components = [c.strip() for c in entry.split(",") if c.strip()]
+        if len(components) < 2:
+            raise typer.BadParameter(
+                f"Invalid --composite-axis value '{entry}'. Expected AXIS,AXIS[,AXIS...]."
+            )
+        unknown = [c for c in components if c not in axes]
+        if unknown:
+            raise typer.BadParameter(
+                f"Invalid --composite-axis value '{entry}'. Unknown or ignored axes: "
+                f"{', '.join(unknown)}"
+            )
+        shared = [c for c in components if c in used or components.count(c) > 1]
+        if shared:
+            raise typer.BadParameter(
+                f"Axes are in more than one --composite-axis: {', '.join(shared)}"
+            )
+        used += components
+        composites.append(components)
+    return composites
+
+
+def _load_axis_catalog(file_path: Optional[str], native: bool) -> Optional[Dict[str, str]]:
+    if file_path is None:
+        return None
+    if native:
+        raise typer.BadParameter("--axis-catalog cannot be combined with --native.")
+    try:
+        return load_axis_catalog(file_path)
+    except (OSError, ValueError) as exc:
+        raise typer.BadParameter(f"--axis-catalog {file_path} is invalid: {exc}") from exc
+
+
+def _load_cost_model(file_path: str) -> Optional[CostModel]:
+    with open(file_path) as f:
+        data = yaml.safe_load(f)
+    cost_model = data.get("cost_model") if isinstance(data, dict) else None
+    if cost_model is None:
+        return None
+    try:
+        return CostModel.model_validate(cost_model)
+    except ValueError as exc:
+        raise typer.BadParameter(f"{file_path} cost_model entry is invalid: {exc}") from exc
+
+
+def _parse_named_paths(entries: List[str], option: str) -> Dict[str, str]:
+    named: Dict[str, str] = {}
+    for entry in entries:
+        if "=" in entry:
+            name, path = entry.split("=", 1)
+        else:
+            name, path = Path(entry).stem, entry
+        if not name or not path:
+            raise typer.BadParameter(f"Invalid {option} value '{entry}'. Expected [NAME=]PATH.")
+        if name in named:
+            raise typer.BadParameter(f"Duplicate {option} name '{name}'.")
+        named[name] = path
+    return named
+
+
+def _clean_box(file_path: str, box: object) -> Optional[Dict[str, List[int]]]:
+    if box is None:
+        return None
+    if not isinstance(box, dict):
+        raise typer.BadParameter(f"{file_path} merged_cells group box is not a mapping.")
+    cleaned: Dict[str, List[int]] = {}
+    for axis, bounds in box.items():
+        if not isinstance(axis, str) or not isinstance(bounds, list) or len(bounds) != 2:
+            raise typer.BadParameter(
+                f"{file_path} merged_cells group box entries must be AXIS: [first, stop]."
+            )
+        try:
+            cleaned[axis] = [int(bounds[0]), int(bounds[1])]
+        except (TypeError, ValueError) as exc:
+            raise typer.BadParameter(
+                f"{file_path} merged_cells group box bounds must be integers."
+            ) from exc
+    return cleaned
+
+
 def _load_bin_boundaries_file(
     file_path: str,
-) -> Tuple[Dict[str, List[int]], Optional[MergedCells], List[str]]:
+) -> Tuple[Dict[str, List[float]], Optional[MergedCells], List[str]]:
     try:
         with open(file_path) as f:
             data = yaml.safe_load(f)
@@ -75,7 +251,7 @@ def _load_bin_boundaries_file(
     axes = data["axes"]
     if not isinstance(axes, dict) or not axes:
         raise typer.BadParameter(f"{file_path} axes entry is not a mapping.")
-    cleaned_axes: Dict[str, List[int]] = {}
+    cleaned_axes: Dict[str, List[float]] = {}
     for axis, edges in axes.items():
         if not isinstance(axis, str) or not axis:
             raise typer.BadParameter(f"{file_path} has an invalid axis name.")
@@ -86,10 +262,10 @@ def _load_bin_boundaries_file(
                 f"{file_path} axis {axis} needs at least two bin edges."
             )
         try:
-            cleaned_axes[axis] = [int(edge) for edge in edges]
+            cleaned_axes[axis] = [edge_value(edge) for edge in edges]
         except (TypeError, ValueError) as exc:
             raise typer.BadParameter(
-                f"{file_path} axis {axis} edges must be integers."
+                f"{file_path} axis {axis} edges must be numeric."
             ) from exc
     commands_data = data.get("commands", [])
     if commands_data is None:
@@ -118,13 +294,14 @@ def _load_bin_boundaries_file(
     groups = merged_cells_data["groups"]
     if not isinstance(groups, list):
         raise typer.BadParameter(f"{file_path} merged_cells.groups must be a list.")
-    cleaned_groups: List[List[Dict[str, int]]] = []
+    cleaned_groups: List[Tuple[List[Dict[str, int]], Optional[Dict[str, List[int]]]]] = []
     for group in groups:
-        if not isinstance(group, dict) or "cells" not in group:
+        if not isinstance(group, dict) or ("cells" not in group and "box" not in group):
             raise typer.BadParameter(
-                f"{file_path} merged_cells.groups entries must be mappings with cells."
+                f"{file_path} merged_cells.groups entries must be mappings with cells or a box."
             )
-        cells = group["cells"]
+        box = _clean_box(file_path, group.get("box"))
+        cells = group.get("cells", [])
         if not isinstance(cells, list):
             raise typer.BadParameter(
                 f"{file_path} merged_cells group cells must be a list."
@@ -148,20 +325,33 @@ def _load_bin_boundaries_file(
                         f"{file_path} merged_cells cell values must be integers."
                     ) from exc
             cleaned_cells.append(cleaned_cell)
-        cleaned_groups.append(cleaned_cells)
+        cleaned_groups.append((cleaned_cells, box))
     merged_cells = MergedCells(
         min_fraction=min_fraction,
         groups=[
-            MergedCellGroup(cells=group, count=0, fraction=0.0)
-            for group in cleaned_groups
+            MergedCellGroup(cells=cells, box=box, count=0, fraction=0.0)
+            for cells, box in cleaned_groups
         ],
     )
     return cleaned_axes, merged_cells, commands
 
 
+def _load_start_bins(file_path: str) -> Dict[str, int]:
+    """Bins per axis of an earlier partition, to warm-start the adaptive search."""
+    boundaries, _, _ = _load_bin_boundaries_file(file_path)
+    with open(file_path) as f:
+        requested = yaml.safe_load(f).get("bins_per_axis") or {}
+    try:
+        return {
+            ax: int(requested.get(ax, len(edges) - 1)) for ax, edges in boundaries.items()
+        }
+    except (AttributeError, TypeError, ValueError) as exc:
+        raise typer.BadParameter(f"{file_path} bins_per_axis entry is invalid.") from exc
+
+
 def _load_bin_boundaries_usage(
     file_path: str,
-) -> Tuple[Dict[str, List[int]], List[Dict[str, object]]]:
+) -> Tuple[Dict[str, List[float]], List[Dict[str, object]]]:
     try:
         with open(file_path) as f:
             data = yaml.safe_load(f)
@@ -172,7 +362,7 @@ def _load_bin_boundaries_usage(
     axes = data["axes"]
     if not isinstance(axes, dict) or not axes:
         raise typer.BadParameter(f"{file_path} axes entry is not a mapping.")
-    cleaned_axes: Dict[str, List[int]] = {}
+    cleaned_axes: Dict[str, List[float]] = {}
     for axis, edges in axes.items():
         if not isinstance(axis, str) or not axis:
             raise typer.BadParameter(f"{file_path} has an invalid axis name.")
@@ -183,10 +373,10 @@ def _load_bin_boundaries_usage(
                 f"{file_path} axis {axis} needs at least two bin edges."
             )
         try:
-            cleaned_axes[axis] = [int(edge) for edge in edges]
+            cleaned_axes[axis] = [edge_value(edge) for edge in edges]
         except (TypeError, ValueError) as exc:
             raise typer.BadParameter(
-                f"{file_path} axis {axis} edges must be integers."
+                f"{file_path} axis {axis} edges must be numeric."
             ) from exc
     merged_cells = data.get("merged_cells")
     if not isinstance(merged_cells, dict):
@@ -196,12 +386,13 @@ def _load_bin_boundaries_usage(
         raise typer.BadParameter(f"{file_path} merged_cells.groups must be a list.")
     cleaned_groups: List[Dict[str, object]] = []
     for group in groups:
-        if not isinstance(group, dict) or "cells" not in group:
+        if not isinstance(group, dict) or ("cells" not in group and "box" not in group):
             raise typer.BadParameter(
-                f"{file_path} merged_cells.groups entries must be mappings with cells."
+                f"{file_path} merged_cells.groups entries must be mappings with cells or a box."
             )
-        cells = group["cells"]
-        if not isinstance(cells, list) or not cells:
+        box = _clean_box(file_path, group.get("box"))
+        cells = group.get("cells", [])
+        if not isinstance(cells, list) or (not cells and box is None):
             raise typer.BadParameter(
                 f"{file_path} merged_cells group cells must be a non-empty list."
             )
@@ -234,52 +425,55 @@ def _load_bin_boundaries_usage(
                         f"{file_path} merged_cells cell values must be integers."
                     ) from exc
             cleaned_cells.append(cleaned_cell)
-        cleaned_groups.append({"cells": cleaned_cells, "fraction": fraction})
+        cleaned_groups.append({"cells": cleaned_cells, "box": box, "fraction": fraction})
     return cleaned_axes, cleaned_groups
 
 
+def _load_kdtree(file_path: str) -> Optional[KDTree]:
+    """The kd-tree of a ``--mode kdtree`` partition, or ``None`` for a grid partition."""
+    try:
+        with open(file_path) as f:
+            data = yaml.safe_load(f)
+    except FileNotFoundError as exc:
+        raise typer.BadParameter(f"{file_path} does not exist.") from exc
+    if not isinstance(data, dict) or data.get("kdtree") is None:
+        return None
+    try:
+        bounds = {
+            axis: [edge_value(edge) for edge in edges] for axis, edges in data["axes"].items()
+        }
+        return KDTree(bounds, KDTreeNodes.model_validate(data["kdtree"]))
+    except (KeyError, AttributeError, TypeError, ValueError) as exc:
+        raise typer.BadParameter(f"{file_path} kdtree entry is invalid: {exc}") from exc
+
+
 def _calc_usage_fraction(
-    boundaries: Dict[str, List[int]],
+    boundaries: Dict[str, List[float]],
     merged_groups: List[Dict[str, object]],
-    cuts: Dict[str, int],
+    cuts: Dict[str, float],
 ) -> float:
-    allowed_bins_by_axis: Dict[str, set[int]] = {}
-    for axis, edges in boundaries.items():
-        n_bins = len(edges) - 1
-        if axis in cuts:
-            min_value = cuts[axis]
-            allowed_bins_by_axis[axis] = {
-                idx for idx in range(n_bins) if edges[idx + 1] > min_value
-            }
-        else:
-            allowed_bins_by_axis[axis] = set(range(n_bins))
+    try:
+        return calc_usage_fraction(boundaries, merged_groups, cuts)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
 
-    if any(not bins for bins in allowed_bins_by_axis.values()):
-        return 0.0
 
-    usage = 0.0
-    for group in merged_groups:
-        cells = group["cells"]
-        fraction = float(group["fraction"])
-        matched = False
-        for cell in cells:
-            if any(axis not in cell for axis in boundaries):
-                raise typer.BadParameter(
-                    "Merged cell group is missing axis entries for usage calculation."
-                )
-            if any(
-                cell[axis] < 0 or cell[axis] >= len(boundaries[axis]) - 1
-                for axis in boundaries
-            ):
-                raise typer.BadParameter(
-                    "Merged cell group has out-of-range bin indices."
-                )
-            if all(cell[axis] in allowed_bins_by_axis[axis] for axis in boundaries):
-                matched = True
-                break
-        if matched:
-            usage += fraction
-    return usage
+def _format_bytes(n_bytes: float) -> str:
+    units = ["B", "kB", "MB", "GB", "TB", "PB"]
+    unit = 0
+    while n_bytes >= 1000.0 and unit < len(units) - 1:
+        n_bytes /= 1000.0
+        unit += 1
+    return f"{n_bytes:.1f} {units[unit]}"
+
+
+def _load_event_index(file_path: str) -> EventIndex:
+    try:
+        return EventIndex.load(file_path)
+    except FileNotFoundError as exc:
+        raise typer.BadParameter(f"{file_path} does not exist.") from exc
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
 
 
 def _format_index_ranges(indices: List[int]) -> str:
@@ -305,7 +499,7 @@ def _format_index_ranges(indices: List[int]) -> str:
     return ", ".join(parts)
 
 
-def _format_index_ranges_with_edges(indices: List[int], edges: List[int]) -> str:
+def _format_index_ranges_with_edges(indices: List[int], edges: List[float]) -> str:
     if not indices:
         return "-"
     ranges: List[Tuple[int, int]] = []
@@ -350,6 +544,10 @@ def _score_candidate(
     )
 
 
+# Steps a warm-started adaptive search may take from its starting configuration.
+_WARM_START_MAX_STEPS = 8
+
+
 def _adaptive_score(
     summary: Dict[str, float],
     target_min_fraction: float,
@@ -367,32 +565,41 @@ def _adaptive_score(
 
 
 def _adaptive_bins_search(
-    counts: ak.Array,
-    ignore_axes: List[str],
+    partitioner: Partitioner,
     bins_per_axis: int,
     overrides: Dict[str, int],
     target_min_fraction: float,
     target_max_fraction: float,
     min_bins: int,
-) -> Tuple[Dict[str, int], Dict[str, List[int]], BaseHist, Dict[str, float]]:
-    axes = [ax for ax in counts.fields if ax not in ignore_axes]
-    bins_by_axis = {ax: overrides.get(ax, bins_per_axis) for ax in axes}
+    start: Optional[Dict[str, int]] = None,
+) -> Tuple[Dict[str, int], Dict[str, float]]:
+    """Reduce bins one axis at a time; ``partitioner`` is left on the result.
+
+    With ``start`` (bins per axis of an earlier result) the search begins there
+    instead and also tries one more bin per axis, so it only walks the few
+    steps to the nearest configuration that meets the targets. Under a cell
+    budget every candidate is refitted to the budget, and the search begins
+    from the bins the budget leaves.
+    """
+    axes = partitioner.axes
+    start = start or {}
+    bins_by_axis = {
+        ax: overrides.get(ax, max(min_bins, start.get(ax, bins_per_axis))) for ax in axes
+    }
+    if partitioner.cell_budget is not None:
+        bins_by_axis = partitioner.with_bins(1, bins_by_axis).bins_by_axis
+        axes = list(bins_by_axis)
     fixed_axes = set(overrides.keys())
+    steps = (-1, 1) if start else (-1,)
+    evaluated: Dict[Tuple[int, ...], Dict[str, float]] = {}
 
-    def build_from_bins(
-        candidate_bins: Dict[str, int],
-    ) -> Tuple[Dict[str, List[int]], BaseHist, Dict[str, float]]:
-        boundaries = compute_bin_boundaries(
-            counts,
-            ignore_axes=ignore_axes,
-            bins_per_axis=1,
-            bins_per_axis_overrides=candidate_bins,
-        )
-        hist = build_nd_histogram(counts, boundaries)
-        summary = histogram_summary(hist)
-        return boundaries, hist, summary
+    def build_from_bins(candidate_bins: Dict[str, int]) -> Dict[str, float]:
+        key = tuple(candidate_bins[ax] for ax in axes)
+        if key not in evaluated:
+            evaluated[key] = partitioner.with_bins(1, candidate_bins).summary
+        return evaluated[key]
 
-    boundaries, hist, summary = build_from_bins(bins_by_axis)
+    summary = build_from_bins(bins_by_axis)
     current_score = _adaptive_score(
         summary, target_min_fraction, target_max_fraction
     )
@@ -401,6 +608,8 @@ def _adaptive_bins_search(
         for ax in axes
         if ax not in fixed_axes
     )
+    if start:
+        max_steps = _WARM_START_MAX_STEPS
     for _ in range(max_steps):
         if (
             summary["max_fraction"] <= target_max_fraction
@@ -410,39 +619,33 @@ def _adaptive_bins_search(
         best = None
         best_score = None
         for axis in axes:
-            if axis in fixed_axes or bins_by_axis[axis] <= min_bins:
-                continue
-            candidate_bins = dict(bins_by_axis)
-            candidate_bins[axis] -= 1
-            candidate_boundaries, candidate_hist, candidate_summary = build_from_bins(
-                candidate_bins
-            )
-            score = _adaptive_score(
-                candidate_summary, target_min_fraction, target_max_fraction
-            )
-            if best is None or score < best_score:
-                best = (
-                    axis,
-                    candidate_bins,
-                    candidate_boundaries,
-                    candidate_hist,
-                    candidate_summary,
+            for step in steps:
+                if axis in fixed_axes or bins_by_axis[axis] + step < min_bins:
+                    continue
+                candidate_bins = dict(bins_by_axis)
+                candidate_bins[axis] += step
+                candidate_summary = build_from_bins(candidate_bins)
+                score = _adaptive_score(
+                    candidate_summary, target_min_fraction, target_max_fraction
                 )
-                best_score = score
+                if best is None or score < best_score:
+                    best = (axis, step, candidate_bins, candidate_summary)
+                    best_score = score
 
         if best is None or best_score is None or best_score >= current_score:
             break
-        axis, bins_by_axis, boundaries, hist, summary = best
+        axis, step, bins_by_axis, summary = best
         current_score = best_score
         typer.echo(
-            "  adaptive reduce "
+            f"  adaptive {'reduce' if step < 0 else 'increase'} "
             f"{axis}={bins_by_axis[axis]}: "
             f"max {summary['max_fraction']:.3f}, "
             f"min nonzero {summary['min_nonzero_fraction']:.3f}, "
             f"zero bins {summary['zero_bins']:,}"
         )
 
-    return bins_by_axis, boundaries, hist, summary
+    typer.echo(f"  adaptive search evaluated {len(evaluated):,} configurations")
+    return partitioner.with_bins(1, bins_by_axis).bins_by_axis, summary
 
 
 @app.command("partition")
@@ -455,6 +658,12 @@ def partition(
         help="Output file name for the object counts parquet file. If not provided, will not "
         "save to file.",
     ),
+    output_dataset: Optional[str] = typer.Option(
+        None,
+        "--output-dataset",
+        help="Also write the object counts as a parquet dataset partitioned by merged-group "
+        "id (hive-style DIR/group=<id>/ directories, sorted by cell within each file).",
+    ),
     n_files: int = typer.Option(
         1,
         "--n-files",
@@ -471,11 +680,53 @@ def partition(
         "--ignore-cache",
         help="Ignore servicex local cache and force fresh data SX query.",
     ),
+    native: bool = typer.Option(
+        False,
+        "--native",
+        help="Count objects in local PHYSLITE files directly with uproot on --workers "
+        "processes, without ServiceX or containers.",
+    ),
+    axis_catalog: Optional[str] = typer.Option(
+        None,
+        "--axis-catalog",
+        help="YAML axis catalog that replaces the built-in axes. Every catalog axis is "
+        "computed by one transform, so --ignore-axes can pick any subset of them later "
+        "without a new one.",
+    ),
+    mode: PartitionMode = typer.Option(
+        PartitionMode.grid,
+        "--mode",
+        help="'grid' bins every axis and merges sparse n-D cells; 'kdtree' recursively "
+        "splits events at the median of one axis until leaves reach --kdtree-leaf-fraction.",
+    ),
+    kdtree_leaf_fraction: float = typer.Option(
+        DEFAULT_KDTREE_LEAF_FRACTION,
+        "--kdtree-leaf-fraction",
+        help="With --mode kdtree, stop splitting leaves holding at most this fraction.",
+    ),
     ignore_axes: List[str] = typer.Option(
         [],
         "--ignore-axes",
-        help="List of axes to ignore when computing bin boundaries. Specify repeatedly for "
-        "multiple axes.",
+        help="List of axes to ignore when computing bin boundaries. Ignored axes are not "
+        "fetched from ServiceX. Specify repeatedly for multiple axes.",
+    ),
+    max_cells: Optional[int] = typer.Option(
+        None,
+        "--max-cells",
+        help="Cap the n-D grid at this many cells: axes that resolve the least (see "
+        "--prune-score) lose bins first, and axes left with one bin are dropped.",
+    ),
+    prune_score: PruneScore = typer.Option(
+        PruneScore.entropy,
+        "--prune-score",
+        help="With --max-cells, score axes by the entropy of their binned marginal or by "
+        "the fraction of their variance the bins explain.",
+    ),
+    composite_axis: List[str] = typer.Option(
+        [],
+        "--composite-axis",
+        help="Fuse correlated count axes, e.g. n_jets,n_large_jets, into one axis binned on "
+        "their joint counts. Repeat for several composite axes; needs the memory backend.",
     ),
     bins_per_axis: int = typer.Option(
         4,
@@ -507,6 +758,12 @@ def partition(
         "--adaptive-min-bins",
         help="Minimum bins allowed per axis when adaptively reducing bins.",
     ),
+    adaptive_start: Optional[str] = typer.Option(
+        None,
+        "--adaptive-start",
+        help="Start the adaptive search (implies --adaptive-bins) from the bins per axis of "
+        "an earlier bin_boundaries.yaml and only explore nearby configurations.",
+    ),
     target_min_fraction: Optional[float] = typer.Option(
         None,
         "--target-min-fraction",
@@ -547,6 +804,74 @@ def partition(
         "--merge-cell-min-fraction",
         help="Minimum fraction for merged n-D grid cells; sparse adjacent cells are grouped.",
     ),
+    merge_cell_boxes: bool = typer.Option(
+        False,
+        "--merge-cell-boxes",
+        help="Keep every merged cell group an axis-aligned box of cells, stored as per-axis "
+        "bin index ranges.",
+    ),
+    cost_weight: List[str] = typer.Option(
+        [],
+        "--cost-weight",
+        help="Estimated bytes read per object, format AXIS=BYTES (repeat for multiple axes). "
+        "Bins and merged cells then balance estimated read cost instead of events.",
+    ),
+    cost_base: Optional[float] = typer.Option(
+        None,
+        "--cost-base",
+        help="Estimated bytes read per event on top of --cost-weight (default 0).",
+    ),
+    event_index: bool = typer.Option(
+        False,
+        "--event-index",
+        help="Carry run/event numbers and file provenance in the count query and write "
+        "event_index.parquet (entry ranges per group and file) next to bin_boundaries.yaml.",
+    ),
+    file_composition: bool = typer.Option(
+        False,
+        "--file-composition",
+        help="Record how many events of each merged group every delivered file holds, in "
+        "file_composition.parquet, for file-level read estimates in calc_usage.",
+    ),
+    use_sketches: bool = typer.Option(
+        False,
+        "--use-sketches",
+        help="Compute tail caps and bin boundaries from mergeable per-file quantile sketches "
+        "(saved to axis_sketches.yaml) instead of from all values. The delivered files are "
+        "streamed as with --backend chunked.",
+    ),
+    sketch_k: int = typer.Option(
+        DEFAULT_KLL_K,
+        "--sketch-k",
+        help="Accuracy parameter for continuous-axis (KLL) sketches; rank error ~1.7/k.",
+    ),
+    backend: CountsBackend = typer.Option(
+        CountsBackend.memory,
+        "--backend",
+        help="'memory' loads all events at once; 'chunked' streams the delivered files in "
+        "chunks on local worker processes (bounded memory, implies --use-sketches).",
+    ),
+    chunk_size: int = typer.Option(
+        DEFAULT_CHUNK_SIZE,
+        "--chunk-size",
+        help="Events read per chunk with --backend chunked or --use-sketches.",
+    ),
+    workers: int = typer.Option(
+        0,
+        "--workers",
+        help="Local worker processes for --backend chunked, --use-sketches and --native, and "
+        "transformer containers for local ServiceX runs (0 for one per core).",
+    ),
+    fill_threads: int = typer.Option(
+        0,
+        "--fill-threads",
+        help="Threads used to fill histograms (0 for one per core).",
+    ),
+    fill_chunk_size: int = typer.Option(
+        DEFAULT_FILL_CHUNK_SIZE,
+        "--fill-chunk-size",
+        help="Events per slice when filling histograms from several threads.",
+    ),
 ):
     """Use counts of PHYSLITE objects in a rucio dataset to determine skim binning.
 
@@ -561,16 +886,165 @@ def partition(
 
     - Prints out a table with the 10 largest and smallest bins.
     """
-    counts = collect_object_counts(
-        ds_name,
-        n_files=n_files,
-        servicex_name=servicex_name,
-        ignore_local_cache=ignore_cache,
-    )
+    catalog = _load_axis_catalog(axis_catalog, native)
+    known_axes = ALL_AXES if catalog is None else list(catalog)
+    adaptive_start_bins: Dict[str, int] = {}
+    if adaptive_start is not None:
+        adaptive_start_bins = _load_start_bins(adaptive_start)
+        adaptive_bins = True
+    try:
+        axes = select_axes(ignore_axes, catalog)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+    cost_model: Optional[CostModel] = None
+    if cost_weight or cost_base is not None:
+        if cost_base is not None and cost_base < 0:
+            raise typer.BadParameter("--cost-base must be >= 0.")
+        if use_sketches or backend == CountsBackend.chunked:
+            raise typer.BadParameter(
+                "--cost-weight and --cost-base need the memory backend and cannot be "
+                "combined with --use-sketches."
+            )
+        cost_model = CostModel(
+            base=0.0 if cost_base is None else cost_base,
+            weights=_parse_cost_weights(cost_weight, known_axes),
+        )
+    # Ignored axes that carry cost are still fetched, but not binned.
+    cost_axes = cost_model.weights if cost_model is not None else {}
+    cost_only_axes = [ax for ax in known_axes if ax in cost_axes and ax not in axes]
+    fetch_axes = [ax for ax in known_axes if ax in axes or ax in cost_only_axes]
+    overrides = _parse_bins_per_axis_overrides(bins_per_axis_override)
+    override_ignored = [ax for ax in overrides if ax in ignore_axes]
+    if override_ignored:
+        raise typer.BadParameter(
+            f"Cannot override bins for ignored axes: {', '.join(override_ignored)}"
+        )
+    composites = _parse_composite_axes(composite_axis, axes)
+    fused_axes = [c for components in composites for c in components]
+    override_fused = [ax for ax in overrides if ax in fused_axes]
+    if override_fused:
+        raise typer.BadParameter(
+            f"Cannot override bins for axes in a composite axis: {', '.join(override_fused)}"
+        )
+    if max_cells is not None and max_cells < 1:
+        raise typer.BadParameter("--max-cells must be >= 1.")
+    if max_cells is not None and (use_sketches or backend == CountsBackend.chunked):
+        raise typer.BadParameter(
+            "--max-cells needs the memory backend and cannot be combined with --use-sketches."
+        )
+    if composites and (use_sketches or backend == CountsBackend.chunked):
+        raise typer.BadParameter(
+            "--composite-axis needs the memory backend and cannot be combined with "
+            "--use-sketches."
+        )
+
+    if mode == PartitionMode.kdtree:
+        if use_sketches or backend == CountsBackend.chunked:
+            raise typer.BadParameter("--mode kdtree needs the memory backend.")
+        grid_options = [
+            name
+            for name, value in (
+                ("--bins-per-axis-override", bins_per_axis_override),
+                ("--adaptive-bins", adaptive_bins),
+                ("--target-min-fraction", target_min_fraction is not None),
+                ("--target-max-fraction", target_max_fraction is not None),
+                ("--tail-cap-quantile", tail_cap_quantile is not None),
+                ("--merge-min-fraction", merge_min_fraction is not None),
+                ("--merge-cell-min-fraction", merge_cell_min_fraction is not None),
+                ("--merge-cell-boxes", merge_cell_boxes),
+                ("--max-cells", max_cells is not None),
+            )
+            if value
+        ]
+        if grid_options:
+            raise typer.BadParameter(
+                f"--mode kdtree cannot be combined with {', '.join(grid_options)}."
+            )
+        if not 0.0 < kdtree_leaf_fraction <= 1.0:
+            raise typer.BadParameter("--kdtree-leaf-fraction must be between 0 and 1.")
+
+    with_provenance = event_index or file_composition
+    if with_provenance and (use_sketches or backend == CountsBackend.chunked):
+        raise typer.BadParameter(
+            "--event-index and --file-composition need the memory backend and cannot be "
+            "combined with --use-sketches."
+        )
+    if native and backend == CountsBackend.chunked:
+        raise typer.BadParameter("--native cannot be combined with --backend chunked.")
+    if native and use_sketches:
+        raise typer.BadParameter("--native cannot be combined with --use-sketches.")
+    if sketch_k < 2:
+        raise typer.BadParameter("--sketch-k must be >= 2.")
+    if chunk_size < 1:
+        raise typer.BadParameter("--chunk-size must be >= 1.")
+    if workers < 0:
+        raise typer.BadParameter("--workers must be >= 0.")
+    if fill_threads < 0:
+        raise typer.BadParameter("--fill-threads must be >= 0.")
+    if fill_chunk_size < 1:
+        raise typer.BadParameter("--fill-chunk-size must be >= 1.")
+    threads = fill_threads if fill_threads > 0 else None
+    if output_dataset is not None and os.path.isdir(output_dataset) and os.listdir(output_dataset):
+        raise typer.BadParameter(f"--output-dataset {output_dataset} is not empty.")
+
+    # Ignored axes are never requested from ServiceX (unless they carry cost), so
+    # nothing else is left to ignore once the counts arrive.
+    counts: Union[ak.Array, CountTable, ChunkedCounts]
+    sketches: Optional[Dict[str, Sketch]] = None
+    files: List[str] = []
+    exact_entries = True
+    if with_provenance:
+        counts, files, exact_entries = collect_object_counts_with_provenance(
+            ds_name,
+            n_files=n_files,
+            servicex_name=servicex_name,
+            ignore_local_cache=ignore_cache,
+            axes=fetch_axes,
+            with_event_ids=event_index,
+            native=native,
+            workers=workers if workers > 0 else None,
+            catalog=catalog,
+        )
+    elif use_sketches or backend == CountsBackend.chunked:
+        # Sketches are streamed from the delivered files, which then stay on disk.
+        counts, sketches = collect_object_counts_with_sketches(
+            ds_name,
+            n_files=n_files,
+            servicex_name=servicex_name,
+            ignore_local_cache=ignore_cache,
+            axes=fetch_axes,
+            k=sketch_k,
+            step_size=chunk_size,
+            workers=workers if workers > 0 else None,
+            catalog=catalog,
+        )
+        write_sketches_yaml(sketches, "axis_sketches.yaml", commands=[shlex.join(sys.argv)])
+    else:
+        counts = collect_object_counts(
+            ds_name,
+            n_files=n_files,
+            servicex_name=servicex_name,
+            ignore_local_cache=ignore_cache,
+            axes=fetch_axes,
+            native=native,
+            workers=workers if workers > 0 else None,
+            catalog=catalog,
+        )
+    ignore_axes = []
     if output_file is not None:
-        ak.to_parquet(counts, output_file)
+        if isinstance(counts, (ChunkedCounts, CountTable)):
+            counts.to_parquet(output_file)
+        else:
+            ak.to_parquet(counts, output_file)
+    # Composite axes replace their components in the grid. The saved counts keep
+    # only the components; ``assign`` recomputes the composite values from them.
+    composite_names = [composite_axis_name(components) for components in composites]
+    if composites:
+        try:
+            counts = add_composite_axes(counts, composites)
+        except ValueError as exc:
+            raise typer.BadParameter(str(exc)) from exc
 
-    overrides = _parse_bins_per_axis_overrides(bins_per_axis_override)
     use_target_scan = target_min_fraction is not None or target_max_fraction is not None
     if adaptive_bins and use_target_scan:
         raise typer.BadParameter(
@@ -599,14 +1073,45 @@ def partition(
     if merge_cell_min_fraction is not None and not 0.0 <= merge_cell_min_fraction <= 1.0:
         raise typer.BadParameter("--merge-cell-min-fraction must be between 0 and 1.")
 
-    counts_for_bins = counts
-    tail_caps: Dict[str, int] = {}
-    if tail_cap_quantile is not None and tail_cap_quantile < 1.0:
-        counts_for_bins, tail_caps = apply_tail_caps(
-            counts,
-            ignore_axes=ignore_axes,
-            tail_cap_quantile=tail_cap_quantile,
+    partitioner = Partitioner(
+        counts[fetch_axes + composite_names] if with_provenance else counts,
+        sketches=sketches,
+        ignore_axes=cost_only_axes + fused_axes,
+        cost_model=cost_model,
+        tail_cap_quantile=tail_cap_quantile,
+        fill_threads=threads,
+        fill_chunk_size=fill_chunk_size,
+    )
+    if cost_model is not None:
+        costs = partitioner.costs
+        typer.echo(
+            f"Balancing estimated read cost: {_format_bytes(int(costs.sum()))} over "
+            f"{len(costs):,} events (mean {costs.mean() if len(costs) else 0.0:,.0f} bytes)"
+        )
+    if mode == PartitionMode.kdtree:
+        tree = partitioner.kdtree(leaf_fraction=kdtree_leaf_fraction)
+        write_bin_boundaries_yaml(
+            tree.bounds,
+            "bin_boundaries.yaml",
+            commands=[shlex.join(sys.argv)],
+            cost_model=cost_model,
+            kdtree=tree.nodes,
+        )
+        _write_assignments(
+            tree, counts, files, exact_entries, event_index, with_provenance, output_dataset
+        )
+        records = sorted(tree.leaf_records(), key=lambda r: r["fraction"], reverse=True)
+        print_bin_table(records[:10], "Top 10 leaves")
+        print_bin_table(records[::-1][:10], "Least 10 leaves")
+        typer.echo(
+            f"kd-tree summary: {tree.n_groups:,} leaves, depth {tree.depth}, "
+            f"max fraction {tree.fractions.max():.3f}, "
+            f"min fraction {tree.fractions.min():.3f}"
         )
+        return
+
+    if tail_cap_quantile is not None and tail_cap_quantile < 1.0:
+        tail_caps = partitioner.tail_caps
         if tail_caps:
             caps_summary = ", ".join(
                 f"{axis}={tail_caps[axis]}" for axis in sorted(tail_caps)
@@ -619,6 +1124,15 @@ def partition(
                 f"Tail cap quantile {tail_cap_quantile:.3f} had no effect on axes."
             )
 
+    if max_cells is not None:
+        # Set before the searches below, so no candidate fills a grid over budget.
+        try:
+            partitioner.with_bins(bins_per_axis, overrides).with_cell_budget(
+                max_cells, score=prune_score.value
+            )
+        except ValueError as exc:
+            raise typer.BadParameter(str(exc)) from exc
+
     if use_target_scan:
         typer.echo(
             "Scanning bins-per-axis "
@@ -627,14 +1141,7 @@ def partition(
         best = None
         best_score = None
         for candidate in range(target_bins_min, target_bins_max + 1):
-            candidate_boundaries = compute_bin_boundaries(
-                counts_for_bins,
-                ignore_axes=ignore_axes,
-                bins_per_axis=candidate,
-                bins_per_axis_overrides=overrides,
-            )
-            candidate_hist = build_nd_histogram(counts_for_bins, candidate_boundaries)
-            candidate_summary = histogram_summary(candidate_hist)
+            candidate_summary = partitioner.with_bins(candidate, overrides).summary
             typer.echo(
                 "  bins-per-axis "
                 f"{candidate}: max {candidate_summary['max_fraction']:.3f}, "
@@ -645,11 +1152,12 @@ def partition(
                 candidate_summary, target_min_fraction, target_max_fraction
             )
             if best is None or score < best_score:
-                best = (candidate, candidate_boundaries, candidate_hist, candidate_summary)
+                best = (candidate, candidate_summary)
                 best_score = score
 
         assert best is not None
-        bins_per_axis, simple_boundaries, hist, summary = best
+        bins_per_axis, summary = best
+        partitioner.with_bins(bins_per_axis, overrides)
         max_ok = (
             target_max_fraction is None
             or summary["max_fraction"] <= target_max_fraction
@@ -674,36 +1182,41 @@ def partition(
                 f"min nonzero {adaptive_min_fraction:.3f}, "
                 f"max {adaptive_max_fraction:.3f}."
             )
-            bins_by_axis, simple_boundaries, hist, summary = _adaptive_bins_search(
-                counts_for_bins,
-                ignore_axes=ignore_axes,
+            if adaptive_start is not None:
+                typer.echo(
+                    f"Starting from {adaptive_start}: "
+                    + ", ".join(
+                        f"{ax}={adaptive_start_bins[ax]}"
+                        for ax in sorted(adaptive_start_bins)
+                    )
+                )
+            bins_by_axis, summary = _adaptive_bins_search(
+                partitioner,
                 bins_per_axis=bins_per_axis,
                 overrides=overrides,
                 target_min_fraction=adaptive_min_fraction,
                 target_max_fraction=adaptive_max_fraction,
                 min_bins=adaptive_min_bins,
+                start=adaptive_start_bins,
             )
             typer.echo(
                 "Adaptive binning result: "
                 + ", ".join(f"{ax}={bins_by_axis[ax]}" for ax in sorted(bins_by_axis))
             )
         else:
-            simple_boundaries = compute_bin_boundaries(
-                counts_for_bins,
-                ignore_axes=ignore_axes,
-                bins_per_axis=bins_per_axis,
-                bins_per_axis_overrides=overrides,
-            )
-            hist = build_nd_histogram(counts_for_bins, simple_boundaries)
-            summary = histogram_summary(hist)
+            partitioner.with_bins(bins_per_axis, overrides)
 
-    if merge_min_fraction is not None:
-        hist, merges = merge_sparse_bins(
-            hist,
-            min_fraction=merge_min_fraction,
-            min_bins=merge_min_bins,
+    budget = partitioner.cell_budget
+    if budget is not None:
+        typer.echo(
+            f"Cell budget {max_cells:,} ({budget.score}): {budget.cells:,} cells, bins "
+            + ", ".join(f"{ax}={budget.bins[ax]}" for ax in sorted(budget.bins))
         )
-        simple_boundaries = histogram_boundaries(hist)
+        if budget.pruned_axes:
+            typer.echo(f"  pruned axes: {', '.join(budget.pruned_axes)}")
+
+    if merge_min_fraction is not None:
+        merges = partitioner.with_bin_merging(merge_min_fraction, merge_min_bins).bin_merges
         merge_summary = ", ".join(
             f"{axis}={merges[axis]}" for axis in sorted(merges)
         )
@@ -711,21 +1224,16 @@ def partition(
             "Merged sparse bins (min fraction "
             f"{merge_min_fraction:.3f}, min bins {merge_min_bins}): {merge_summary}"
         )
-        summary = histogram_summary(hist)
+    hist = partitioner.histogram
+    summary = partitioner.summary
 
-    merged_summary: Optional[Dict[str, float]] = None
     effective_merge_cell_min_fraction = (
         0.0 if merge_cell_min_fraction is None else merge_cell_min_fraction
     )
     total_cells = int(np.asarray(hist.view()).size)
-    merged_groups, merged_summary = merge_sparse_cells(
-        hist,
-        min_fraction=effective_merge_cell_min_fraction,
-    )
-    merged_cells = MergedCells(
-        min_fraction=effective_merge_cell_min_fraction,
-        groups=merged_groups,
-    )
+    partitioner.merge_cells(effective_merge_cell_min_fraction, boxes=merge_cell_boxes)
+    merged_groups = partitioner.merged_groups
+    merged_summary = partitioner.merged_summary
     if merge_cell_min_fraction is not None:
         combined_cells = total_cells - len(merged_groups)
         typer.echo(
@@ -738,18 +1246,21 @@ def partition(
             f"zero groups {merged_summary['zero_bins']:,}"
         )
 
-    write_bin_boundaries_yaml(
-        simple_boundaries,
-        "bin_boundaries.yaml",
-        merged_cells=merged_cells,
-        commands=[shlex.join(sys.argv)],
+    partitioner.write(
+        "bin_boundaries.yaml", "histogram.pkl", commands=[shlex.join(sys.argv)]
     )
-    write_histogram_pickle(hist, "histogram.pkl")
-
-    top = top_bins(hist, n=10)
-    bottom = bottom_bins(hist, n=10)
-    print_bin_table(top, "Top 10 bins")
-    print_bin_table(bottom, "Least 10 bins")
+    # Tail-capped events are above the last edge but belong to the last bin.
+    assigner = PartitionAssigner(
+        partitioner.boundaries, partitioner.merged_groups, clip_overflow=True
+    )
+    _write_assignments(
+        assigner, counts, files, exact_entries, event_index, with_provenance, output_dataset
+    )
+
+    top = top_bins(hist, n=10)
+    bottom = bottom_bins(hist, n=10)
+    print_bin_table(top, "Top 10 bins")
+    print_bin_table(bottom, "Least 10 bins")
     if use_target_scan or adaptive_bins:
         typer.echo(
             "Histogram summary: max fraction "
@@ -765,6 +1276,42 @@ def partition(
         )
 
 
+def _write_assignments(
+    assigner: Union[PartitionAssigner, KDTree],
+    counts: Union[ak.Array, CountTable, ChunkedCounts],
+    files: List[str],
+    exact_entries: bool,
+    event_index: bool,
+    with_provenance: bool,
+    output_dataset: Optional[str],
+) -> None:
+    """Write the per-event outputs of ``partition`` that need each event's group."""
+    if event_index:
+        index = EventIndex.from_counts(assigner, counts, files, exact=exact_entries)
+        index.write(DEFAULT_EVENT_INDEX_FILE)
+        typer.echo(
+            f"Wrote {len(index):,} entry ranges over {len(files):,} files to "
+            f"{DEFAULT_EVENT_INDEX_FILE}"
+        )
+        if not index.exact:
+            typer.echo(
+                "  entries are approximate: the input files are not local, so the delivered "
+                "event counts could not be checked against them"
+            )
+    if with_provenance:
+        composition = FileComposition.from_counts(assigner, counts, files)
+        composition.write(DEFAULT_FILE_COMPOSITION_FILE)
+        typer.echo(
+            f"Wrote group composition of {len(files):,} files to {DEFAULT_FILE_COMPOSITION_FILE}"
+        )
+    if output_dataset is not None:
+        chunks = counts if isinstance(counts, ChunkedCounts) else [counts]
+        write_group_dataset(assigner, chunks, output_dataset)
+        typer.echo(
+            f"Wrote {assigner.n_groups:,} group partitions to {output_dataset}"
+        )
+
+
 @app.command("repartition")
 def repartition(
     ds_name: str = typer.Argument(..., help="Name of the dataset"),
@@ -793,6 +1340,46 @@ def repartition(
         "--ignore-cache",
         help="Ignore servicex local cache and force fresh data SX query.",
     ),
+    native: bool = typer.Option(
+        False,
+        "--native",
+        help="Count objects in local PHYSLITE files directly with uproot on --workers "
+        "processes, without ServiceX or containers.",
+    ),
+    axis_catalog: Optional[str] = typer.Option(
+        None,
+        "--axis-catalog",
+        help="YAML axis catalog that replaces the built-in axes. Every catalog axis is "
+        "computed by one transform, so --ignore-axes can pick any subset of them later "
+        "without a new one.",
+    ),
+    backend: CountsBackend = typer.Option(
+        CountsBackend.memory,
+        "--backend",
+        help="'memory' loads all events at once; 'chunked' streams the delivered files in "
+        "chunks on local worker processes (bounded memory).",
+    ),
+    chunk_size: int = typer.Option(
+        DEFAULT_CHUNK_SIZE,
+        "--chunk-size",
+        help="Events read per chunk with --backend chunked.",
+    ),
+    workers: int = typer.Option(
+        0,
+        "--workers",
+        help="Local worker processes for --backend chunked and --native, and transformer "
+        "containers for local ServiceX runs (0 for one per core).",
+    ),
+    fill_threads: int = typer.Option(
+        0,
+        "--fill-threads",
+        help="Threads used to fill histograms (0 for one per core).",
+    ),
+    fill_chunk_size: int = typer.Option(
+        DEFAULT_FILL_CHUNK_SIZE,
+        "--fill-chunk-size",
+        help="Events per slice when filling histograms from several threads.",
+    ),
 ):
     """Update merged cell counts using an existing bin_boundaries.yaml."""
     if output_file == bin_boundaries_file:
@@ -801,50 +1388,134 @@ def repartition(
         )
 
     boundaries, merged_cells, commands = _load_bin_boundaries_file(bin_boundaries_file)
-    if merged_cells is None:
+    tree = _load_kdtree(bin_boundaries_file)
+    if merged_cells is None and tree is None:
         raise typer.BadParameter(
             f"{bin_boundaries_file} does not contain merged cell groups to update."
         )
 
-    counts = collect_object_counts(
-        ds_name,
-        n_files=n_files,
-        servicex_name=servicex_name,
-        ignore_local_cache=ignore_cache,
-    )
-    missing_axes = [ax for ax in boundaries if ax not in counts.fields]
+    catalog = _load_axis_catalog(axis_catalog, native)
+    known_axes = ALL_AXES if catalog is None else list(catalog)
+    composites = [composite_components(ax) for ax in boundaries if is_composite(ax)]
+    base_axes = input_axes(list(boundaries))
+    missing_axes = [ax for ax in base_axes if ax not in known_axes]
     if missing_axes:
         raise typer.BadParameter(
             "Input bin_boundaries.yaml references missing axes: "
             f"{', '.join(missing_axes)}"
         )
+    cost_model = _load_cost_model(bin_boundaries_file)
+    cost_only_axes: List[str] = []
+    if cost_model is not None:
+        if backend == CountsBackend.chunked:
+            raise typer.BadParameter(
+                f"{bin_boundaries_file} has a cost model, which needs the memory backend."
+            )
+        unknown = [ax for ax in cost_model.weights if ax not in known_axes]
+        if unknown:
+            raise typer.BadParameter(
+                f"{bin_boundaries_file} cost model references unknown axes: {', '.join(unknown)}"
+            )
+        cost_only_axes = [ax for ax in cost_model.weights if ax not in boundaries]
+    if tree is not None and backend == CountsBackend.chunked:
+        raise typer.BadParameter(
+            f"{bin_boundaries_file} is a kd-tree partition, which needs the memory backend."
+        )
+    fetch_axes = [ax for ax in known_axes if ax in base_axes or ax in cost_only_axes]
+    if native and backend == CountsBackend.chunked:
+        raise typer.BadParameter("--native cannot be combined with --backend chunked.")
+    if composites and backend == CountsBackend.chunked:
+        raise typer.BadParameter(
+            f"{bin_boundaries_file} has composite axes, which need the memory backend."
+        )
 
-    hist = build_nd_histogram(counts, boundaries)
+    if chunk_size < 1:
+        raise typer.BadParameter("--chunk-size must be >= 1.")
+    if workers < 0:
+        raise typer.BadParameter("--workers must be >= 0.")
+    if fill_threads < 0:
+        raise typer.BadParameter("--fill-threads must be >= 0.")
+    if fill_chunk_size < 1:
+        raise typer.BadParameter("--fill-chunk-size must be >= 1.")
+    threads = fill_threads if fill_threads > 0 else None
+
+    counts: Union[ak.Array, CountTable, ChunkedCounts]
+    if backend == CountsBackend.chunked:
+        counts = collect_object_counts_chunked(
+            ds_name,
+            n_files=n_files,
+            servicex_name=servicex_name,
+            ignore_local_cache=ignore_cache,
+            axes=list(boundaries.keys()),
+            step_size=chunk_size,
+            workers=workers if workers > 0 else None,
+            catalog=catalog,
+        )
+    else:
+        counts = collect_object_counts(
+            ds_name,
+            n_files=n_files,
+            servicex_name=servicex_name,
+            ignore_local_cache=ignore_cache,
+            axes=fetch_axes,
+            native=native,
+            workers=workers if workers > 0 else None,
+            catalog=catalog,
+        )
+    if composites:
+        counts = add_composite_axes(counts, composites)
+
+    partitioner = Partitioner(
+        counts,
+        ignore_axes=[ax for ax in fetch_axes if ax not in boundaries],
+        cost_model=cost_model,
+        fill_threads=threads,
+        fill_chunk_size=fill_chunk_size,
+    )
+    if tree is not None:
+        leaf_counts = np.bincount(
+            tree.assign(counts), weights=partitioner.costs, minlength=tree.n_groups
+        )
+        leaf_counts = np.rint(leaf_counts).astype(np.int64)
+        leaf_total = int(leaf_counts.sum())
+        nodes = tree.nodes.model_copy(
+            update={
+                "counts": leaf_counts.tolist(),
+                "fractions": (leaf_counts / max(leaf_total, 1)).tolist(),
+            }
+        )
+        write_bin_boundaries_yaml(
+            tree.bounds,
+            output_file,
+            commands=commands + [shlex.join(sys.argv)],
+            cost_model=cost_model,
+            kdtree=nodes,
+        )
+        fractions = np.asarray(nodes.fractions)
+        typer.echo(
+            f"kd-tree summary: {tree.n_groups:,} leaves, "
+            f"max fraction {fractions.max():.3f}, min fraction {fractions.min():.3f}"
+        )
+        return
+    assert merged_cells is not None
+    hist = partitioner.with_boundaries(boundaries).histogram
     summary = histogram_summary(hist)
 
     counts_view = np.asarray(hist.view())
     total = int(counts_view.sum())
     axes_order = list(boundaries.keys())
+    try:
+        labels = cell_group_labels(merged_cells.groups, axes_order, counts_view.shape)
+    except ValueError as exc:
+        raise typer.BadParameter(f"{bin_boundaries_file}: {exc}") from exc
+    group_totals = group_counts_from_labels(labels, counts_view, len(merged_cells.groups))
     merged_groups: List[MergedCellGroup] = []
-    for group in merged_cells.groups:
-        group_total = 0
-        for cell in group.cells:
-            if any(axis not in cell for axis in axes_order):
-                raise typer.BadParameter(
-                    f"{bin_boundaries_file} has cells missing axes in a group."
-                )
-            idx = tuple(int(cell[axis]) for axis in axes_order)
-            if any(
-                idx[i] < 0 or idx[i] >= counts_view.shape[i]
-                for i in range(len(idx))
-            ):
-                raise typer.BadParameter(
-                    f"{bin_boundaries_file} has out-of-range cell indices."
-                )
-            group_total += int(counts_view[idx])
+    for group, group_total in zip(merged_cells.groups, group_totals.tolist()):
         fraction = 0.0 if total == 0 else float(group_total) / float(total)
         merged_groups.append(
-            MergedCellGroup(cells=group.cells, count=group_total, fraction=fraction)
+            MergedCellGroup(
+                cells=group.cells, box=group.box, count=group_total, fraction=fraction
+            )
         )
     merged_cells = MergedCells(
         min_fraction=merged_cells.min_fraction,
@@ -856,6 +1527,7 @@ def repartition(
         output_file,
         merged_cells=merged_cells,
         commands=commands + [shlex.join(sys.argv)],
+        cost_model=cost_model,
     )
     typer.echo(
         "Histogram summary: max fraction "
@@ -866,6 +1538,69 @@ def repartition(
     )
 
 
+@app.command("merge-sketches")
+def merge_sketches_command(
+    sketch_files: List[str] = typer.Argument(
+        ..., help="Sketch files (axis_sketches.yaml) from files, shards or datasets."
+    ),
+    output_file: str = typer.Option(
+        "axis_sketches.merged.yaml",
+        "--output",
+        "-o",
+        help="Output file name for the merged sketches.",
+    ),
+    boundaries_output: Optional[str] = typer.Option(
+        None,
+        "--boundaries-output",
+        help="Also write bin boundaries computed from the merged sketches to this file.",
+    ),
+    bins_per_axis: int = typer.Option(
+        4,
+        "--bins-per-axis",
+        help="Number of bins to use per axis when writing boundaries.",
+    ),
+    bins_per_axis_override: List[str] = typer.Option(
+        [],
+        "--bins-per-axis-override",
+        help="Override bins per axis, format AXIS=INT (repeat for multiple axes).",
+    ),
+    ignore_axes: List[str] = typer.Option(
+        [],
+        "--ignore-axes",
+        help="Axes to leave out of the written boundaries.",
+    ),
+) -> None:
+    """Merge per-axis quantile sketches without rescanning any data."""
+    sketch_sets = []
+    for file_path in sketch_files:
+        try:
+            sketch_sets.append(load_sketches_yaml(file_path))
+        except FileNotFoundError as exc:
+            raise typer.BadParameter(f"{file_path} does not exist.") from exc
+    try:
+        merged = merge_sketches(sketch_sets)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+    write_sketches_yaml(merged, output_file, commands=[shlex.join(sys.argv)])
+    typer.echo(
+        f"Merged {len(sketch_files)} sketch files: "
+        + ", ".join(f"{axis} n={merged[axis].n:,}" for axis in merged)
+    )
+    if boundaries_output is not None:
+        try:
+            boundaries = compute_bin_boundaries_from_sketches(
+                merged,
+                ignore_axes=ignore_axes,
+                bins_per_axis=bins_per_axis,
+                bins_per_axis_overrides=_parse_bins_per_axis_overrides(bins_per_axis_override),
+            )
+        except ValueError as exc:
+            raise typer.BadParameter(str(exc)) from exc
+        write_bin_boundaries_yaml(
+            boundaries, boundaries_output, commands=[shlex.join(sys.argv)]
+        )
+
+
 @app.command("describe-cells")
 def describe_cells(
     file_path: str = typer.Argument(
@@ -917,6 +1652,9 @@ def describe_cells(
         count = int(group.get("count", 0))
         fraction = float(group.get("fraction", 0.0))
         axis_indices: Dict[str, List[int]] = {axis: [] for axis in axes_order}
+        for axis, (lo, hi) in (group.get("box") or {}).items():
+            if axis in axis_indices:
+                axis_indices[axis].extend(range(int(lo), int(hi)))
         for cell in cells:
             for axis in axes_order:
                 if axis in cell:
@@ -974,10 +1712,42 @@ def calc_usage(
         "--n-taus",
         help="Minimum number of taus required (>= N).",
     ),
+    met: Optional[float] = typer.Option(
+        None,
+        "--met",
+        help="Minimum missing ET in GeV required (>= X).",
+    ),
+    event_index_file: Optional[str] = typer.Option(
+        None,
+        "--event-index",
+        help="event_index.parquet from `partition --event-index`; reports the entries to "
+        "read for the selected groups.",
+    ),
+    ranges_output: Optional[str] = typer.Option(
+        None,
+        "--ranges-output",
+        help="With --event-index, write the entry ranges to read per file to this YAML file.",
+    ),
+    file_composition_file: Optional[str] = typer.Option(
+        None,
+        "--file-composition",
+        help="file_composition.parquet from `partition --file-composition`; reports files "
+        "and events read today and with files partitioned by group (also derived from "
+        "--event-index when given).",
+    ),
+    bytes_per_event: Optional[float] = typer.Option(
+        None,
+        "--bytes-per-event",
+        help="Mean stored event size in bytes, to turn events read into estimated bytes.",
+    ),
 ) -> None:
     """Estimate dataset fraction needed to satisfy object-count cuts."""
-    boundaries, merged_groups = _load_bin_boundaries_usage(bin_boundaries_file)
-    cuts: Dict[str, int] = {}
+    tree = _load_kdtree(bin_boundaries_file)
+    if tree is not None:
+        boundaries, merged_groups = tree.bounds, []
+    else:
+        boundaries, merged_groups = _load_bin_boundaries_usage(bin_boundaries_file)
+    cuts: Dict[str, float] = {}
     for axis, value in (
         ("n_electrons", n_electrons),
         ("n_muons", n_muons),
@@ -985,18 +1755,310 @@ def calc_usage(
         ("n_large_jets", n_large_jets),
         ("n_photons", n_photons),
         ("n_taus", n_taus),
+        ("met", met),
     ):
         if value is None:
             continue
         if value < 0:
             raise typer.BadParameter(f"{axis} cut must be >= 0.")
-        if axis not in boundaries:
+        if axis not in input_axes(list(boundaries)):
             raise typer.BadParameter(
                 f"{bin_boundaries_file} does not contain axis {axis}."
             )
         cuts[axis] = value
-    usage = _calc_usage_fraction(boundaries, merged_groups, cuts)
+    if ranges_output is not None and event_index_file is None:
+        raise typer.BadParameter("--ranges-output needs --event-index.")
+    if bytes_per_event is not None and bytes_per_event <= 0:
+        raise typer.BadParameter("--bytes-per-event must be > 0.")
+    if tree is not None:
+        usage = tree.usage_fraction(cuts)
+        groups = tree.selected_leaves(cuts)
+        n_groups = tree.n_groups
+    else:
+        usage = _calc_usage_fraction(boundaries, merged_groups, cuts)
+        groups = selected_groups(boundaries, merged_groups, cuts)
+        n_groups = len(merged_groups)
     typer.echo(f"Usage fraction: {usage:.6f}")
+    index: Optional[EventIndex] = None
+    if event_index_file is not None:
+        index = _load_event_index(event_index_file)
+        ranges = index.ranges(groups)
+        typer.echo(
+            f"Entries to read: {index.n_entries(groups):,} in "
+            f"{sum(len(r) for r in ranges.values()):,} ranges over {len(ranges):,} files"
+            + ("" if index.exact else " (approximate: entries were not checked)")
+        )
+        if ranges_output is not None:
+            with open(ranges_output, "w") as f:
+                yaml.safe_dump(
+                    {path: [list(r) for r in file_ranges] for path, file_ranges in ranges.items()},
+                    f,
+                    default_flow_style=None,
+                )
+    composition: Optional[FileComposition] = None
+    if file_composition_file is not None:
+        try:
+            composition = FileComposition.load(file_composition_file)
+        except FileNotFoundError as exc:
+            raise typer.BadParameter(f"{file_composition_file} does not exist.") from exc
+        except ValueError as exc:
+            raise typer.BadParameter(str(exc)) from exc
+    elif index is not None:
+        composition = FileComposition.from_event_index(index, n_groups)
+    if composition is not None:
+        if composition.n_groups != n_groups:
+            raise typer.BadParameter(
+                f"{bin_boundaries_file} and the file composition have different groups."
+            )
+        cost = composition.read_cost(groups)
+        typer.echo(
+            f"Files read: {cost['files']:,} of {cost['total_files']:,} "
+            f"(partitioned by group: {cost['grouped_files']:,})"
+        )
+        typer.echo(
+            f"Events read: {cost['events']:,} of {cost['total_events']:,} "
+            f"(partitioned by group: {cost['grouped_events']:,})"
+        )
+        if bytes_per_event is not None:
+            typer.echo(
+                f"Estimated bytes read: {_format_bytes(cost['events'] * bytes_per_event)} "
+                f"(partitioned by group: "
+                f"{_format_bytes(cost['grouped_events'] * bytes_per_event)})"
+            )
+
+
+@app.command("assign")
+def assign(
+    bin_boundaries_file: str = typer.Argument(
+        ..., help="Path to the bin_boundaries.yaml file with merged cell groups."
+    ),
+    counts_file: str = typer.Argument(
+        ..., help="Per-event count parquet file (e.g. from `partition --output`)."
+    ),
+    output_file: str = typer.Option(
+        "groups.parquet",
+        "--output",
+        "-o",
+        help="Output parquet file with one merged-group id per input event.",
+    ),
+    column: str = typer.Option(
+        "group",
+        "--column",
+        help="Name of the group-id column in the output file.",
+    ),
+    chunk_size: int = typer.Option(
+        DEFAULT_ASSIGN_CHUNK_SIZE,
+        "--chunk-size",
+        help="Events read and written per chunk.",
+    ),
+    clip_overflow: bool = typer.Option(
+        False,
+        "--clip-overflow",
+        help="Put values past the outer edges in the first/last bin instead of marking the "
+        "event -1 (use for partitions built with --tail-cap-quantile).",
+    ),
+) -> None:
+    """Label each event with the id of the merged cell group it falls in.
+
+    Group ids are indices into merged_cells.groups; events outside the grid
+    get -1. For --mode kdtree partitions the ids are leaf ids, and every event
+    lands in a leaf. The output rows are in the same order as the input events.
+    """
+    if chunk_size < 1:
+        raise typer.BadParameter("--chunk-size must be >= 1.")
+    assigner: Union[PartitionAssigner, KDTree]
+    try:
+        tree = _load_kdtree(bin_boundaries_file)
+        assigner = (
+            tree
+            if tree is not None
+            else PartitionAssigner.from_yaml(bin_boundaries_file, clip_overflow=clip_overflow)
+        )
+    except FileNotFoundError as exc:
+        raise typer.BadParameter(f"{bin_boundaries_file} does not exist.") from exc
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+    start = time.perf_counter()
+    try:
+        totals = assign_parquet(
+            assigner, counts_file, output_file, column=column, chunk_size=chunk_size
+        )
+    except FileNotFoundError as exc:
+        raise typer.BadParameter(f"{counts_file} does not exist.") from exc
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+    elapsed = time.perf_counter() - start
+    n_events = int(totals.sum())
+    rate = n_events / elapsed if elapsed > 0 else 0.0
+    typer.echo(
+        f"Assigned {n_events:,} events to {assigner.n_groups:,} groups "
+        f"({int(totals[-1]):,} outside the grid) in {elapsed:.2f}s "
+        f"({rate / 1e6:.1f}M events/s); wrote {output_file}"
+    )
+
+
+@app.command("stability")
+def stability(
+    bin_boundaries_file: str = typer.Argument(
+        ..., help="Path to the bin_boundaries.yaml file of a grid partition."
+    ),
+    counts_file: str = typer.Argument(
+        ..., help="Per-event count parquet file (e.g. from `partition --output`)."
+    ),
+    replicates: int = typer.Option(
+        DEFAULT_REPLICATES, "--replicates", help="Number of bootstrap replicates."
+    ),
+    confidence: float = typer.Option(
+        DEFAULT_CONFIDENCE, "--confidence", help="Confidence level of the reported intervals."
+    ),
+    seed: int = typer.Option(0, "--seed", help="Seed of the bootstrap draws."),
+    top: int = typer.Option(10, "--top", help="Rows to print in each table."),
+    output_file: Optional[str] = typer.Option(
+        None, "--output", "-o", help="Write the full report to this YAML file."
+    ),
+) -> None:
+    """Bootstrap how stable the boundaries and group fractions of a partition are.
+
+    Each replicate reweights the distinct count rows with a multinomial draw;
+    all replicates are evaluated together. Reports how often each
+    equal-frequency edge moves and a confidence interval for the fraction of
+    every merged group (or cell, without merged groups).
+    """
+    if replicates < 1:
+        raise typer.BadParameter("--replicates must be >= 1.")
+    if not 0.0 < confidence < 1.0:
+        raise typer.BadParameter("--confidence must be between 0 and 1.")
+    if _load_kdtree(bin_boundaries_file) is not None:
+        raise typer.BadParameter(f"{bin_boundaries_file} is a kd-tree partition; needs a grid.")
+    boundaries, merged_cells, _ = _load_bin_boundaries_file(bin_boundaries_file)
+    bins_per_axis = _load_start_bins(bin_boundaries_file)
+    groups = merged_cells.groups if merged_cells is not None else []
+    try:
+        counts = CountTable.from_parquet(counts_file, columns=input_axes(list(boundaries)))
+    except FileNotFoundError as exc:
+        raise typer.BadParameter(f"{counts_file} does not exist.") from exc
+    except (KeyError, ValueError) as exc:
+        raise typer.BadParameter(f"{counts_file} is missing partition axes: {exc}") from exc
+
+    start = time.perf_counter()
+    try:
+        report = bootstrap_stability(
+            counts,
+            PartitionAssigner(boundaries, groups, clip_overflow=True),
+            bins_per_axis,
+            n_replicates=replicates,
+            confidence=confidence,
+            seed=seed,
+        )
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+    elapsed = time.perf_counter() - start
+
+    edges = [(axis, edge) for axis, axis_edges in report.boundaries.items() for edge in axis_edges]
+    edges.sort(key=lambda item: item[1].flip_probability, reverse=True)
+    table = Table(title="Least stable boundaries")
+    for column in ("axis", "quantile", "edge", "flip probability", "interval"):
+        table.add_column(column, justify="left" if column == "axis" else "right")
+    for axis, edge in edges[:top]:
+        table.add_row(
+            axis,
+            f"{edge.quantile:.3f}",
+            f"{edge_value(edge.edge)}",
+            f"{edge.flip_probability:.3f}",
+            f"[{edge_value(edge.low)}, {edge_value(edge.high)}]",
+        )
+    Console().print(table)
+
+    fractions = sorted(report.fractions, key=lambda f: f.high - f.low, reverse=True)
+    table = Table(title=f"Widest {report.fractions_of[:-1]} fraction intervals")
+    for column in (report.fractions_of[:-1], "fraction", "interval", "relative width"):
+        table.add_column(column, justify="right")
+    for interval in fractions[:top]:
+        width = interval.high - interval.low
+        table.add_row(
+            str(interval.index),
+            f"{interval.fraction:.4f}",
+            f"[{interval.low:.4f}, {interval.high:.4f}]",
+            f"{width / interval.fraction:.2f}" if interval.fraction > 0 else "-",
+        )
+    Console().print(table)
+
+    if output_file is not None:
+        with open(output_file, "w") as f:
+            yaml.safe_dump(report.model_dump(), f, sort_keys=False)
+    typer.echo(
+        f"Bootstrapped {report.n_replicates:,} replicates of {report.n_events:,} events "
+        f"({report.n_distinct:,} distinct rows) in {elapsed:.2f}s"
+        + (f"; wrote {output_file}" if output_file is not None else "")
+    )
+
+
+@app.command("serve")
+def serve(
+    partitions: List[str] = typer.Argument(
+        ...,
+        help="Partitions to load, as [NAME=]bin_boundaries.yaml (NAME defaults to the "
+        "file stem).",
+    ),
+    histogram: List[str] = typer.Option(
+        [],
+        "--histogram",
+        help="Histogram pickle for a partition, as [NAME=]histogram.pkl. Enables /rebin.",
+    ),
+    counts: List[str] = typer.Option(
+        [],
+        "--counts",
+        help="Per-event count parquet for a partition, as [NAME=]counts.parquet. Adds the "
+        "exact selected fraction to /usage.",
+    ),
+    host: str = typer.Option("127.0.0.1", "--host", help="Host to listen on."),
+    port: int = typer.Option(8765, "--port", help="TCP port to listen on."),
+    socket_path: Optional[str] = typer.Option(
+        None,
+        "--socket",
+        help="Listen on this Unix socket instead of a TCP port.",
+    ),
+) -> None:
+    """Serve usage, lookup, summary and rebinning queries over HTTP.
+
+    Partitions are parsed once and kept in memory; files are reloaded when
+    they change on disk. Endpoints (GET, JSON responses): /partitions,
+    /summary, /usage, /lookup, /rebin and /stats.
+    """
+    boundaries_files = _parse_named_paths(partitions, "partition")
+    histogram_files = _parse_named_paths(histogram, "--histogram")
+    counts_files = _parse_named_paths(counts, "--counts")
+    for option, files in (("--histogram", histogram_files), ("--counts", counts_files)):
+        if len(boundaries_files) == 1 and len(files) == 1:
+            files[next(iter(boundaries_files))] = files.pop(next(iter(files)))
+        unknown = [name for name in files if name not in boundaries_files]
+        if unknown:
+            raise typer.BadParameter(f"{option} names unknown partitions: {', '.join(unknown)}")
+    try:
+        loaded = [
+            LoadedPartition(
+                name,
+                path,
+                histogram_file=histogram_files.get(name),
+                counts_file=counts_files.get(name),
+            )
+            for name, path in boundaries_files.items()
+        ]
+    except FileNotFoundError as exc:
+        raise typer.BadParameter(f"{exc.filename} does not exist.") from exc
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    server = create_server(PartitionService(loaded), host=host, port=port, socket_path=socket_path)
+    where = socket_path if socket_path is not None else f"http://{host}:{port}"
+    typer.echo(f"Serving {len(loaded)} partition(s) on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,492 @@
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import awkward as ak
+import numpy as np
+from hist import BaseHist
+
+from atlas_object_partitioning.chunked import ChunkedCounts
+from atlas_object_partitioning.columns import CountTable
+from atlas_object_partitioning.histograms import (
+    DEFAULT_FILL_CHUNK_SIZE,
+    CostModel,
+    MergedCellGroup,
+    MergedCells,
+    _check_axis_options,
+    build_nd_histogram,
+    compute_bin_boundaries,
+    compute_tail_caps,
+    event_costs,
+    histogram_boundaries,
+    histogram_summary,
+    merge_sparse_bins,
+    merge_sparse_boxes,
+    merge_sparse_cells,
+    write_bin_boundaries_yaml,
+    write_histogram_pickle,
+)
+from atlas_object_partitioning.kdtree import (
+    DEFAULT_KDTREE_LEAF_FRACTION,
+    DEFAULT_KDTREE_MAX_DEPTH,
+    KDTree,
+)
+from atlas_object_partitioning.pruning import (
+    PRUNE_SCORES,
+    CellBudget,
+    Marginal,
+    fit_cell_budget,
+)
+from atlas_object_partitioning.sketches import (
+    Sketch,
+    cap_sketches,
+    compute_bin_boundaries_from_sketches,
+    tail_caps_from_sketches,
+)
+
+# Results kept per stage; enough for a bins-per-axis scan or an adaptive search step.
+DEFAULT_STAGE_CACHE_SIZE = 16
+
+_Stage = Tuple[object, ...]
+
+
+def _edges_key(boundaries: Dict[str, List[float]]) -> _Stage:
+    return tuple((axis, tuple(edges)) for axis, edges in boundaries.items())
+
+
+class Partitioner:
+    """Partition a fixed set of per-event counts, one memoized stage at a time.
+
+    The stages are tail caps, bin boundaries, the n-D histogram, sparse bin
+    merging and sparse cell merging. Each is computed on first access and cached
+    with the settings it depends on, so changing a setting with ``with_bins``,
+    ``merge_cells`` etc. only recomputes that stage and the ones after it.
+    Returning to earlier settings reuses the cached results.
+
+    ``counts`` is an awkward array, a :class:`CountTable` or a
+    :class:`ChunkedCounts` view. Tail caps are never applied to a copy of the
+    counts: they are passed on to the boundary and fill stages. With
+    ``sketches`` tail caps and boundaries come from the sketches rather than
+    from the values; ``ChunkedCounts`` need them unless fixed boundaries are
+    given with ``with_boundaries``.
+
+    With a ``cost_model`` every event is weighted by its estimated read cost
+    (from the uncapped counts), so bins, cell groups and summaries balance bytes
+    rather than events. Axes listed in ``ignore_axes`` may still carry cost.
+
+    A cell budget (``with_cell_budget``) is a setting too: it is fitted to the
+    requested bins whenever they change, so it never discards them.
+    """
+
+    def __init__(
+        self,
+        counts: Union[ak.Array, CountTable, ChunkedCounts],
+        sketches: Optional[Dict[str, Sketch]] = None,
+        ignore_axes: Optional[List[str]] = None,
+        bins_per_axis: int = 4,
+        bins_per_axis_overrides: Optional[Dict[str, int]] = None,
+        tail_cap_quantile: Optional[float] = None,
+        merge_min_fraction: Optional[float] = None,
+        merge_min_bins: int = 1,
+        merge_cell_min_fraction: float = 0.0,
+        merge_cell_boxes: bool = False,
+        cost_model: Optional[CostModel] = None,
+        fill_threads: Optional[int] = None,
+        fill_chunk_size: int = DEFAULT_FILL_CHUNK_SIZE,
+        cache_size: int = DEFAULT_STAGE_CACHE_SIZE,
+    ):
+        if ignore_axes is None:
+            ignore_axes = []
+        _check_axis_options(counts.fields, ignore_axes, {})
+        self.counts = counts
+        self.sketches = sketches
+        self.ignore_axes = list(ignore_axes)
+        self.fill_threads = fill_threads
+        self.fill_chunk_size = fill_chunk_size
+        self.cache_size = cache_size
+        self._cache: Dict[str, Dict[_Stage, object]] = {}
+        self._fixed_boundaries: Optional[Dict[str, List[float]]] = None
+        self.max_cells: Optional[int] = None
+        self.prune_score = "entropy"
+        self.cost_model: Optional[CostModel] = None
+        self.with_cost_model(cost_model)
+        self.with_tail_caps(tail_cap_quantile)
+        self.with_bins(bins_per_axis, bins_per_axis_overrides)
+        self.with_bin_merging(merge_min_fraction, merge_min_bins)
+        self.merge_cells(merge_cell_min_fraction, boxes=merge_cell_boxes)
+
+    @classmethod
+    def from_parquet(cls, file_path: str, **kwargs) -> "Partitioner":
+        """Partition the counts saved by ``partition --output``."""
+        return cls(CountTable.from_parquet(file_path), **kwargs)
+
+    # Settings. Each returns ``self`` so calls can be chained.
+
+    def with_cost_model(self, cost_model: Optional[CostModel]) -> "Partitioner":
+        """Weight events by their estimated read cost (``None`` to count events)."""
+        if cost_model is not None and (
+            self.sketches is not None or isinstance(self.counts, ChunkedCounts)
+        ):
+            raise ValueError("Cost-weighted partitions need in-memory counts, not sketches.")
+        if cost_model is not None:
+            missing = [ax for ax in cost_model.weights if ax not in self.counts.fields]
+            if missing:
+                raise ValueError(f"Counts are missing cost axes: {', '.join(missing)}")
+        self.cost_model = cost_model
+        return self
+
+    def with_tail_caps(self, tail_cap_quantile: Optional[float]) -> "Partitioner":
+        """Cap each axis at this quantile (``None`` or 1 for no caps)."""
+        if tail_cap_quantile is not None and not 0.0 < tail_cap_quantile <= 1.0:
+            raise ValueError("tail_cap_quantile must be between 0 and 1.")
+        if tail_cap_quantile is not None and tail_cap_quantile >= 1.0:
+            tail_cap_quantile = None
+        self.tail_cap_quantile = tail_cap_quantile
+        return self
+
+    def with_bins(
+        self,
+        bins_per_axis: Optional[int] = None,
+        bins_per_axis_overrides: Optional[Dict[str, int]] = None,
+    ) -> "Partitioner":
+        """Use equal-frequency boundaries with this many bins per axis.
+
+        ``bins_per_axis`` defaults to the current value; the overrides replace
+        the current ones.
+        """
+        if bins_per_axis is None:
+            bins_per_axis = self.bins_per_axis
+        if bins_per_axis < 1:
+            raise ValueError("bins_per_axis must be >= 1.")
+        overrides = dict(bins_per_axis_overrides) if bins_per_axis_overrides else {}
+        _check_axis_options(self.counts.fields, self.ignore_axes, overrides)
+        bad = [ax for ax, bins in overrides.items() if bins < 1]
+        if bad:
+            raise ValueError(f"Bins must be >= 1 for axes: {', '.join(bad)}")
+        self.bins_per_axis = bins_per_axis
+        self.bins_per_axis_overrides = overrides
+        self._fixed_boundaries = None
+        return self
+
+    def with_cell_budget(
+        self, max_cells: Optional[int], score: str = "entropy"
+    ) -> Optional[CellBudget]:
+        """Reduce the requested bins, and prune axes left with one bin, until the
+        grid has at most ``max_cells`` cells (see :func:`fit_cell_budget`);
+        ``None`` removes the budget.
+
+        The requested bins are kept: the budget is refitted to them whenever
+        they change, and a larger budget gives back pruned axes and bins. The
+        axis marginals are cached, so trying several budgets is cheap. Returns
+        the budget result (``None`` without a budget).
+        """
+        if max_cells is not None:
+            if max_cells < 1:
+                raise ValueError("max_cells must be >= 1.")
+            if score not in PRUNE_SCORES:
+                raise ValueError(f"score must be one of {', '.join(PRUNE_SCORES)}.")
+            if self.sketches is not None or isinstance(self.counts, ChunkedCounts):
+                raise ValueError("A cell budget needs in-memory counts, not sketches.")
+            if self._fixed_boundaries is not None:
+                raise ValueError("A cell budget cannot change fixed boundaries.")
+        previous = (self.max_cells, self.prune_score)
+        self.max_cells, self.prune_score = max_cells, score
+        try:
+            return self.cell_budget
+        except ValueError:
+            self.max_cells, self.prune_score = previous
+            raise
+
+    def with_boundaries(self, boundaries: Dict[str, List[float]]) -> "Partitioner":
+        """Use the given bin boundaries instead of computing them."""
+        missing = [ax for ax in boundaries if ax not in self.counts.fields]
+        if missing:
+            raise ValueError(f"Counts are missing axes: {', '.join(missing)}")
+        if self.max_cells is not None:
+            raise ValueError("A cell budget cannot change fixed boundaries.")
+        self._fixed_boundaries = {axis: list(edges) for axis, edges in boundaries.items()}
+        return self
+
+    def with_bin_merging(self, min_fraction: Optional[float], min_bins: int = 1) -> "Partitioner":
+        """Merge neighbouring bins whose marginal fraction is below ``min_fraction``
+        (``None`` to keep every bin)."""
+        if min_fraction is not None and not 0.0 <= min_fraction <= 1.0:
+            raise ValueError("min_fraction must be between 0 and 1.")
+        if min_bins < 1:
+            raise ValueError("min_bins must be >= 1.")
+        self.merge_min_fraction = min_fraction
+        self.merge_min_bins = min_bins
+        return self
+
+    def merge_cells(self, min_fraction: float, boxes: Optional[bool] = None) -> "Partitioner":
+        """Group adjacent n-D cells until each group holds ``min_fraction`` of events.
+
+        With ``boxes`` every group is an axis-aligned box of cells
+        (:func:`merge_sparse_boxes`); it defaults to the current setting.
+        """
+        if not 0.0 <= min_fraction <= 1.0:
+            raise ValueError("min_fraction must be between 0 and 1.")
+        self.merge_cell_min_fraction = min_fraction
+        if boxes is not None:
+            self.merge_cell_boxes = boxes
+        return self
+
+    # Memoized stages.
+
+    def _stage(self, name: str, key: _Stage, compute: Callable[[], object]):
+        results = self._cache.setdefault(name, {})
+        if key in results:
+            return results[key]
+        value = compute()
+        if len(results) >= self.cache_size:
+            del results[next(iter(results))]
+        results[key] = value
+        return value
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
+    def _unbudgeted_bins(self) -> Dict[str, int]:
+        overrides = self.bins_per_axis_overrides
+        fields = [ax for ax in self.counts.fields if ax not in self.ignore_axes]
+        return {ax: overrides.get(ax, self.bins_per_axis) for ax in fields}
+
+    @property
+    def cell_budget(self) -> Optional[CellBudget]:
+        """The cell budget fitted to the requested bins (``None`` without one)."""
+        if self.max_cells is None or self._fixed_boundaries is not None:
+            return None
+        requested = self._unbudgeted_bins()
+
+        def compute():
+            _, caps = self._capped()
+            marginals: Dict[str, Marginal] = self._stage(
+                "marginals", self._caps_key() + self._cost_key(), dict
+            )
+            budget = fit_cell_budget(
+                self.counts,
+                requested,
+                self.max_cells,
+                score=self.prune_score,
+                weights=self.costs,
+                caps=caps,
+                marginals=marginals,
+            )
+            if not budget.bins:
+                raise ValueError(f"A budget of {self.max_cells} cells prunes every axis.")
+            return budget
+
+        key = self._caps_key() + self._cost_key()
+        key += (tuple(sorted(requested.items())), self.max_cells, self.prune_score)
+        return self._stage("cell_budget", key, compute)
+
+    @property
+    def pruned_axes(self) -> List[str]:
+        """Axes the cell budget prunes from the grid."""
+        budget = self.cell_budget
+        return [] if budget is None else list(budget.pruned_axes)
+
+    @property
+    def axes(self) -> List[str]:
+        """The grid axes: neither ignored nor pruned by the cell budget."""
+        pruned = self.pruned_axes
+        return [ax for ax in self.counts.fields if ax not in self.ignore_axes + pruned]
+
+    @property
+    def bins_by_axis(self) -> Dict[str, int]:
+        if self._fixed_boundaries is not None:
+            return {axis: len(edges) - 1 for axis, edges in self._fixed_boundaries.items()}
+        budget = self.cell_budget
+        if budget is not None:
+            return dict(budget.bins)
+        return self._unbudgeted_bins()
+
+    def _caps_key(self) -> _Stage:
+        return (self.tail_cap_quantile,)
+
+    def _cost_key(self) -> _Stage:
+        if self.cost_model is None:
+            return (None,)
+        return (self.cost_model.model_dump_json(),)
+
+    def _boundaries_key(self) -> _Stage:
+        key = self._caps_key() + self._cost_key()
+        if self._fixed_boundaries is not None:
+            return key + (_edges_key(self._fixed_boundaries),)
+        return key + (tuple(sorted(self.bins_by_axis.items())),)
+
+    def _bin_merging_key(self) -> _Stage:
+        return self._boundaries_key() + (self.merge_min_fraction, self.merge_min_bins)
+
+    def _capped(self) -> Tuple[Optional[Dict[str, Sketch]], Dict[str, float]]:
+        """The sketches with the caps folded in, and the cap per capped axis."""
+
+        def compute():
+            q = self.tail_cap_quantile
+            if q is None:
+                return self.sketches, {}
+            if self.sketches is not None:
+                caps = tail_caps_from_sketches(
+                    self.sketches, ignore_axes=self.ignore_axes, tail_cap_quantile=q
+                )
+                return cap_sketches(self.sketches, caps), caps
+            if isinstance(self.counts, ChunkedCounts):
+                raise ValueError("Chunked counts need sketches to compute tail caps.")
+            return None, compute_tail_caps(
+                self.counts, ignore_axes=self.ignore_axes, tail_cap_quantile=q
+            )
+
+        return self._stage("tail_caps", self._caps_key(), compute)
+
+    @property
+    def tail_caps(self) -> Dict[str, float]:
+        """Cap value per capped axis."""
+        return dict(self._capped()[1])
+
+    @property
+    def costs(self) -> Optional[np.ndarray]:
+        """Per-event cost in bytes under the cost model, or ``None`` without one."""
+        if self.cost_model is None:
+            return None
+        return self._stage(
+            "costs", self._cost_key(), lambda: event_costs(self.counts, self.cost_model)
+        )
+
+    def _simple_boundaries(self) -> Dict[str, List[float]]:
+        def compute():
+            if self._fixed_boundaries is not None:
+                return self._fixed_boundaries
+            sketches, caps = self._capped()
+            if sketches is not None:
+                return compute_bin_boundaries_from_sketches(
+                    sketches,
+                    ignore_axes=self.ignore_axes + self.pruned_axes,
+                    bins_per_axis=1,
+                    bins_per_axis_overrides=self.bins_by_axis,
+                )
+            if isinstance(self.counts, ChunkedCounts):
+                raise ValueError("Chunked counts need sketches to compute boundaries.")
+            return compute_bin_boundaries(
+                self.counts,
+                ignore_axes=self.ignore_axes + self.pruned_axes,
+                bins_per_axis=1,
+                bins_per_axis_overrides=self.bins_by_axis,
+                weights=self.costs,
+                caps=caps,
+            )
+
+        return self._stage("boundaries", self._boundaries_key(), compute)
+
+    def _simple_histogram(self) -> BaseHist:
+        def compute():
+            _, caps = self._capped()
+            boundaries = self._simple_boundaries()
+            if isinstance(self.counts, ChunkedCounts):
+                return self.counts.with_caps(caps).build_nd_histogram(boundaries)
+            return build_nd_histogram(
+                self.counts,
+                boundaries,
+                threads=self.fill_threads,
+                chunk_size=self.fill_chunk_size,
+                weights=self.costs,
+                caps=caps,
+            )
+
+        return self._stage("histogram", self._boundaries_key(), compute)
+
+    def _merged_bins(self) -> Tuple[BaseHist, Dict[str, int]]:
+        def compute():
+            hist = self._simple_histogram()
+            if self.merge_min_fraction is None:
+                return hist, {}
+            return merge_sparse_bins(
+                hist, min_fraction=self.merge_min_fraction, min_bins=self.merge_min_bins
+            )
+
+        return self._stage("bin_merging", self._bin_merging_key(), compute)
+
+    @property
+    def histogram(self) -> BaseHist:
+        """The n-D histogram, after sparse bin merging if enabled."""
+        return self._merged_bins()[0]
+
+    @property
+    def bin_merges(self) -> Dict[str, int]:
+        """Number of bins removed per axis by sparse bin merging."""
+        return dict(self._merged_bins()[1])
+
+    @property
+    def boundaries(self) -> Dict[str, List[float]]:
+        """Bin boundaries, after sparse bin merging if enabled."""
+        if self.merge_min_fraction is None:
+            return self._simple_boundaries()
+        return histogram_boundaries(self.histogram)
+
+    @property
+    def summary(self) -> Dict[str, float]:
+        return histogram_summary(self.histogram)
+
+    @property
+    def requested_bins(self) -> Optional[Dict[str, int]]:
+        """Bins requested per axis (``None`` with fixed boundaries)."""
+        if self._fixed_boundaries is not None:
+            return None
+        return self.bins_by_axis
+
+    def _merged_cells(self) -> Tuple[List[MergedCellGroup], Dict[str, float]]:
+        key = self._bin_merging_key() + (self.merge_cell_min_fraction, self.merge_cell_boxes)
+        merge = merge_sparse_boxes if self.merge_cell_boxes else merge_sparse_cells
+        return self._stage(
+            "cell_merging",
+            key,
+            lambda: merge(self.histogram, min_fraction=self.merge_cell_min_fraction),
+        )
+
+    @property
+    def merged_groups(self) -> List[MergedCellGroup]:
+        return self._merged_cells()[0]
+
+    @property
+    def merged_summary(self) -> Dict[str, float]:
+        return self._merged_cells()[1]
+
+    @property
+    def merged_cells(self) -> MergedCells:
+        return MergedCells(min_fraction=self.merge_cell_min_fraction, groups=self.merged_groups)
+
+    def kdtree(
+        self,
+        leaf_fraction: float = DEFAULT_KDTREE_LEAF_FRACTION,
+        max_depth: int = DEFAULT_KDTREE_MAX_DEPTH,
+    ) -> KDTree:
+        """A kd-tree partition of the (uncapped) counts, as an alternative to the
+        grid stages above."""
+        if isinstance(self.counts, ChunkedCounts):
+            raise ValueError("kd-tree partitions need in-memory counts.")
+        return self._stage(
+            "kdtree",
+            self._cost_key() + (leaf_fraction, max_depth),
+            lambda: KDTree.build(
+                self.counts,
+                ignore_axes=self.ignore_axes,
+                leaf_fraction=leaf_fraction,
+                max_depth=max_depth,
+                weights=self.costs,
+            ),
+        )
+
+    def write(
+        self,
+        boundaries_file: str = "bin_boundaries.yaml",
+        histogram_file: Optional[str] = "histogram.pkl",
+        commands: Optional[List[str]] = None,
+    ) -> None:
+        """Write the boundaries and merged cells (and the histogram) to disk."""
+        write_bin_boundaries_yaml(
+            self.boundaries,
+            boundaries_file,
+            merged_cells=self.merged_cells,
+            commands=commands,
+            cost_model=self.cost_model,
+            bins_per_axis=self.requested_bins,
+        )
+        if histogram_file is not None:
+            write_histogram_pickle(self.histogram, histogram_file)
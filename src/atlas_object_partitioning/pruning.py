@@ -0,0 +1,198 @@
+from typing import Dict, List, Optional, Tuple
+
+import awkward as ak
+import numpy as np
+from pydantic import BaseModel
+
+from atlas_object_partitioning.histograms import (
+    DEFAULT_CONTINUOUS_SAMPLE_SIZE,
+    _boundaries_from_value_counts,
+    _fold_value_counts,
+    _is_continuous,
+)
+
+# Axis scores used to decide which axes lose bins first.
+PRUNE_SCORES = ("entropy", "variance")
+
+
+class Marginal:
+    """The distribution of one axis, reduced to sorted support values and the
+    (weighted) number of events at each.
+
+    Integer axes keep their distinct values, so binning them at any number of
+    bins only touches a handful of numbers. Continuous axes keep the fixed-seed
+    sample of at most ``sample_size`` values that :func:`compute_bin_boundaries`
+    draws, sorted, so their edges at any number of bins are read off the sample
+    and match those of :func:`compute_bin_boundaries`.
+    """
+
+    def __init__(
+        self,
+        values: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+        cap: Optional[float] = None,
+        sample_size: Optional[int] = DEFAULT_CONTINUOUS_SAMPLE_SIZE,
+    ):
+        self.continuous = _is_continuous(values)
+        self.weighted = weights is not None
+        if self.continuous:
+            self.low = float(np.min(values)) if len(values) else 0.0
+            self.high = float(np.max(values)) if len(values) else 0.0
+            if cap is not None:
+                self.low, self.high = min(self.low, cap), min(self.high, cap)
+            picked = np.arange(len(values))
+            sample = np.asarray(values, dtype=float)
+            if sample_size is not None and len(values) > sample_size:
+                picked = np.random.default_rng(0).choice(len(values), sample_size, replace=False)
+                sample = values[picked]
+            if cap is not None:
+                # Capped in the sample's own dtype, as _compute_continuous_boundaries does.
+                sample = np.minimum(sample, cap)
+            order = np.argsort(sample, kind="stable")
+            self.support = sample[order].astype(float)
+            self.mass = (
+                np.ones(len(sample)) if weights is None else weights[picked][order].astype(float)
+            )
+        else:
+            support, inverse = np.unique(np.asarray(values, dtype=np.int64), return_inverse=True)
+            mass = np.bincount(inverse, weights=weights, minlength=len(support))
+            if cap is not None:
+                support, mass = _fold_value_counts(support, mass, int(cap))
+            self.support, self.mass = support, mass.astype(float)
+
+    def edges(self, n_bins: int) -> List[float]:
+        """Equal-frequency edges for ``n_bins`` bins (fewer if values repeat)."""
+        if len(self.support) == 0:
+            return []
+        if self.continuous:
+            return self._continuous_edges(n_bins)
+        return _boundaries_from_value_counts(self.support, self.mass, n_bins)
+
+    def _continuous_edges(self, n_bins: int) -> List[float]:
+        # The order statistics (or weighted quantiles) that
+        # _compute_continuous_boundaries finds in the same sample.
+        if self.weighted:
+            cumulative = np.cumsum(self.mass)
+            targets = cumulative[-1] * np.arange(1, n_bins) / n_bins
+            ranks = np.searchsorted(cumulative, targets, side="right")
+            ranks = np.minimum(ranks, len(self.support) - 1)
+        else:
+            ranks = len(self.support) * np.arange(1, n_bins) // n_bins
+        inner = [float(b) for b in self.support[ranks] if self.low < b <= self.high]
+        upper = float(np.nextafter(self.high, np.inf))
+        return sorted(set([self.low] + inner + [upper]))
+
+    def score(self, edges: List[float], score: str = "entropy") -> float:
+        """How much of the axis the bins given by ``edges`` resolve.
+
+        ``entropy`` is the entropy in bits of the binned distribution.
+        ``variance`` is the fraction of the axis variance that lies between bins
+        (1 when every bin holds a single value, 0 for a single bin).
+        """
+        if score not in PRUNE_SCORES:
+            raise ValueError(f"score must be one of {', '.join(PRUNE_SCORES)}.")
+        n_bins = len(edges) - 1
+        if n_bins < 1 or self.mass.sum() <= 0:
+            return 0.0
+        idx = np.searchsorted(np.asarray(edges, dtype=float), self.support, side="right") - 1
+        idx = np.clip(idx, 0, n_bins - 1)
+        counts = np.bincount(idx, weights=self.mass, minlength=n_bins)
+        total = counts.sum()
+        if score == "entropy":
+            p = counts[counts > 0] / total
+            return float(-(p * np.log2(p)).sum())
+        mean = float((self.mass * self.support).sum() / total)
+        variance = float((self.mass * (self.support - mean) ** 2).sum() / total)
+        if variance <= 0:
+            return 0.0
+        sums = np.bincount(idx, weights=self.mass * self.support, minlength=n_bins)
+        filled = counts > 0
+        bin_means = sums[filled] / counts[filled]
+        between = float((counts[filled] * (bin_means - mean) ** 2).sum() / total)
+        return min(between / variance, 1.0)
+
+
+class CellBudget(BaseModel):
+    """Result of :func:`fit_cell_budget`: the bins to request per kept axis, the
+    pruned axes, the number of grid cells and the final score of every axis."""
+
+    max_cells: int
+    score: str
+    bins: Dict[str, int]
+    pruned_axes: List[str]
+    cells: int
+    scores: Dict[str, float]
+
+
+def fit_cell_budget(
+    data: ak.Array,
+    bins_by_axis: Dict[str, int],
+    max_cells: int,
+    score: str = "entropy",
+    weights: Optional[np.ndarray] = None,
+    caps: Optional[Dict[str, float]] = None,
+    marginals: Optional[Dict[str, Marginal]] = None,
+) -> CellBudget:
+    """Reduce bins per axis until the n-D grid has at most ``max_cells`` cells.
+
+    Every axis starts at its requested bins (``bins_by_axis``). While the grid
+    is too big, the axis that loses the least ``score`` per bit of grid size
+    saved gives up a bin; its edges are recomputed from its marginal, so the
+    cost of each step is independent of the number of events. By ``entropy``,
+    axes that barely vary (mostly-zero taus or photons) lose their bins first;
+    by ``variance``, bins that split little of an axis' spread go first. Axes
+    left with a single bin are pruned from the grid. No n-D histogram is filled.
+
+    ``marginals`` (per axis, e.g. kept from an earlier call) are reused and
+    missing ones are added to it.
+    """
+    if max_cells < 1:
+        raise ValueError("max_cells must be >= 1.")
+    if score not in PRUNE_SCORES:
+        raise ValueError(f"score must be one of {', '.join(PRUNE_SCORES)}.")
+    if caps is None:
+        caps = {}
+    if marginals is None:
+        marginals = {}
+    for axis in bins_by_axis:
+        if axis not in marginals:
+            marginals[axis] = Marginal(ak.to_numpy(data[axis]), weights, caps.get(axis))
+
+    candidates: Dict[Tuple[str, int], Tuple[int, float]] = {}
+
+    def evaluate(axis: str, n_bins: int) -> Tuple[int, float]:
+        # Actual number of bins (repeated values can collapse edges) and score.
+        if (axis, n_bins) not in candidates:
+            edges = marginals[axis].edges(n_bins)
+            candidates[axis, n_bins] = (
+                max(len(edges) - 1, 1),
+                marginals[axis].score(edges, score),
+            )
+        return candidates[axis, n_bins]
+
+    requested = dict(bins_by_axis)
+    state = {axis: evaluate(axis, n_bins) for axis, n_bins in requested.items()}
+    while np.prod([n for n, _ in state.values()], dtype=np.float64) > max_cells:
+        best = None
+        for axis, (n_bins, value) in state.items():
+            if n_bins <= 1:
+                continue
+            fewer, fewer_value = evaluate(axis, n_bins - 1)
+            loss = (value - fewer_value) / (np.log2(n_bins) - np.log2(fewer))
+            if best is None or loss < best[0]:
+                best = (loss, axis, n_bins - 1)
+        if best is None:
+            break
+        _, axis, n_bins = best
+        requested[axis] = n_bins
+        state[axis] = evaluate(axis, n_bins)
+
+    pruned = [axis for axis, (n_bins, _) in state.items() if n_bins <= 1]
+    return CellBudget(
+        max_cells=max_cells,
+        score=score,
+        bins={axis: requested[axis] for axis in state if axis not in pruned},
+        pruned_axes=pruned,
+        cells=int(np.prod([n for n, _ in state.values()], dtype=np.int64)),
+        scores={axis: value for axis, (_, value) in state.items()},
+    )
@@ -1,30 +1,123 @@
-from typing import Optional
+import os
+from typing import Dict, List, Optional, Tuple, Union
 
+import awkward as ak
+import numpy as np
 from func_adl_servicex_xaodr25 import FuncADLQueryPHYSLITE
-from servicex_analysis_utils import to_awk
 
+from atlas_object_partitioning.chunked import DEFAULT_CHUNK_SIZE, ChunkedCounts
+from atlas_object_partitioning.columns import (
+    CountTable,
+    as_count_table,
+    read_count_files,
+)
 from atlas_object_partitioning.local_mode import build_sx_spec
-from atlas_object_partitioning.local_mode import deliver
+from atlas_object_partitioning.local_mode import deliver, source_files
+from atlas_object_partitioning.native import (
+    count_physlite_files,
+    local_physlite_files,
+    physlite_entries,
+)
+from atlas_object_partitioning.sketches import DEFAULT_KLL_K, Sketch
 
+# FuncADL expression (in terms of the event ``e``) used to compute each axis.
+AXIS_EXPRESSIONS: Dict[str, str] = {
+    "n_jets": "e.Jets().Count()",
+    "n_large_jets": "e.Jets('AnalysisLargeRJets').Count()",
+    "n_electrons": "e.Electrons().Count()",
+    "n_muons": "e.Muons().Count()",
+    "n_taus": "e.TauJets('AnalysisTauJets').Count()",
+    "n_photons": "e.Photons().Count()",
+    "met": "e.MissingET().First().met() / 1000.0",
+}
 
-def collect_object_counts(
+ALL_AXES: List[str] = list(AXIS_EXPRESSIONS.keys())
+
+# Event identifiers that can be carried alongside the counts.
+EVENT_ID_EXPRESSIONS: Dict[str, str] = {
+    "run_number": "e.EventInfo('EventInfo').runNumber()",
+    "event_number": "e.EventInfo('EventInfo').eventNumber()",
+}
+
+# Provenance columns added when the delivered files are loaded: the index of the
+# input file in the returned file list, and the entry of the event in it.
+# ServiceX writes one output file per input file (see local_mode.source_files)
+# and the count query has no event filter, so the entry of an event in the
+# delivered file should be its entry in the input file. check_entries verifies
+# this against the inputs that can be opened locally.
+PROVENANCE_FIELDS: List[str] = ["file_index", "entry"]
+
+EVENT_ID_FIELDS: List[str] = list(EVENT_ID_EXPRESSIONS.keys()) + PROVENANCE_FIELDS
+
+
+def select_axes(
+    ignore_axes: Optional[List[str]] = None, catalog: Optional[Dict[str, str]] = None
+) -> List[str]:
+    """Return the axes to fetch, in canonical order, after dropping ``ignore_axes``.
+
+    ``catalog`` (see :func:`catalog.load_axis_catalog`) replaces the built-in
+    :data:`AXIS_EXPRESSIONS`.
+    """
+    expressions = AXIS_EXPRESSIONS if catalog is None else catalog
+    if ignore_axes is None:
+        ignore_axes = []
+    unknown = [ax for ax in ignore_axes if ax not in expressions]
+    if len(unknown) > 0:
+        raise ValueError(f"Cannot ignore unknown axes: {', '.join(unknown)}")
+    return [ax for ax in expressions if ax not in ignore_axes]
+
+
+def build_count_query_lambda(
+    axes: List[str], with_event_ids: bool = False, catalog: Optional[Dict[str, str]] = None
+) -> str:
+    """Build the FuncADL ``Select`` lambda that computes only ``axes``.
+
+    The columns are always emitted in canonical order so that the same set of
+    axes produces the same query (and so the same ServiceX cache key). With
+    ``with_event_ids`` the run and event numbers are added after the axes.
+    Axes are looked up in ``catalog`` when given, else in :data:`AXIS_EXPRESSIONS`.
+    """
+    expressions = AXIS_EXPRESSIONS if catalog is None else catalog
+    unknown = [ax for ax in axes if ax not in expressions]
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown axes: {', '.join(unknown)}")
+    if len(axes) == 0:
+        raise ValueError("At least one axis must be requested.")
+    columns = [f"'{ax}': {expr}" for ax, expr in expressions.items() if ax in axes]
+    if with_event_ids:
+        columns += [f"'{name}': {expr}" for name, expr in EVENT_ID_EXPRESSIONS.items()]
+    return f"lambda e: {{{', '.join(columns)}}}"
+
+
+def deliver_object_counts(
     ds_name: str,
     n_files: int = 1,
     servicex_name: Optional[str] = None,
     ignore_local_cache: bool = False,
-):
+    axes: Optional[List[str]] = None,
+    with_event_ids: bool = False,
+    workers: Optional[int] = None,
+    catalog: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """Run the count query for ``axes`` (all axes by default) and return the
+    delivered file paths. Local datasets are transformed on ``workers`` warm
+    transformer containers (see :class:`local_mode.WarmDockerPool`).
 
-    # Build the query to count objects per event
+    With an axis ``catalog`` the query computes every axis of the catalog, so
+    any subset of them shares one transform (and one cache entry).
+    """
+    if catalog is not None:
+        unknown = [ax for ax in axes or [] if ax not in catalog]
+        if unknown:
+            raise ValueError(f"Axes not in the axis catalog: {', '.join(unknown)}")
+        axes = list(catalog)
+    elif axes is None:
+        axes = ALL_AXES
+
+    # Build the query to count objects per event. Only the requested columns are
+    # in the query, so ignored collections are never read by the transformer.
     query = FuncADLQueryPHYSLITE().Select(
-        lambda e: {
-            "n_jets": e.Jets().Count(),
-            "n_large_jets": e.Jets("AnalysisLargeRJets").Count(),
-            "n_electrons": e.Electrons().Count(),
-            "n_muons": e.Muons().Count(),
-            "n_taus": e.TauJets("AnalysisTauJets").Count(),
-            "n_photons": e.Photons().Count(),
-            "met": e.MissingET().First().met() / 1000.0,
-        }
+        build_count_query_lambda(axes, with_event_ids=with_event_ids, catalog=catalog)
     )
 
     def _nfiles_value(n_files):
@@ -39,9 +132,219 @@ def collect_object_counts(
         backend_name=servicex_name,
         n_files=_nfiles_value(n_files),
         title="object_counts",
+        local_workers=workers,
     )
     r = deliver(spec, backend_name, adaptor=adaptor, ignore_local_cache=ignore_local_cache)
+    return list(r["object_counts"])
+
+
+def load_object_counts(paths: List[str]) -> CountTable:
+    """Load delivered count files into a single Arrow-backed :class:`CountTable`."""
+    return read_count_files(paths)
+
+
+def add_provenance(file_counts: List[Union[ak.Array, CountTable]]) -> CountTable:
+    """Concatenate per-file counts, adding the ``file_index`` and ``entry`` of
+    each event (see :data:`PROVENANCE_FIELDS`)."""
+    tables = []
+    for file_index, counts in enumerate(file_counts):
+        provenance = {
+            "file_index": np.full(len(counts), file_index, dtype=np.int32),
+            "entry": np.arange(len(counts), dtype=np.int64),
+        }
+        tables.append(as_count_table(counts).with_columns(provenance))
+    return CountTable.concatenate(tables)
+
+
+def check_entries(file_counts: List[Union[ak.Array, CountTable]], files: List[str]) -> bool:
+    """Check that each of ``file_counts`` holds every event of its input file.
+
+    Inputs that exist locally are opened, and a table whose length differs
+    from the number of events in its input raises a ``ValueError``: its rows
+    cannot be entries of the input. Returns False when some inputs are not
+    local (rucio files), so their entries are assumed rather than checked.
+    """
+    exact = True
+    for counts, path in zip(file_counts, files):
+        if not os.path.isfile(path):
+            exact = False
+            continue
+        n_entries = physlite_entries(path)
+        if len(counts) != n_entries:
+            raise ValueError(
+                f"Delivered counts for {path} have {len(counts):,} events, but the file has "
+                f"{n_entries:,}; their rows are not entries of the file."
+            )
+    return exact
+
+
+def collect_file_counts(
+    ds_name: str,
+    n_files: int = 1,
+    servicex_name: Optional[str] = None,
+    ignore_local_cache: bool = False,
+    axes: Optional[List[str]] = None,
+    with_event_ids: bool = False,
+    native: bool = False,
+    workers: Optional[int] = None,
+    catalog: Optional[Dict[str, str]] = None,
+) -> Tuple[List[CountTable], List[str]]:
+    """Per-file object counts for ``axes`` (all axes by default), and the files
+    they were read from.
+
+    By default the count query runs on ServiceX and the delivered files are
+    loaded. With ``native`` the objects in local PHYSLITE files are counted
+    directly with uproot on ``workers`` local processes (see
+    :func:`native.count_physlite_files`), and the files are the PHYSLITE files.
+    With an axis ``catalog`` the axes are catalog axes (all by default).
+    """
+    if axes is None:
+        axes = ALL_AXES if catalog is None else list(catalog)
+    if native:
+        if catalog is not None:
+            raise ValueError("An axis catalog needs the count query and cannot be used natively.")
+        unknown = [ax for ax in axes if ax not in AXIS_EXPRESSIONS]
+        if unknown:
+            raise ValueError(f"Unknown axes: {', '.join(unknown)}")
+        paths = local_physlite_files(ds_name, n_files=n_files)
+        fields = [ax for ax in ALL_AXES if ax in axes]
+        return count_physlite_files(paths, fields, with_event_ids, workers=workers), paths
+    paths = deliver_object_counts(
+        ds_name,
+        n_files=n_files,
+        servicex_name=servicex_name,
+        ignore_local_cache=ignore_local_cache,
+        axes=axes,
+        with_event_ids=with_event_ids,
+        workers=workers,
+        catalog=catalog,
+    )
+    tables = [load_object_counts([path]) for path in paths]
+    if catalog is not None:
+        # The files hold every catalog axis; keep the requested ones.
+        fields = [ax for ax in catalog if ax in axes]
+        if with_event_ids:
+            fields += list(EVENT_ID_EXPRESSIONS)
+        tables = [table[fields] for table in tables]
+    return tables, paths
+
 
-    result = to_awk(r)
+def collect_object_counts(
+    ds_name: str,
+    n_files: int = 1,
+    servicex_name: Optional[str] = None,
+    ignore_local_cache: bool = False,
+    axes: Optional[List[str]] = None,
+    native: bool = False,
+    workers: Optional[int] = None,
+    catalog: Optional[Dict[str, str]] = None,
+) -> CountTable:
+    """Fetch per-event object counts for ``axes`` (all axes by default)."""
+    tables, _ = collect_file_counts(
+        ds_name,
+        n_files=n_files,
+        servicex_name=servicex_name,
+        ignore_local_cache=ignore_local_cache,
+        axes=axes,
+        native=native,
+        workers=workers,
+        catalog=catalog,
+    )
+    return tables[0] if len(tables) == 1 else CountTable.concatenate(tables)
+
+
+def collect_object_counts_with_sketches(
+    ds_name: str,
+    n_files: int = 1,
+    servicex_name: Optional[str] = None,
+    ignore_local_cache: bool = False,
+    axes: Optional[List[str]] = None,
+    k: int = DEFAULT_KLL_K,
+    step_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    catalog: Optional[Dict[str, str]] = None,
+) -> Tuple[ChunkedCounts, Dict[str, Sketch]]:
+    """Like :func:`collect_object_counts_chunked`, but also build a sketch per
+    delivered file and return the merged per-axis sketches.
+
+    The files are streamed to build the sketches and never held in memory
+    together, so the memory used does not grow with the number of events.
+    """
+    counts = collect_object_counts_chunked(
+        ds_name,
+        n_files=n_files,
+        servicex_name=servicex_name,
+        ignore_local_cache=ignore_local_cache,
+        axes=axes,
+        step_size=step_size,
+        workers=workers,
+        catalog=catalog,
+    )
+    return counts, counts.sketches(k=k)
 
-    return result["object_counts"]
+
+def collect_object_counts_chunked(
+    ds_name: str,
+    n_files: int = 1,
+    servicex_name: Optional[str] = None,
+    ignore_local_cache: bool = False,
+    axes: Optional[List[str]] = None,
+    step_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    catalog: Optional[Dict[str, str]] = None,
+) -> ChunkedCounts:
+    """Like :func:`collect_object_counts`, but return a lazy, chunked view of the
+    delivered files instead of loading every event into memory."""
+    known_axes = ALL_AXES if catalog is None else list(catalog)
+    if axes is None:
+        axes = known_axes
+    paths = deliver_object_counts(
+        ds_name,
+        n_files=n_files,
+        servicex_name=servicex_name,
+        ignore_local_cache=ignore_local_cache,
+        axes=axes,
+        workers=workers,
+        catalog=catalog,
+    )
+    fields = [ax for ax in known_axes if ax in axes]
+    return ChunkedCounts(paths, fields, step_size=step_size, workers=workers)
+
+
+def collect_object_counts_with_provenance(
+    ds_name: str,
+    n_files: int = 1,
+    servicex_name: Optional[str] = None,
+    ignore_local_cache: bool = False,
+    axes: Optional[List[str]] = None,
+    with_event_ids: bool = False,
+    native: bool = False,
+    workers: Optional[int] = None,
+    catalog: Optional[Dict[str, str]] = None,
+) -> Tuple[CountTable, List[str], bool]:
+    """Like :func:`collect_object_counts`, but also carry the provenance
+    (:data:`PROVENANCE_FIELDS`) of every event and, with ``with_event_ids``,
+    its run and event numbers.
+
+    Returns the counts, the input files that ``file_index`` refers to (the
+    PHYSLITE files the delivered files were made from, see
+    :func:`local_mode.source_files`, or the counted files with ``native``) and
+    whether every ``entry`` was checked against its input (see
+    :func:`check_entries`).
+    """
+    tables, paths = collect_file_counts(
+        ds_name,
+        n_files=n_files,
+        servicex_name=servicex_name,
+        ignore_local_cache=ignore_local_cache,
+        axes=axes,
+        with_event_ids=with_event_ids,
+        native=native,
+        workers=workers,
+        catalog=catalog,
+    )
+    exact = True
+    if not native:
+        paths = source_files(ds_name, paths)
+        exact = check_entries(tables, paths)
+    return add_provenance(tables), paths, exact
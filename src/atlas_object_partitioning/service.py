@@ -0,0 +1,339 @@
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import yaml
+from hist import BaseHist
+
+from atlas_object_partitioning.columns import CountTable
+from atlas_object_partitioning.composite import (
+    composite_components,
+    composite_total,
+    composite_values,
+    input_axes,
+    is_composite,
+)
+from atlas_object_partitioning.histograms import (
+    BinBoundaries,
+    _axis_bin_indices,
+    calc_usage_fraction,
+    cell_group_labels,
+    histogram_summary,
+    load_histogram_pickle,
+    merge_sparse_bins,
+    merge_sparse_cells,
+)
+
+
+class LoadedPartition:
+    """A partition (boundaries, merged groups and optional histogram and count
+    table) parsed once and kept in memory."""
+
+    def __init__(
+        self,
+        name: str,
+        boundaries_file: str,
+        histogram_file: Optional[str] = None,
+        counts_file: Optional[str] = None,
+    ):
+        self.name = name
+        self.boundaries_file = boundaries_file
+        self.histogram_file = histogram_file
+        self.counts_file = counts_file
+        self.mtimes = self._current_mtimes()
+
+        with open(boundaries_file) as f:
+            data = BinBoundaries.model_validate(yaml.safe_load(f))
+        if data.kdtree is not None:
+            raise ValueError(f"{boundaries_file} is a kd-tree partition; serve needs a grid.")
+        self.boundaries: Dict[str, List[float]] = {
+            axis: list(edges) for axis, edges in data.axes.items()
+        }
+        self.axes = list(self.boundaries)
+        self.shape = tuple(len(edges) - 1 for edges in self.boundaries.values())
+        self.groups = data.merged_cells.groups if data.merged_cells is not None else []
+        self.usage_groups = [
+            {"cells": group.cells, "box": group.box, "fraction": group.fraction}
+            for group in self.groups
+        ]
+        self.labels = cell_group_labels(self.groups, self.axes, self.shape)
+        self.hist: Optional[BaseHist] = (
+            load_histogram_pickle(histogram_file) if histogram_file is not None else None
+        )
+        self.counts: Optional[Dict[str, np.ndarray]] = None
+        if counts_file is not None:
+            table = CountTable.from_parquet(counts_file)
+            self.counts = {axis: table[axis] for axis in table.fields}
+
+    def _current_mtimes(self) -> Tuple[Optional[float], ...]:
+        return tuple(
+            os.stat(path).st_mtime if path is not None else None
+            for path in (self.boundaries_file, self.histogram_file, self.counts_file)
+        )
+
+    def is_stale(self) -> bool:
+        return self._current_mtimes() != self.mtimes
+
+    def reload(self) -> "LoadedPartition":
+        return LoadedPartition(
+            self.name, self.boundaries_file, self.histogram_file, self.counts_file
+        )
+
+
+class PartitionService:
+    """Answers usage, lookup, summary and rebinning queries against loaded
+    partitions. Files are re-read when their modification time changes."""
+
+    def __init__(self, partitions: List[LoadedPartition]):
+        self._partitions: Dict[str, LoadedPartition] = {p.name: p for p in partitions}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def partition(self, name: Optional[str]) -> LoadedPartition:
+        with self._lock:
+            if name is None:
+                if len(self._partitions) != 1:
+                    raise ValueError("Specify a partition name.")
+                name = next(iter(self._partitions))
+            if name not in self._partitions:
+                raise KeyError(f"Unknown partition {name}.")
+            current = self._partitions[name]
+        # Reload outside the lock; concurrent requests keep using the old state.
+        try:
+            if not current.is_stale():
+                return current
+            reloaded = current.reload()
+        except Exception as exc:
+            # A half-written or deleted file: keep serving what was loaded before.
+            logging.warning(f"Could not reload partition {name}, keeping previous state: {exc}")
+            return current
+        logging.info(f"Reloaded partition {name}")
+        with self._lock:
+            self._partitions[name] = reloaded
+        return reloaded
+
+    def record(self, endpoint: str, latency: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] += latency * 1000.0
+            stats["max_ms"] = max(stats["max_ms"], latency * 1000.0)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                endpoint: {
+                    "count": int(s["count"]),
+                    "mean_ms": s["total_ms"] / s["count"],
+                    "max_ms": s["max_ms"],
+                }
+                for endpoint, s in self._stats.items()
+            }
+
+    def partitions(self) -> Dict[str, object]:
+        with self._lock:
+            names = list(self._partitions)
+        return {"partitions": [self.summary(name) for name in names]}
+
+    def usage(self, name: Optional[str], cuts: Dict[str, float]) -> Dict[str, object]:
+        p = self.partition(name)
+        held = set(p.axes) | set(input_axes(p.axes))
+        missing = [axis for axis in cuts if axis not in held]
+        if missing:
+            raise ValueError(f"Partition {p.name} does not contain axis {', '.join(missing)}.")
+        result: Dict[str, object] = {
+            "partition": p.name,
+            "usage_fraction": calc_usage_fraction(p.boundaries, p.usage_groups, cuts),
+        }
+        if p.counts is not None and len(cuts) > 0:
+            passing = np.ones(len(next(iter(p.counts.values()))), dtype=bool)
+            for axis, value in cuts.items():
+                if axis in p.counts:
+                    passing &= p.counts[axis] >= value
+                elif is_composite(axis) and all(c in p.counts for c in composite_components(axis)):
+                    # A cut on a composite axis is a cut on its total count.
+                    passing &= composite_total(p.counts, axis) >= value
+                else:
+                    raise ValueError(f"Count table for {p.name} has no axis {axis}.")
+            result["selected_fraction"] = float(passing.mean()) if passing.size else 0.0
+        return result
+
+    def lookup(self, name: Optional[str], values: Dict[str, float]) -> Dict[str, object]:
+        p = self.partition(name)
+        values = dict(values)
+        for axis in p.axes:
+            components = composite_components(axis)
+            if axis not in values and is_composite(axis) and all(c in values for c in components):
+                counts = {c: np.array([int(values[c])]) for c in components}
+                values[axis] = int(composite_values(counts, axis)[0])
+        missing = [axis for axis in p.axes if axis not in values]
+        if missing:
+            raise ValueError(f"Lookup needs values for {', '.join(missing)}.")
+        cell: Dict[str, int] = {}
+        for axis in p.axes:
+            idx = int(_axis_bin_indices(np.array([values[axis]]), p.boundaries[axis])[0]) - 1
+            if idx < 0 or idx >= len(p.boundaries[axis]) - 1:
+                return {"partition": p.name, "cell": None, "group": None}
+            cell[axis] = idx
+        flat = int(np.ravel_multi_index(tuple(cell[axis] for axis in p.axes), p.shape))
+        gid = int(p.labels[flat])
+        result: Dict[str, object] = {"partition": p.name, "cell": cell, "group": None}
+        if gid >= 0:
+            group = p.groups[gid]
+            result.update(group=gid, count=group.count, fraction=group.fraction)
+        return result
+
+    def summary(self, name: Optional[str]) -> Dict[str, object]:
+        p = self.partition(name)
+        fractions = [group.fraction for group in p.groups]
+        return {
+            "partition": p.name,
+            "axes": {axis: len(edges) - 1 for axis, edges in p.boundaries.items()},
+            "total_cells": int(np.prod(p.shape)),
+            "groups": len(p.groups),
+            "total_count": int(sum(group.count for group in p.groups)),
+            "max_group_fraction": max(fractions) if fractions else 0.0,
+            "min_group_fraction": min(fractions) if fractions else 0.0,
+            "has_histogram": p.hist is not None,
+            "has_counts": p.counts is not None,
+        }
+
+    def rebin(
+        self,
+        name: Optional[str],
+        merge_min_fraction: Optional[float],
+        merge_min_bins: int,
+        merge_cell_min_fraction: Optional[float],
+    ) -> Dict[str, object]:
+        p = self.partition(name)
+        if p.hist is None:
+            raise ValueError(f"Partition {p.name} was loaded without a histogram.")
+        hist = p.hist
+        result: Dict[str, object] = {"partition": p.name}
+        if merge_min_fraction is not None:
+            hist, merges = merge_sparse_bins(
+                hist, min_fraction=merge_min_fraction, min_bins=merge_min_bins
+            )
+            result["bin_merges"] = merges
+        result["histogram"] = histogram_summary(hist)
+        if merge_cell_min_fraction is not None:
+            groups, merged_summary = merge_sparse_cells(hist, min_fraction=merge_cell_min_fraction)
+            result["groups"] = len(groups)
+            result["merged"] = merged_summary
+        return result
+
+
+def _float_params(query: Dict[str, List[str]], exclude: Tuple[str, ...]) -> Dict[str, float]:
+    values: Dict[str, float] = {}
+    for key, entries in query.items():
+        if key in exclude:
+            continue
+        try:
+            values[key] = float(entries[-1])
+        except ValueError as exc:
+            raise ValueError(f"Query parameter {key} must be numeric.") from exc
+    return values
+
+
+def _optional_float(query: Dict[str, List[str]], key: str) -> Optional[float]:
+    if key not in query:
+        return None
+    try:
+        return float(query[key][-1])
+    except ValueError as exc:
+        raise ValueError(f"Query parameter {key} must be numeric.") from exc
+
+
+def _route(
+    service: PartitionService, endpoint: str, query: Dict[str, List[str]]
+) -> Dict[str, object]:
+    name = query.get("partition", [None])[-1]
+    if endpoint == "/partitions":
+        return service.partitions()
+    if endpoint == "/stats":
+        return service.stats()
+    if endpoint == "/summary":
+        return service.summary(name)
+    if endpoint == "/usage":
+        return service.usage(name, _float_params(query, ("partition",)))
+    if endpoint == "/lookup":
+        return service.lookup(name, _float_params(query, ("partition",)))
+    if endpoint == "/rebin":
+        merge_min_bins = _optional_float(query, "merge_min_bins")
+        return service.rebin(
+            name,
+            merge_min_fraction=_optional_float(query, "merge_min_fraction"),
+            merge_min_bins=1 if merge_min_bins is None else int(merge_min_bins),
+            merge_cell_min_fraction=_optional_float(query, "merge_cell_min_fraction"),
+        )
+    raise LookupError(f"Unknown endpoint {endpoint}.")
+
+
+def make_handler(service: PartitionService) -> Callable:
+    """Build a request handler class bound to ``service``.
+
+    Every endpoint is a GET with query parameters and returns JSON that
+    includes the query latency in ``latency_ms``.
+    """
+
+    class PartitionRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            start = time.perf_counter()
+            parsed = urlparse(self.path)
+            endpoint = parsed.path.rstrip("/") or "/partitions"
+            try:
+                body = _route(service, endpoint, parse_qs(parsed.query))
+                status = 200
+            except (KeyError, LookupError) as exc:
+                body, status = {"error": str(exc.args[0] if exc.args else exc)}, 404
+            except ValueError as exc:
+                body, status = {"error": str(exc)}, 400
+            except Exception as exc:
+                logging.exception(f"Error handling {self.path}")
+                body, status = {"error": f"Internal error: {exc}"}, 500
+            latency = time.perf_counter() - start
+            service.record(endpoint, latency)
+            body["latency_ms"] = latency * 1000.0
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def address_string(self):
+            # Unix-socket clients have no (host, port) address.
+            if isinstance(self.client_address, tuple) and self.client_address:
+                return str(self.client_address[0])
+            return "unix"
+
+        def log_message(self, format, *args):
+            logging.info("%s - %s", self.address_string(), format % args)
+
+    return PartitionRequestHandler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(
+    service: PartitionService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[str] = None,
+) -> socketserver.BaseServer:
+    """Create a threaded HTTP server on ``host:port`` or on a Unix socket."""
+    handler = make_handler(service)
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,392 @@
+"""Mergeable per-axis quantile sketches.
+
+Sketches summarize the distribution of an axis in bounded memory and can be
+merged, so they can be built file by file and combined across files, shards
+and datasets without holding (or re-reading) every value:
+
+- :class:`ValueCountSketch` keeps an exact ``value -> count`` map. Used for the
+  small-integer object-count axes, it reproduces the full-data boundaries.
+- :class:`KLLSketch` is a KLL sketch (Karnin, Lang, Liberty 2016) used for
+  continuous axes such as ``met``. Its rank error is roughly ``1.7 / k``.
+"""
+
+from typing import Dict, Iterable, List, Optional, Union
+
+import awkward as ak
+import numpy as np
+import yaml
+from pydantic import BaseModel, Field
+
+from atlas_object_partitioning.histograms import (
+    _boundaries_from_value_counts,
+    _check_axis_options,
+    _is_continuous,
+)
+
+DEFAULT_KLL_K = 200
+
+# Values are fed into a KLL sketch in chunks of this size to bound scratch memory.
+_KLL_CHUNK_SIZE = 1 << 16
+
+
+class ValueCountSketch:
+    """Exact ``value -> count`` map for small-integer axes."""
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = dict(counts) if counts else {}
+
+    @property
+    def n(self) -> int:
+        return int(sum(self.counts.values()))
+
+    def update(self, values: np.ndarray) -> "ValueCountSketch":
+        unique_vals, unique_counts = np.unique(
+            np.asarray(values, dtype=np.int64), return_counts=True
+        )
+        for value, count in zip(unique_vals.tolist(), unique_counts.tolist()):
+            self.counts[value] = self.counts.get(value, 0) + count
+        return self
+
+    def merge(self, other: "ValueCountSketch") -> "ValueCountSketch":
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        return self
+
+    def _arrays(self):
+        values = np.array(sorted(self.counts), dtype=np.int64)
+        counts = np.array([self.counts[v] for v in values.tolist()], dtype=np.int64)
+        return values, counts
+
+    def _value_at_rank(self, values: np.ndarray, cdf: np.ndarray, rank: int) -> int:
+        return int(values[int(np.searchsorted(cdf, rank, side="right"))])
+
+    def quantile(self, q: float) -> float:
+        """Quantile with the same (linear) interpolation as :func:`numpy.quantile`."""
+        values, counts = self._arrays()
+        cdf = np.cumsum(counts)
+        n = int(cdf[-1])
+        virtual_index = n * q + (1.0 - q) - 1.0
+        lower = int(np.floor(virtual_index))
+        lower = min(max(lower, 0), n - 1)
+        t = min(max(virtual_index - lower, 0.0), 1.0)
+        a = self._value_at_rank(values, cdf, lower)
+        b = self._value_at_rank(values, cdf, min(lower + 1, n - 1))
+        diff = b - a
+        return a + diff * t if t < 0.5 else b - diff * (1.0 - t)
+
+    def minimum(self) -> int:
+        return int(min(self.counts))
+
+    def maximum(self) -> int:
+        return int(max(self.counts))
+
+    def boundaries(self, n_bins: int) -> List[int]:
+        """Equal-population boundaries, identical to those computed from all values."""
+        if n_bins < 1:
+            raise ValueError("n_bins must be >= 1")
+        if not self.counts:
+            return []
+        values, counts = self._arrays()
+        return _boundaries_from_value_counts(values, counts, n_bins)
+
+    def capped(self, cap: float) -> "ValueCountSketch":
+        result = ValueCountSketch()
+        for value, count in self.counts.items():
+            key = int(cap) if value > cap else value
+            result.counts[key] = result.counts.get(key, 0) + count
+        return result
+
+
+class KLLSketch:
+    """KLL quantile sketch for continuous axes.
+
+    Level ``h`` holds items of weight ``2**h``. When a level overflows its
+    capacity it is sorted and every other item (random offset) is promoted to
+    the next level, so memory stays ``O(k)`` however many values are added.
+    """
+
+    def __init__(self, k: int = DEFAULT_KLL_K, seed: int = 0):
+        if k < 2:
+            raise ValueError("k must be >= 2")
+        self.k = k
+        self.n = 0
+        self.min_value: Optional[float] = None
+        self.max_value: Optional[float] = None
+        self.levels: List[np.ndarray] = [np.empty(0, dtype=float)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self) -> None:
+        while True:
+            over = [
+                level
+                for level in range(len(self.levels))
+                if len(self.levels[level]) > self._capacity(level)
+            ]
+            if not over:
+                return
+            level = over[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0, dtype=float))
+            items = np.sort(self.levels[level])
+            n_even = len(items) - len(items) % 2
+            offset = int(self._rng.integers(2))
+            promoted = items[offset:n_even:2]
+            self.levels[level] = items[n_even:]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values: np.ndarray) -> "KLLSketch":
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return self
+        lo = float(values.min())
+        hi = float(values.max())
+        self.min_value = lo if self.min_value is None else min(self.min_value, lo)
+        self.max_value = hi if self.max_value is None else max(self.max_value, hi)
+        self.n += len(values)
+        for start in range(0, len(values), _KLL_CHUNK_SIZE):
+            stop = start + _KLL_CHUNK_SIZE
+            self.levels[0] = np.concatenate([self.levels[0], values[start:stop]])
+            self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=float))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        assert other.min_value is not None and other.max_value is not None
+        self.min_value = (
+            other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+        )
+        self.max_value = (
+            other.max_value if self.max_value is None else max(self.max_value, other.max_value)
+        )
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(level), 2**h, dtype=np.int64) for h, level in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q: float) -> float:
+        """Approximate value at rank ``q * n`` (no interpolation)."""
+        if self.n == 0:
+            raise ValueError("Cannot take the quantile of an empty sketch.")
+        assert self.min_value is not None and self.max_value is not None
+        if q <= 0.0:
+            return self.min_value
+        if q >= 1.0:
+            return self.max_value
+        items, cum_weights = self._weighted_items()
+        idx = int(np.searchsorted(cum_weights, q * cum_weights[-1], side="right"))
+        return float(items[min(idx, len(items) - 1)])
+
+    def minimum(self) -> float:
+        assert self.min_value is not None
+        return self.min_value
+
+    def maximum(self) -> float:
+        assert self.max_value is not None
+        return self.max_value
+
+    def boundaries(self, n_bins: int) -> List[float]:
+        """Approximately equal-frequency float boundaries covering ``[min, max]``."""
+        if n_bins < 1:
+            raise ValueError("n_bins must be >= 1")
+        if self.n == 0:
+            return []
+        min_val = self.minimum()
+        max_val = self.maximum()
+        inner = [self.quantile(i / n_bins) for i in range(1, n_bins)]
+        upper = float(np.nextafter(max_val, np.inf))
+        boundaries = [min_val] + [b for b in inner if min_val < b <= max_val] + [upper]
+        return sorted(set(boundaries))
+
+    def capped(self, cap: float) -> "KLLSketch":
+        result = KLLSketch(self.k)
+        result.n = self.n
+        result.levels = [np.minimum(level, cap) for level in self.levels]
+        if self.n > 0:
+            assert self.min_value is not None and self.max_value is not None
+            result.min_value = min(self.min_value, cap)
+            result.max_value = min(self.max_value, cap)
+        return result
+
+
+Sketch = Union[ValueCountSketch, KLLSketch]
+
+
+def build_sketches(
+    data: ak.Array,
+    axes: Optional[List[str]] = None,
+    k: int = DEFAULT_KLL_K,
+) -> Dict[str, Sketch]:
+    """Build one sketch per axis: exact counts for integer axes, KLL for float axes."""
+    if axes is None:
+        axes = list(data.fields)
+    sketches: Dict[str, Sketch] = {}
+    for axis in axes:
+        values = ak.to_numpy(data[axis])
+        if _is_continuous(values):
+            sketches[axis] = KLLSketch(k).update(values)
+        else:
+            sketches[axis] = ValueCountSketch().update(values)
+    return sketches
+
+
+def merge_sketches(sketch_sets: Iterable[Dict[str, Sketch]]) -> Dict[str, Sketch]:
+    """Merge per-file (or per-shard, per-dataset) sketches axis by axis.
+
+    The inputs are left untouched. All inputs must have the same axes.
+    """
+    merged: Optional[Dict[str, Sketch]] = None
+    for sketches in sketch_sets:
+        if merged is None:
+            merged = {axis: _copy_sketch(sketch) for axis, sketch in sketches.items()}
+            continue
+        if set(sketches) != set(merged):
+            raise ValueError(
+                "Cannot merge sketches with different axes: "
+                f"{', '.join(sorted(merged))} vs {', '.join(sorted(sketches))}"
+            )
+        for axis, sketch in sketches.items():
+            target = merged[axis]
+            if type(target) is not type(sketch):
+                raise ValueError(f"Cannot merge sketches of different kinds for axis {axis}.")
+            target.merge(sketch)  # type: ignore
+    if merged is None:
+        return {}
+    return merged
+
+
+def _copy_sketch(sketch: Sketch) -> Sketch:
+    return sketch_from_model(sketch_to_model(sketch))
+
+
+def tail_caps_from_sketches(
+    sketches: Dict[str, Sketch],
+    ignore_axes: Optional[List[str]] = None,
+    tail_cap_quantile: Optional[float] = None,
+) -> Dict[str, float]:
+    """Sketch equivalent of the cap values found by :func:`apply_tail_caps`."""
+    if ignore_axes is None:
+        ignore_axes = []
+    if tail_cap_quantile is None or tail_cap_quantile >= 1.0:
+        return {}
+    if not 0.0 < tail_cap_quantile <= 1.0:
+        raise ValueError("tail_cap_quantile must be between 0 and 1.")
+    caps: Dict[str, float] = {}
+    for axis, sketch in sketches.items():
+        if axis in ignore_axes or sketch.n == 0:
+            continue
+        if isinstance(sketch, KLLSketch):
+            cap_value: float = float(sketch.quantile(tail_cap_quantile))
+        else:
+            cap_value = int(sketch.quantile(tail_cap_quantile))
+        if cap_value < sketch.maximum():
+            caps[axis] = cap_value
+    return caps
+
+
+def cap_sketches(sketches: Dict[str, Sketch], caps: Dict[str, float]) -> Dict[str, Sketch]:
+    """Return sketches with values above ``caps`` folded onto the cap value."""
+    return {
+        axis: sketch.capped(caps[axis]) if axis in caps else sketch
+        for axis, sketch in sketches.items()
+    }
+
+
+def compute_bin_boundaries_from_sketches(
+    sketches: Dict[str, Sketch],
+    ignore_axes: Optional[List[str]] = None,
+    bins_per_axis: int = 4,
+    bins_per_axis_overrides: Optional[Dict[str, int]] = None,
+) -> Dict[str, List[float]]:
+    """Sketch equivalent of :func:`compute_bin_boundaries`."""
+    if ignore_axes is None:
+        ignore_axes = []
+    if bins_per_axis_overrides is None:
+        bins_per_axis_overrides = {}
+    _check_axis_options(list(sketches), ignore_axes, bins_per_axis_overrides)
+    result: Dict[str, List[float]] = {}
+    for axis, sketch in sketches.items():
+        if axis in ignore_axes:
+            continue
+        axis_bins = bins_per_axis_overrides.get(axis, bins_per_axis)
+        result[axis] = list(sketch.boundaries(axis_bins))
+    return result
+
+
+class AxisSketch(BaseModel):
+    kind: str
+    n: int
+    counts: Optional[Dict[int, int]] = None
+    k: Optional[int] = None
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    levels: Optional[List[List[float]]] = None
+
+
+class SketchFile(BaseModel):
+    axes: Dict[str, AxisSketch]
+    commands: List[str] = Field(default_factory=list)
+
+
+def sketch_to_model(sketch: Sketch) -> AxisSketch:
+    if isinstance(sketch, ValueCountSketch):
+        return AxisSketch(kind="counts", n=sketch.n, counts=dict(sketch.counts))
+    return AxisSketch(
+        kind="kll",
+        n=sketch.n,
+        k=sketch.k,
+        min_value=sketch.min_value,
+        max_value=sketch.max_value,
+        levels=[level.tolist() for level in sketch.levels],
+    )
+
+
+def sketch_from_model(model: AxisSketch) -> Sketch:
+    if model.kind == "counts":
+        return ValueCountSketch(model.counts or {})
+    if model.kind == "kll":
+        sketch = KLLSketch(model.k if model.k is not None else DEFAULT_KLL_K)
+        sketch.n = model.n
+        sketch.min_value = model.min_value
+        sketch.max_value = model.max_value
+        sketch.levels = [np.asarray(level, dtype=float) for level in (model.levels or [[]])]
+        return sketch
+    raise ValueError(f"Unknown sketch kind: {model.kind}")
+
+
+def write_sketches_yaml(
+    sketches: Dict[str, Sketch],
+    file_path: str,
+    commands: Optional[List[str]] = None,
+) -> None:
+    """Write per-axis sketches to ``file_path`` in YAML format."""
+    if commands is None:
+        commands = []
+    data = SketchFile(
+        axes={axis: sketch_to_model(sketch) for axis, sketch in sketches.items()},
+        commands=commands,
+    )
+    with open(file_path, "w") as f:
+        yaml.safe_dump(data.model_dump(exclude_none=True), f)
+
+
+def load_sketches_yaml(file_path: str) -> Dict[str, Sketch]:
+    """Load sketches written with :func:`write_sketches_yaml`."""
+    with open(file_path) as f:
+        data = SketchFile.model_validate(yaml.safe_load(f))
+    return {axis: sketch_from_model(model) for axis, model in data.axes.items()}
@@ -0,0 +1,224 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from atlas_object_partitioning.assign import Columns, PartitionAssigner, _column
+from atlas_object_partitioning.histograms import _is_continuous
+
+DEFAULT_REPLICATES = 200
+DEFAULT_CONFIDENCE = 0.95
+# Continuous axes are resolved to this many quantile buckets before the
+# distinct rows are found; the partition's own edges are always bucket edges.
+DEFAULT_CONTINUOUS_BUCKETS = 256
+# Replicate weights held in memory at once (replicates x distinct rows).
+DEFAULT_STABILITY_BLOCK_SIZE = 1 << 24
+
+
+class BoundaryStability(BaseModel):
+    """Bootstrap behaviour of one inner equal-frequency edge of an axis."""
+
+    quantile: float
+    edge: float
+    flip_probability: float
+    low: float
+    high: float
+
+
+class FractionInterval(BaseModel):
+    """Bootstrap confidence interval of the fraction of events in a group or cell."""
+
+    index: int
+    fraction: float
+    low: float
+    high: float
+
+
+class StabilityReport(BaseModel):
+    n_events: int
+    n_distinct: int
+    n_replicates: int
+    confidence: float
+    boundaries: Dict[str, List[BoundaryStability]]
+    fractions: List[FractionInterval]
+    fractions_of: str
+
+
+def _quantize(values: np.ndarray, edges: List[float], buckets: int) -> np.ndarray:
+    """Continuous ``values`` replaced by the lower edge of their quantile bucket.
+
+    The partition's ``edges`` are bucket edges too, so no bucket straddles a bin
+    and the replaced values fall in the same cells as the originals.
+    """
+    grid = np.quantile(values, np.linspace(0.0, 1.0, buckets + 1))
+    grid = np.unique(np.concatenate([grid, np.asarray(edges, dtype=float)]))
+    idx = np.clip(np.searchsorted(grid, values, side="right") - 1, 0, len(grid) - 1)
+    return grid[idx]
+
+
+def deduplicate(
+    columns: Dict[str, np.ndarray],
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """The distinct rows of ``columns`` and how many events share each one.
+
+    Each row is encoded as one integer from the positions of its values among
+    the distinct values of every axis, so only integers are sorted.
+    """
+    keys: Optional[np.ndarray] = None
+    n_keys = 1
+    for values in columns.values():
+        distinct_values, inverse = np.unique(values, return_inverse=True)
+        n_keys *= len(distinct_values)
+        if n_keys >= 1 << 62:
+            raise ValueError("Too many distinct count combinations to bootstrap.")
+        keys = inverse.astype(np.int64) if keys is None else keys * len(distinct_values) + inverse
+    if keys is None:
+        raise ValueError("Cannot bootstrap a partition without axes.")
+    _, first, multiplicity = np.unique(keys, return_index=True, return_counts=True)
+    return {axis: values[first] for axis, values in columns.items()}, multiplicity
+
+
+def _grouped_sums(weights: np.ndarray, labels: np.ndarray, n_labels: int) -> np.ndarray:
+    """Per replicate (row of ``weights``), the summed weight of each label."""
+    n_replicates = weights.shape[0]
+    flat = (labels[None, :] + n_labels * np.arange(n_replicates)[:, None]).ravel()
+    sums = np.bincount(flat, weights=weights.ravel(), minlength=n_replicates * n_labels)
+    return sums.reshape(n_replicates, n_labels)
+
+
+def replicate_edges(
+    values: np.ndarray,
+    weights: np.ndarray,
+    n_bins: int,
+    continuous: bool,
+) -> np.ndarray:
+    """Inner equal-frequency edges of every replicate at once.
+
+    ``values`` are the distinct values of one axis and ``weights`` the number
+    of events at each value per replicate (replicates x values). Edge ``i`` of
+    a replicate follows :func:`compute_bin_boundaries`: ``value + 1`` of the
+    first value whose cumulative count reaches ``i / n_bins`` of the total for
+    integer axes, the value at that rank for continuous ones.
+    """
+    order = np.argsort(values, kind="stable")
+    values, weights = values[order], weights[:, order]
+    cdf = np.cumsum(weights, axis=1)
+    targets = cdf[:, -1:] * (np.arange(1, n_bins) / n_bins)[None, :]
+    if continuous:
+        idx = (cdf[:, None, :] <= targets[:, :, None]).sum(axis=2)
+    else:
+        idx = (cdf[:, None, :] < targets[:, :, None]).sum(axis=2)
+    edges = values[np.minimum(idx, len(values) - 1)].astype(np.float64)
+    return edges if continuous else edges + 1
+
+
+def bootstrap_stability(
+    data: Columns,
+    assigner: PartitionAssigner,
+    bins_per_axis: Dict[str, int],
+    n_replicates: int = DEFAULT_REPLICATES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: Optional[int] = 0,
+    continuous_buckets: int = DEFAULT_CONTINUOUS_BUCKETS,
+    block_size: int = DEFAULT_STABILITY_BLOCK_SIZE,
+) -> StabilityReport:
+    """Bootstrap the boundaries and group (or cell) fractions of a partition.
+
+    The events are reduced to their distinct rows over the partition axes, and
+    each replicate is a multinomial draw of event counts over those rows. The
+    replicates are evaluated together, a block at a time: per axis the
+    marginal of every replicate is one :func:`numpy.bincount`, its edges one
+    vectorized search, and the group fractions another bincount. Nothing is
+    refilled per replicate, so hundreds of replicates take seconds.
+
+    Edges are the equal-frequency edges at ``bins_per_axis`` (without tail caps
+    or bin merging); a flip is a replicate edge that differs from the edge of
+    the full sample. Fractions are those of the merged groups of ``assigner``,
+    or of its cells when it has none.
+    """
+    if n_replicates < 1:
+        raise ValueError("n_replicates must be >= 1.")
+    if not 0.0 < confidence < 1.0:
+        raise ValueError("confidence must be between 0 and 1.")
+    columns: Dict[str, np.ndarray] = {}
+    for axis in assigner.axes:
+        values = _column(data, axis)
+        if _is_continuous(values):
+            values = _quantize(values, assigner.boundaries[axis], continuous_buckets)
+        columns[axis] = values
+    rows, multiplicity = deduplicate(columns)
+    n_events = int(multiplicity.sum())
+    if n_events == 0:
+        raise ValueError("Cannot bootstrap an empty count table.")
+
+    if assigner.n_groups > 0:
+        labels = assigner.assign(rows).astype(np.int64)
+        n_labels = assigner.n_groups
+        fractions_of = "groups"
+    else:
+        labels = assigner.cells(rows)
+        n_labels = int(np.prod(assigner.shape))
+        fractions_of = "cells"
+    # Events outside the grid (or in no group) are counted in an extra label.
+    labels = np.where((labels >= 0) & (labels < n_labels), labels, n_labels)
+
+    axis_values: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+        axis: np.unique(values, return_inverse=True) for axis, values in rows.items()
+    }
+    baseline = multiplicity[None, :].astype(np.float64)
+    edges: Dict[str, List[np.ndarray]] = {axis: [] for axis in rows}
+    base_edges: Dict[str, np.ndarray] = {}
+    for axis, (values, inverse) in axis_values.items():
+        continuous = _is_continuous(values)
+        marginal = _grouped_sums(baseline, inverse, len(values))
+        base_edges[axis] = replicate_edges(values, marginal, bins_per_axis[axis], continuous)[0]
+    base_fractions = _grouped_sums(baseline, labels, n_labels + 1)[0, :n_labels] / n_events
+
+    rng = np.random.default_rng(seed)
+    probabilities = multiplicity / n_events
+    block = max(1, block_size // len(multiplicity))
+    fractions: List[np.ndarray] = []
+    for start in range(0, n_replicates, block):
+        size = min(block, n_replicates - start)
+        weights = rng.multinomial(n_events, probabilities, size=size).astype(np.float64)
+        for axis, (values, inverse) in axis_values.items():
+            marginal = _grouped_sums(weights, inverse, len(values))
+            edges[axis].append(
+                replicate_edges(values, marginal, bins_per_axis[axis], _is_continuous(values))
+            )
+        sums = _grouped_sums(weights, labels, n_labels + 1)
+        fractions.append(sums[:, :n_labels] / n_events)
+
+    tails = [(1.0 - confidence) / 2.0, (1.0 + confidence) / 2.0]
+    boundaries: Dict[str, List[BoundaryStability]] = {}
+    for axis, blocks in edges.items():
+        replicated = np.concatenate(blocks)
+        flips = (replicated != base_edges[axis][None, :]).mean(axis=0)
+        low, high = np.quantile(replicated, tails, axis=0)
+        n_bins = bins_per_axis[axis]
+        boundaries[axis] = [
+            BoundaryStability(
+                quantile=(i + 1) / n_bins,
+                edge=float(base_edges[axis][i]),
+                flip_probability=float(flips[i]),
+                low=float(low[i]),
+                high=float(high[i]),
+            )
+            for i in range(n_bins - 1)
+        ]
+    replicated = np.concatenate(fractions)
+    low, high = np.quantile(replicated, tails, axis=0)
+    return StabilityReport(
+        n_events=n_events,
+        n_distinct=len(multiplicity),
+        n_replicates=n_replicates,
+        confidence=confidence,
+        boundaries=boundaries,
+        fractions=[
+            FractionInterval(
+                index=i, fraction=float(base_fractions[i]), low=float(low[i]), high=float(high[i])
+            )
+            for i in range(n_labels)
+        ],
+        fractions_of=fractions_of,
+    )
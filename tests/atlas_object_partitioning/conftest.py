@@ -0,0 +1,49 @@
+import awkward as ak
+import numpy as np
+import pytest
+
+# Default distribution of each generated axis: a numpy Generator method and its
+# arguments. n_large_jets is drawn as a fraction of n_jets when both are generated.
+DISTRIBUTIONS = {
+    "n_jets": ("poisson", (4.0,)),
+    "n_large_jets": ("poisson", (1.0,)),
+    "n_electrons": ("poisson", (1.0,)),
+    "n_muons": ("poisson", (0.5,)),
+    "n_taus": ("binomial", (1, 0.03)),
+    "n_photons": ("binomial", (2, 0.1)),
+    "met": ("exponential", (40.0,)),
+}
+
+
+def generate_counts(axes=("n_jets", "n_muons", "met"), n_events=5000, seed=0, **distributions):
+    """Fixed-seed per-event counts of ``axes`` as numpy columns.
+
+    Axes are drawn in the order given, so the same arguments always give the
+    same columns. ``distributions`` replace the default of an axis, e.g.
+    ``n_muons=("poisson", (0.7,))``.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for axis in axes:
+        if axis == "n_large_jets" and "n_jets" in columns and axis not in distributions:
+            columns[axis] = rng.binomial(columns["n_jets"], 0.3)
+            continue
+        method, args = distributions.get(axis, DISTRIBUTIONS[axis])
+        columns[axis] = getattr(rng, method)(*args, size=n_events)
+    return columns
+
+
+@pytest.fixture
+def make_counts():
+    """:func:`generate_counts` wrapped in an awkward array."""
+
+    def make(*args, **kwargs) -> ak.Array:
+        return ak.Array(generate_counts(*args, **kwargs))
+
+    return make
+
+
+@pytest.fixture
+def make_columns():
+    """:func:`generate_counts` as a dict of numpy columns."""
+    return generate_counts
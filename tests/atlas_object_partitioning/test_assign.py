@@ -0,0 +1,145 @@
+import awkward as ak
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+from typer.testing import CliRunner
+
+from atlas_object_partitioning.assign import (
+    PartitionAssigner,
+    assign_parquet,
+    write_group_dataset,
+)
+from atlas_object_partitioning.histograms import (
+    MergedCellGroup,
+    MergedCells,
+    build_nd_histogram,
+    cell_group_labels,
+    compute_bin_boundaries,
+    compute_cell_indices,
+    merge_sparse_cells,
+    write_bin_boundaries_yaml,
+)
+from atlas_object_partitioning.partition import app
+
+AXES = ["n_jets", "n_muons", "met"]
+MET = ("exponential", (30.0,))
+
+
+def _partition(data):
+    boundaries = compute_bin_boundaries(data, bins_per_axis=3)
+    groups, _ = merge_sparse_cells(build_nd_histogram(data, boundaries), min_fraction=0.02)
+    return data, boundaries, groups
+
+
+def _expected(data, boundaries, groups):
+    shape = tuple(len(edges) - 1 for edges in boundaries.values())
+    cells = compute_cell_indices(data, boundaries)
+    labels = cell_group_labels(groups, list(boundaries), shape)
+    return np.where(cells >= 0, labels[cells], -1)
+
+
+def test_assign_small_grid():
+    boundaries = {"n_jets": [0, 2, 4], "met": [0.0, 10.0, 20.0]}
+    groups = [
+        MergedCellGroup(
+            cells=[{"n_jets": 0, "met": 0}, {"n_jets": 0, "met": 1}], count=3, fraction=0.5
+        ),
+        MergedCellGroup(cells=[{"n_jets": 1, "met": 0}], count=2, fraction=0.25),
+    ]
+    events = ak.Array(
+        {
+            "n_jets": [0, 1, 3, 2, 3, 4, 1, -1],
+            "met": [5.0, 15.0, 9.9, 0.0, 10.0, 5.0, 20.0, 5.0],
+        }
+    )
+    assigner = PartitionAssigner(boundaries, groups)
+    # Cell (1, 1) is in no group; n_jets 4, met 20 and n_jets -1 are outside the grid.
+    assert assigner.cells(events).tolist() == [0, 1, 2, 2, 3, 4, 4, 4]
+    assert assigner.assign(events).tolist() == [0, 0, 1, 1, -1, -1, -1, -1]
+
+
+def test_assign_matches_cell_labels(make_counts):
+    data, boundaries, groups = _partition(make_counts(AXES, seed=5, met=MET))
+    # Values outside the grid on an integer and a float axis.
+    data = ak.concatenate(
+        [data, ak.Array({"n_jets": [-1, 100, 2], "n_muons": [0, 0, 0], "met": [1.0, 1.0, 1e9]})]
+    )
+    assigner = PartitionAssigner(boundaries, groups)
+    groups_ids = assigner.assign(data)
+    assert np.array_equal(groups_ids, _expected(data, boundaries, groups))
+    assert groups_ids.dtype == np.int8
+    assert list(groups_ids[-3:]) == [-1, -1, -1]
+
+    batch = pa.RecordBatch.from_pydict({ax: ak.to_numpy(data[ax]) for ax in data.fields})
+    assert np.array_equal(assigner.assign(batch), groups_ids)
+
+
+def test_assign_parquet_streams_chunks(tmp_path, make_counts):
+    data, boundaries, groups = _partition(make_counts(AXES, seed=5, met=MET))
+    counts_file = tmp_path / "counts.parquet"
+    ak.to_parquet(data, counts_file)
+    assigner = PartitionAssigner(boundaries, groups)
+    totals = assign_parquet(
+        assigner, str(counts_file), str(tmp_path / "groups.parquet"), chunk_size=700
+    )
+    written = pq.read_table(tmp_path / "groups.parquet").column("group").to_numpy()
+    expected = _expected(data, boundaries, groups)
+    assert np.array_equal(written, expected)
+    assert list(totals[:-1]) == [group.count for group in groups]
+    assert totals[-1] == 0
+
+
+def test_assign_command(tmp_path, make_counts):
+    data, boundaries, groups = _partition(make_counts(AXES, seed=5, met=MET))
+    ak.to_parquet(data, tmp_path / "counts.parquet")
+    write_bin_boundaries_yaml(
+        boundaries,
+        str(tmp_path / "bin_boundaries.yaml"),
+        merged_cells=MergedCells(min_fraction=0.02, groups=groups),
+    )
+    result = CliRunner().invoke(
+        app,
+        [
+            "assign",
+            str(tmp_path / "bin_boundaries.yaml"),
+            str(tmp_path / "counts.parquet"),
+            "-o",
+            str(tmp_path / "groups.parquet"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "Assigned 5,000 events" in result.output
+    assert pq.read_table(tmp_path / "groups.parquet").num_rows == len(data)
+
+
+def test_clip_overflow_uses_outer_bins(make_counts):
+    data, boundaries, groups = _partition(make_counts(AXES, seed=5, met=MET))
+    assigner = PartitionAssigner(boundaries, groups, clip_overflow=True)
+    edges = boundaries["n_jets"]
+    events = ak.Array({"n_jets": [edges[-1] + 5, edges[-2]], "n_muons": [0, 0], "met": [1.0, 1.0]})
+    ids = assigner.assign(events)
+    assert ids[0] == ids[1] >= 0
+
+
+def test_write_group_dataset(tmp_path, make_counts):
+    data, boundaries, groups = _partition(make_counts(AXES, seed=5, met=MET))
+    assigner = PartitionAssigner(boundaries, groups)
+    base_dir = str(tmp_path / "by_group")
+    totals = write_group_dataset(assigner, [data[:3000], data[3000:]], base_dir)
+    assert list(totals[:-1]) == [group.count for group in groups]
+
+    dataset = ds.dataset(base_dir, format="parquet", partitioning="hive")
+    table = dataset.to_table(filter=ds.field("group") == 2)
+    assert table.num_rows == groups[2].count
+    assert set(table.column_names) == {"n_jets", "n_muons", "met", "group"}
+
+    part = pq.ParquetFile(tmp_path / "by_group" / "group=2" / "part-0.parquet")
+    stats = part.metadata.row_group(0).column(0).statistics
+    assert stats is not None and stats.has_min_max
+    cells = assigner.cells(part.read())
+    assert np.all(np.diff(cells) >= 0)
+
+    with pytest.raises(ValueError):
+        write_group_dataset(assigner, [data], base_dir)
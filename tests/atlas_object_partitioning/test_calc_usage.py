@@ -1,3 +1,4 @@
+import pytest
 import yaml
 
 from atlas_object_partitioning.partition import _calc_usage_fraction
@@ -32,6 +33,19 @@ def test_calc_usage_fraction_out_of_range_cut():
     assert usage == 0.0
 
 
+def test_calc_usage_fraction_float_edges():
+    boundaries = {"met": [0.0, 12.5, 40.75, 900.0]}
+    merged_groups = [
+        {"cells": [{"met": 0}], "fraction": 0.5},
+        {"cells": [{"met": 1}], "fraction": 0.3},
+        {"cells": [{"met": 2}], "fraction": 0.2},
+    ]
+    usage = _calc_usage_fraction(boundaries, merged_groups, {"met": 12.5})
+    assert usage == pytest.approx(0.5)
+    usage = _calc_usage_fraction(boundaries, merged_groups, {"met": 40.8})
+    assert usage == pytest.approx(0.2)
+
+
 def test_calc_usage_yaml_roundtrip(tmp_path):
     data = {
         "axes": {"n_electrons": [0, 1, 3], "n_muons": [0, 2, 4]},
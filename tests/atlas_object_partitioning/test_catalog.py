@@ -0,0 +1,112 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import yaml
+from typer.testing import CliRunner
+
+import atlas_object_partitioning.partition as partition_module
+import atlas_object_partitioning.scan_ds as scan_ds
+from atlas_object_partitioning.catalog import load_axis_catalog
+from atlas_object_partitioning.columns import CountTable
+from atlas_object_partitioning.scan_ds import build_count_query_lambda, select_axes
+
+CATALOG = {
+    "axes": {
+        "n_jets_pt30": {"collection": "Jets()", "where": "o.pt() / 1000.0 > 30.0"},
+        "n_jets": {"collection": "Jets()"},
+        "n_large_jets_mass": {
+            "collection": "Jets('AnalysisLargeRJets')",
+            "where": "o.m() / 1000.0 > 50.0 and o.m() / 1000.0 < 150.0",
+        },
+        "met": "e.MissingET().First().met() / 1000.0",
+    }
+}
+
+
+def _write_catalog(tmp_path, catalog=CATALOG):
+    path = tmp_path / "axes.yaml"
+    path.write_text(yaml.safe_dump(catalog, sort_keys=False))
+    return str(path)
+
+
+def test_catalog_compiles_into_one_query(tmp_path):
+    catalog = load_axis_catalog(_write_catalog(tmp_path))
+    assert list(catalog) == ["n_jets_pt30", "n_jets", "n_large_jets_mass", "met"]
+    assert catalog["n_jets_pt30"] == "e.Jets().Where(lambda o: o.pt() / 1000.0 > 30.0).Count()"
+    assert catalog["n_jets"] == "e.Jets().Count()"
+
+    assert select_axes(["met"], catalog) == ["n_jets_pt30", "n_jets", "n_large_jets_mass"]
+    query = build_count_query_lambda(["met", "n_jets_pt30"], catalog=catalog)
+    assert query.index("'n_jets_pt30'") < query.index("'met'")
+    assert "AnalysisLargeRJets" not in query
+    with pytest.raises(ValueError):
+        build_count_query_lambda(["n_muons"], catalog=catalog)
+
+    for bad in (
+        {"axes": {}},
+        {"axes": {"n jets": "e.Jets().Count()"}},
+        {"axes": {"n__jets": "e.Jets().Count()"}},
+        {"axes": {"n_jets": {"where": "o.pt() > 0"}}},
+        {"axes": {"n_jets": {"collection": "Jets()", "expression": "e.Jets().Count()"}}},
+    ):
+        with pytest.raises(ValueError):
+            load_axis_catalog(_write_catalog(tmp_path, bad))
+
+
+def test_catalog_subsets_share_one_transform(tmp_path, monkeypatch):
+    catalog = load_axis_catalog(_write_catalog(tmp_path))
+    path = str(tmp_path / "counts.parquet")
+    pq.write_table(pa.table({axis: np.arange(5) for axis in catalog}), path)
+    requested = []
+
+    def fake_deliver(ds_name, axes=None, catalog=None, **kwargs):
+        requested.append(build_count_query_lambda(list(catalog), catalog=catalog))
+        return [path]
+
+    monkeypatch.setattr(scan_ds, "deliver_object_counts", fake_deliver)
+    counts = scan_ds.collect_object_counts("ds", axes=["met", "n_jets"], catalog=catalog)
+    assert counts.fields == ["n_jets", "met"]
+    counts = scan_ds.collect_object_counts("ds", axes=["n_jets_pt30"], catalog=catalog)
+    assert counts.fields == ["n_jets_pt30"]
+    assert len(set(requested)) == 1
+    with pytest.raises(ValueError):
+        scan_ds.collect_object_counts("ds", catalog=catalog, native=True)
+
+
+def test_partition_with_axis_catalog(tmp_path, monkeypatch):
+    catalog_file = _write_catalog(tmp_path)
+    rng = np.random.default_rng(3)
+    columns = {
+        "n_jets_pt30": rng.poisson(2.0, 5000),
+        "n_jets": rng.poisson(5.0, 5000),
+        "n_large_jets_mass": rng.poisson(0.5, 5000),
+        "met": rng.exponential(40.0, 5000),
+    }
+    seen = {}
+
+    def fake_collect(ds_name, axes, catalog=None, **kwargs):
+        seen["catalog"] = catalog
+        return CountTable.from_columns({axis: columns[axis] for axis in axes})
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(partition_module, "collect_object_counts", fake_collect)
+    runner = CliRunner()
+    result = runner.invoke(
+        partition_module.app,
+        ["partition", "ds", "--axis-catalog", catalog_file, "--bins-per-axis", "2"]
+        + ["--ignore-axes", "n_jets", "--ignore-axes", "met"],
+    )
+    assert result.exit_code == 0, result.output
+    assert list(seen["catalog"]) == list(columns)
+    with open("bin_boundaries.yaml") as f:
+        assert list(yaml.safe_load(f)["axes"]) == ["n_jets_pt30", "n_large_jets_mass"]
+
+    result = runner.invoke(
+        partition_module.app, ["partition", "ds", "--ignore-axes", "n_jets_pt30"]
+    )
+    assert result.exit_code != 0
+    result = runner.invoke(
+        partition_module.app, ["partition", "ds", "--axis-catalog", catalog_file, "--native"]
+    )
+    assert result.exit_code != 0
@@ -0,0 +1,83 @@
+import awkward as ak
+import numpy as np
+import pytest
+import uproot
+
+from atlas_object_partitioning.columns import (
+    CountTable,
+    as_count_table,
+    read_count_file,
+    read_count_files,
+)
+from atlas_object_partitioning.histograms import build_nd_histogram, compute_bin_boundaries
+
+AXES = ["n_jets", "n_muons", "met"]
+MET = ("exponential", (30.0,))
+
+
+def test_count_table_small_sample():
+    table = CountTable.from_columns(
+        {"n_jets": np.array([3, 0, 2, 5], dtype=np.int32), "met": np.array([1.5, 0.0, 7.0, 2.0])}
+    )
+    assert table["n_jets"].dtype == np.int32 and table[1:3]["met"].tolist() == [0.0, 7.0]
+    assert compute_bin_boundaries(table, bins_per_axis=2) == {
+        "n_jets": [0, 3, 6],
+        "met": [0.0, 2.0, float(np.nextafter(7.0, np.inf))],
+    }
+    both = CountTable.concatenate([table, table[2:]])
+    assert both["n_jets"].tolist() == [3, 0, 2, 5, 2, 5]
+
+
+def test_count_table_views_share_memory(make_columns):
+    columns = make_columns(AXES, 1000, seed=4, met=MET)
+    columns["n_jets"] = columns["n_jets"].astype(np.int32)
+    table = CountTable.from_columns(columns)
+    assert table.fields == ["n_jets", "n_muons", "met"]
+    assert len(table) == 1000
+    for name, values in columns.items():
+        assert np.shares_memory(table[name], values)
+        assert not table[name].flags.writeable
+
+    sliced = table[100:250]
+    assert len(sliced) == 150
+    assert np.shares_memory(sliced["n_jets"], columns["n_jets"])
+    assert np.array_equal(sliced["met"], columns["met"][100:250])
+    assert table[["met", "n_jets"]].fields == ["met", "n_jets"]
+    with pytest.raises(ValueError):
+        table[::2]
+
+    awkward = ak.Array(columns)
+    wrapped = as_count_table(awkward)
+    assert np.shares_memory(wrapped["n_muons"], ak.to_numpy(awkward["n_muons"]))
+    with_entry = wrapped.with_columns({"entry": np.arange(len(wrapped))})
+    assert with_entry.fields == ["n_jets", "n_muons", "met", "entry"]
+
+
+def test_count_table_matches_awkward_in_histograms(make_columns):
+    columns = make_columns(AXES, 1000, seed=4, met=MET)
+    table = CountTable.from_columns(columns)
+    data = ak.Array(columns)
+    bounds = compute_bin_boundaries(table, ignore_axes=["met"], bins_per_axis=3)
+    assert bounds == compute_bin_boundaries(data, ignore_axes=["met"], bins_per_axis=3)
+    assert np.array_equal(
+        np.asarray(build_nd_histogram(table, bounds, threads=2, chunk_size=300).view()),
+        np.asarray(build_nd_histogram(data, bounds).view()),
+    )
+
+
+def test_read_count_files(tmp_path, make_columns):
+    columns = make_columns(AXES, 1000, seed=4, met=MET)
+    parquet_path = str(tmp_path / "counts.parquet")
+    CountTable.from_columns(columns).to_parquet(parquet_path)
+    root_path = str(tmp_path / "counts.root")
+    with uproot.recreate(root_path) as f:
+        f["atlas_xaod_tree"] = columns
+
+    for path in (parquet_path, root_path):
+        table = read_count_file(path, ["met", "n_jets"])
+        assert table.fields == ["met", "n_jets"]
+        assert np.array_equal(table["n_jets"], columns["n_jets"])
+
+    both = read_count_files([parquet_path, root_path])
+    assert len(both) == 2000
+    assert np.array_equal(both["n_muons"][1000:], columns["n_muons"])
@@ -0,0 +1,190 @@
+import json
+import threading
+import urllib.request
+from urllib.parse import urlencode
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+import yaml
+from typer.testing import CliRunner
+
+import atlas_object_partitioning.partition as partition_module
+from atlas_object_partitioning.columns import CountTable
+from atlas_object_partitioning.composite import add_composite_axes, can_pass, input_axes
+from atlas_object_partitioning.histograms import compute_bin_boundaries
+from atlas_object_partitioning.scan_ds import ALL_AXES
+from atlas_object_partitioning.service import LoadedPartition, PartitionService, create_server
+
+# n_large_jets is drawn as a fraction of n_jets, so the two are correlated.
+AXES = ["n_jets", "n_large_jets", "n_muons", "met"]
+
+
+def test_add_composite_axes_literal():
+    columns = {"n_jets": np.array([0, 3, 5]), "n_large_jets": np.array([0, 1, 2])}
+    table = add_composite_axes(CountTable.from_columns(columns), [["n_jets", "n_large_jets"]])
+    # Large-R jets, then the total.
+    assert table["n_jets__n_large_jets"].tolist() == [0, 1004, 2007]
+
+
+def test_add_composite_axes(make_columns):
+    columns = make_columns(AXES, seed=11)
+    table = add_composite_axes(CountTable.from_columns(columns), [["n_jets", "n_large_jets"]])
+    assert table.fields == ["n_jets", "n_large_jets", "n_muons", "met", "n_jets__n_large_jets"]
+    np.testing.assert_array_equal(
+        table["n_jets__n_large_jets"],
+        columns["n_large_jets"] * 1000 + columns["n_jets"] + columns["n_large_jets"],
+    )
+    assert input_axes(["n_jets__n_large_jets", "n_muons", "n_jets"]) == [
+        "n_jets",
+        "n_large_jets",
+        "n_muons",
+    ]
+    for composites in ([["n_jets"]], [["n_jets", "n_taus"]], [["n_jets", "met"]]):
+        with pytest.raises(ValueError):
+            add_composite_axes(CountTable.from_columns(columns), composites)
+    too_many = dict(columns, n_jets=columns["n_jets"] + 1000)
+    with pytest.raises(ValueError):
+        add_composite_axes(CountTable.from_columns(too_many), [["n_jets", "n_large_jets"]])
+
+
+def test_can_pass():
+    axis = "n_jets__n_large_jets"
+    # Codes 0-999 have no large-R jets, and 1000 (one large-R jet, no objects)
+    # stands for no event.
+    assert not can_pass(axis, 0, 1001, {"n_large_jets": 1})
+    assert can_pass(axis, 0, 1002, {"n_large_jets": 1})
+    # Up to two jets and no large-R jets.
+    assert can_pass(axis, 0, 3, {"n_jets": 2})
+    assert not can_pass(axis, 0, 3, {"n_jets": 3})
+    # One large-R jet and two objects: one jet.
+    assert can_pass(axis, 1002, 1003, {"n_jets": 1, "n_large_jets": 1})
+    assert not can_pass(axis, 1002, 1003, {"n_jets": 2})
+    assert not can_pass(axis, 1002, 1003, {axis: 3})
+    # Spanning from one large-R jet to two large-R jets with no other jets.
+    assert can_pass(axis, 1005, 2003, {"n_jets": 4, "n_large_jets": 1})
+    assert not can_pass(axis, 1005, 2003, {"n_jets": 4, "n_large_jets": 2})
+    assert can_pass(axis, 2002, 2003, {"n_large_jets": 2, "n_jets__n_large_jets": 2})
+    assert not can_pass("n_muons", 0, 2, {"n_muons": 2})
+    assert can_pass("n_muons", 0, 3, {"n_muons": 2})
+
+
+def test_component_cuts_on_composite_bins(make_columns):
+    columns = make_columns(AXES, seed=11)
+    table = add_composite_axes(CountTable.from_columns(columns), [["n_jets", "n_large_jets"]])
+    edges = compute_bin_boundaries(table, ignore_axes=AXES, bins_per_axis=9)[
+        "n_jets__n_large_jets"
+    ]
+    bins = np.searchsorted(edges, table["n_jets__n_large_jets"], side="right") - 1
+    for cuts in ({"n_large_jets": 1}, {"n_jets": 4}, {"n_jets": 2, "n_large_jets": 1}):
+        passing = np.all([columns[axis] >= value for axis, value in cuts.items()], axis=0)
+        read = np.array(
+            [can_pass("n_jets__n_large_jets", lo, hi, cuts) for lo, hi in zip(edges, edges[1:])]
+        )
+        # Every passing event is read, but not the whole partition.
+        assert read[bins[passing]].all()
+        assert read[bins].mean() < 0.8
+
+
+def test_partition_with_composite_axis(tmp_path, monkeypatch, make_columns):
+    columns = make_columns(AXES + [axis for axis in ALL_AXES if axis not in AXES], seed=11)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        partition_module,
+        "collect_object_counts",
+        lambda ds_name, axes, **kwargs: CountTable.from_columns(
+            {axis: columns[axis] for axis in axes}
+        ),
+    )
+    runner = CliRunner()
+    result = runner.invoke(
+        partition_module.app,
+        ["partition", "ds", "--composite-axis", "n_jets,n_large_jets", "--bins-per-axis", "3"]
+        + ["--bins-per-axis-override", "n_jets__n_large_jets=9"]
+        + ["--ignore-axes", "met", "--output", "counts.parquet"],
+    )
+    assert result.exit_code == 0, result.output
+    with open("bin_boundaries.yaml") as f:
+        axes = list(yaml.safe_load(f)["axes"])
+    assert "n_jets__n_large_jets" in axes
+    assert "n_jets" not in axes and "n_large_jets" not in axes
+    assert "n_jets__n_large_jets" not in pq.read_schema("counts.parquet").names
+
+    result = runner.invoke(
+        partition_module.app, ["assign", "bin_boundaries.yaml", "counts.parquet"]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Assigned 5,000 events" in result.output
+
+    result = runner.invoke(
+        partition_module.app, ["calc_usage", "bin_boundaries.yaml", "--n-jets", "2"]
+    )
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(partition_module.app, ["repartition", "ds", "bin_boundaries.yaml"])
+    assert result.exit_code == 0, result.output
+
+    service = PartitionService(
+        [LoadedPartition("p", "bin_boundaries.yaml", counts_file="counts.parquet")]
+    )
+    usage = service.usage("p", {"n_jets": 2, "n_large_jets": 1})
+    expected = np.mean((columns["n_jets"] >= 2) & (columns["n_large_jets"] >= 1))
+    assert usage["selected_fraction"] == pytest.approx(expected)
+    assert usage["selected_fraction"] <= usage["usage_fraction"] < 0.8
+    usage = service.usage("p", {"n_large_jets": 1})
+    assert usage["selected_fraction"] <= usage["usage_fraction"] < 0.8
+    values = {axis: 0 for axis in ALL_AXES if axis != "met"}
+    lookup = service.lookup("p", dict(values, n_jets=3, n_large_jets=1))
+    assert lookup["cell"] is not None
+
+    # The composite name goes through query strings as is.
+    server = create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/usage?partition=p&n_jets__n_large_jets=3") as r:
+            usage = json.loads(r.read())
+        # A cut on the composite axis is a cut on the total.
+        total = columns["n_jets"] + columns["n_large_jets"]
+        assert usage["selected_fraction"] == pytest.approx(np.mean(total >= 3))
+        direct = service.usage("p", {"n_jets__n_large_jets": 3})
+        assert usage["usage_fraction"] == pytest.approx(direct["usage_fraction"])
+        # The value of a composite axis is its code: one large-R jet, four objects.
+        query = urlencode(dict(values, n_jets__n_large_jets=1004, partition="p"))
+        with urllib.request.urlopen(f"{url}/lookup?{query}") as r:
+            assert json.loads(r.read())["cell"] == lookup["cell"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for composite in ("n_jets", "n_jets,n_jets", "n_jets,n_bosons", "n_jets,met"):
+        result = runner.invoke(
+            partition_module.app,
+            ["partition", "ds", "--composite-axis", composite, "--ignore-axes", "met"],
+        )
+        assert result.exit_code != 0
+
+
+def test_kdtree_with_composite_axis(tmp_path, monkeypatch, make_columns):
+    columns = make_columns(AXES + [axis for axis in ALL_AXES if axis not in AXES], seed=11)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        partition_module,
+        "collect_object_counts",
+        lambda ds_name, axes, **kwargs: CountTable.from_columns(
+            {axis: columns[axis] for axis in axes}
+        ),
+    )
+    runner = CliRunner()
+    result = runner.invoke(
+        partition_module.app,
+        ["partition", "ds", "--composite-axis", "n_jets,n_large_jets", "--mode", "kdtree"]
+        + ["--ignore-axes", "met"],
+    )
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(
+        partition_module.app, ["calc_usage", "bin_boundaries.yaml", "--n-large-jets", "1"]
+    )
+    assert result.exit_code == 0, result.output
+    usage = float(result.output.split("Usage fraction:")[1].split()[0])
+    assert np.mean(columns["n_large_jets"] >= 1) <= usage < 0.8
@@ -0,0 +1,143 @@
+import awkward as ak
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import uproot
+import yaml
+from typer.testing import CliRunner
+
+import atlas_object_partitioning.partition as partition_module
+import atlas_object_partitioning.scan_ds as scan_ds
+from atlas_object_partitioning.assign import PartitionAssigner
+from atlas_object_partitioning.event_index import EventIndex, FileComposition
+from atlas_object_partitioning.histograms import (
+    build_nd_histogram,
+    compute_bin_boundaries,
+    merge_sparse_cells,
+)
+from atlas_object_partitioning.local_mode import output_file_name
+from atlas_object_partitioning.scan_ds import ALL_AXES, add_provenance
+
+
+def test_build_collapses_runs():
+    files = ["a.root", "b.root"]
+    group = [0, 0, 1, 0, 0, 1, 1]
+    file_index = [0, 0, 0, 0, 1, 1, 1]
+    entry = [0, 1, 2, 3, 0, 1, 2]
+    index = EventIndex.build(files, group, file_index, entry)
+    assert len(index) == 5
+    assert index.ranges([0]) == {"a.root": [(0, 2), (3, 4)], "b.root": [(0, 1)]}
+    assert index.ranges([0, 1]) == {"a.root": [(0, 4)], "b.root": [(0, 3)]}
+    assert index.n_entries([1]) == 3
+    assert index.ranges([5]) == {}
+
+
+def test_from_counts_matches_assignment(tmp_path):
+    rng = np.random.default_rng(2)
+    per_file = [
+        ak.Array({"n_jets": rng.poisson(4.0, size=n), "n_muons": rng.poisson(0.5, size=n)})
+        for n in (700, 300, 1000)
+    ]
+    counts = add_provenance(per_file)
+    axes = ["n_jets", "n_muons"]
+    boundaries = compute_bin_boundaries(counts[axes], bins_per_axis=3)
+    groups, _ = merge_sparse_cells(build_nd_histogram(counts[axes], boundaries), 0.05)
+    assigner = PartitionAssigner(boundaries, groups)
+    files = ["f0.root", "f1.root", "f2.root"]
+    index = EventIndex.from_counts(assigner, counts, files)
+
+    index.write(str(tmp_path / "event_index.parquet"))
+    loaded = EventIndex.load(str(tmp_path / "event_index.parquet"))
+    assert loaded.files == files and loaded.exact
+    approximate = EventIndex.from_counts(assigner, counts, files, exact=False)
+    approximate.write(str(tmp_path / "approximate.parquet"))
+    assert not EventIndex.load(str(tmp_path / "approximate.parquet")).exact
+
+    ids = assigner.assign(counts)
+    file_index = ak.to_numpy(counts["file_index"])
+    entry = ak.to_numpy(counts["entry"])
+    for gid in (0, len(groups) - 1):
+        ranges = loaded.ranges([gid])
+        selected = set()
+        for path, file_ranges in ranges.items():
+            for lo, hi in file_ranges:
+                selected.update((files.index(path), e) for e in range(lo, hi))
+        expected = set(zip(file_index[ids == gid].tolist(), entry[ids == gid].tolist()))
+        assert selected == expected
+        assert loaded.n_entries([gid]) == groups[gid].count
+
+
+def test_from_counts_needs_provenance():
+    counts = ak.Array({"n_jets": [1, 2], "n_muons": [0, 1]})
+    boundaries = {"n_jets": [0, 5], "n_muons": [0, 2]}
+    groups, _ = merge_sparse_cells(build_nd_histogram(counts, boundaries), 0.0)
+    with pytest.raises(ValueError):
+        EventIndex.from_counts(PartitionAssigner(boundaries, groups), counts, ["a.root"])
+
+
+def test_file_composition_read_cost(tmp_path):
+    files = ["a.root", "b.root", "c.root"]
+    # Group 0 is spread over every file, group 1 sits in file c only.
+    group = [0, 0, 0, 0, 1, 1, -1]
+    file_index = [0, 0, 1, 2, 2, 2, 1]
+    composition = FileComposition.build(files, 2, group, file_index)
+    assert composition.counts.tolist() == [[2, 0, 0], [1, 0, 1], [1, 2, 0]]
+
+    composition.write(str(tmp_path / "file_composition.parquet"))
+    loaded = FileComposition.load(str(tmp_path / "file_composition.parquet"))
+    assert loaded.counts.tolist() == composition.counts.tolist()
+
+    cost = loaded.read_cost([1])
+    assert cost["files"] == 1 and cost["events"] == 3
+    assert cost["grouped_files"] == 1 and cost["grouped_events"] == 2
+    cost = loaded.read_cost([0])
+    assert cost["files"] == 3 and cost["events"] == 7
+    assert cost["grouped_files"] == 2 and cost["grouped_events"] == 4
+
+    index = EventIndex.build(files, group, file_index, [0, 1, 0, 0, 1, 2, 1])
+    derived = FileComposition.from_event_index(index, 2)
+    assert derived.counts.tolist() == composition.counts.tolist()
+
+
+def test_partition_indexes_input_files(tmp_path, monkeypatch):
+    # The delivered files are ServiceX outputs; the index and composition must
+    # name the PHYSLITE files they were made from.
+    inputs = [tmp_path / "physlite" / f"DAOD_PHYSLITE._00000{i}.pool.root.1" for i in (1, 2)]
+    inputs[0].parent.mkdir()
+    rng = np.random.default_rng(5)
+    delivered = []
+    for path in inputs:
+        with uproot.recreate(path) as f:
+            f["CollectionTree"] = {"EventInfoAuxDyn.eventNumber": np.arange(500)}
+        columns = {axis: rng.poisson(2.0, 500) for axis in ALL_AXES}
+        columns.update(run_number=np.full(500, 410000), event_number=np.arange(500))
+        output = tmp_path / "cache" / f"{output_file_name(str(path))}.parquet"
+        output.parent.mkdir(exist_ok=True)
+        pq.write_table(pa.table(columns), output)
+        delivered.append(str(output))
+    monkeypatch.setattr(scan_ds, "deliver_object_counts", lambda *args, **kwargs: delivered)
+    monkeypatch.chdir(tmp_path)
+    runner = CliRunner()
+    result = runner.invoke(
+        partition_module.app,
+        ["partition", str(inputs[0].parent), "--bins-per-axis", "2", "--event-index"]
+        + ["--merge-cell-min-fraction", "0.05"],
+    )
+    assert result.exit_code == 0, result.output
+    expected = [str(path) for path in inputs]
+    composition = FileComposition.load("file_composition.parquet")
+    assert composition.files == expected
+    assert composition.counts.sum(axis=1).tolist() == [500, 500]
+    assert EventIndex.load("event_index.parquet").files == expected
+
+    result = runner.invoke(
+        partition_module.app,
+        ["calc_usage", "bin_boundaries.yaml", "--n-jets", "1"]
+        + ["--file-composition", "file_composition.parquet"]
+        + ["--event-index", "event_index.parquet", "--ranges-output", "ranges.yaml"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "Files read:" in result.output
+    with open("ranges.yaml") as f:
+        assert sorted(yaml.safe_load(f)) == expected
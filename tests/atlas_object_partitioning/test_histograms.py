@@ -1,3 +1,4 @@
+import itertools
 import pytest
 import yaml
 import awkward as ak
@@ -5,12 +6,22 @@ import numpy as np
 from hist import Hist
 from atlas_object_partitioning.histograms import (
     apply_tail_caps,
+    cell_group_labels,
     compute_bin_boundaries,
+    compute_cell_indices,
+    compute_tail_caps,
+    CostModel,
+    event_costs,
+    count_cells,
+    group_counts_from_labels,
     write_bin_boundaries_yaml,
     build_nd_histogram,
     histogram_boundaries,
     merge_sparse_bins,
+    merge_sparse_boxes,
     merge_sparse_cells,
+    MergedCells,
+    selected_groups,
     write_histogram_pickle,
     load_histogram_pickle,
     top_bins,
@@ -185,3 +196,204 @@ def test_merge_sparse_cells_2d():
     assert counts == [101, 101]
     assert summary["min_fraction"] == pytest.approx(0.5)
     assert summary["max_fraction"] == pytest.approx(0.5)
+
+
+def test_compute_bin_boundaries_continuous_axis():
+    met = np.linspace(0.5, 100.5, 1000)
+    data = ak.Array({"met": met, "n_muons": np.arange(1000) % 3})
+    boundaries = compute_bin_boundaries(data, bins_per_axis=4)
+    assert boundaries["n_muons"] == [0, 1, 2, 3]
+    met_edges = boundaries["met"]
+    assert len(met_edges) == 5
+    assert met_edges[0] == pytest.approx(0.5)
+    assert met_edges[-1] > 100.5
+    assert any(not float(edge).is_integer() for edge in met_edges)
+
+    hist = build_nd_histogram(data, boundaries)
+    met_counts = np.asarray(hist.view()).sum(axis=1)
+    assert met_counts.sum() == len(met)
+    assert np.all(met_counts == 250)
+
+
+def test_compute_bin_boundaries_continuous_sampled():
+    rng = np.random.default_rng(1)
+    met = rng.exponential(30.0, size=20000)
+    data = ak.Array({"met": met})
+    boundaries = compute_bin_boundaries(data, bins_per_axis=4, continuous_sample_size=2000)
+    edges = boundaries["met"]
+    assert edges[0] == pytest.approx(met.min())
+    assert edges[-1] > met.max()
+    hist = build_nd_histogram(data, boundaries)
+    fractions = np.asarray(hist.view()) / len(met)
+    assert hist.view().sum() == len(met)  # type: ignore
+    assert np.allclose(fractions, 0.25, atol=0.03)
+
+
+def test_continuous_boundaries_yaml_roundtrip(tmp_path):
+    hist = Hist.new.Var([0.0, 12.5, 30.25, 200.0], name="met", label="met").Int64()
+    boundaries = histogram_boundaries(hist)
+    assert boundaries["met"] == [0, 12.5, 30.25, 200]
+    out_file = tmp_path / "bounds.yaml"
+    write_bin_boundaries_yaml(boundaries, out_file)
+    with open(out_file) as f:
+        loaded = yaml.safe_load(f)
+    assert loaded["axes"]["met"] == [0, 12.5, 30.25, 200]
+
+
+def test_apply_tail_caps_continuous():
+    data = ak.Array({"met": [1.5, 2.5, 3.5, 500.25]})
+    capped, caps = apply_tail_caps(data, tail_cap_quantile=0.5)
+    assert caps["met"] == pytest.approx(3.0)
+    assert ak.to_list(capped["met"]) == pytest.approx([1.5, 2.5, 3.0, 3.0])
+
+
+def test_lazy_tail_caps_match_capped_copy():
+    rng = np.random.default_rng(5)
+    data = ak.Array(
+        {
+            "n_jets": rng.poisson(4.0, size=5000).astype(np.int32),
+            "n_muons": rng.poisson(0.5, size=5000),
+            "met": rng.exponential(40.0, size=5000),
+        }
+    )
+    caps = compute_tail_caps(data, tail_cap_quantile=0.9)
+    assert sorted(caps) == ["met", "n_jets", "n_muons"]
+    capped, applied = apply_tail_caps(data, caps=caps)
+    assert applied == caps
+    bounds = compute_bin_boundaries(data, bins_per_axis=3, caps=caps)
+    assert bounds == compute_bin_boundaries(capped, bins_per_axis=3)
+    # Edges wider than the capped range exercise the lookup and search paths.
+    wide = {"n_jets": [0, 3, 5, 20], "n_muons": [0, 1, 2], "met": [0.0, 10.0, 1000.0]}
+    for edges in (bounds, wide):
+        lazy = build_nd_histogram(data, edges, caps=caps)
+        expected = build_nd_histogram(capped, edges)
+        assert np.array_equal(
+            np.asarray(lazy.view(flow=True)), np.asarray(expected.view(flow=True))
+        )
+
+
+def test_build_nd_histogram_threaded_matches_single():
+    rng = np.random.default_rng(7)
+    data = ak.Array(
+        {
+            "n_jets": rng.poisson(4.0, size=10007),
+            "n_muons": rng.poisson(0.5, size=10007),
+        }
+    )
+    bounds = compute_bin_boundaries(data, bins_per_axis=3)
+    single = build_nd_histogram(data, bounds, threads=1)
+    threaded = build_nd_histogram(data, bounds, threads=4, chunk_size=1000)
+    assert np.array_equal(np.asarray(threaded.view()), np.asarray(single.view()))
+    assert threaded.view().sum() == len(data)  # type: ignore
+
+
+def test_cell_indices_match_histogram():
+    data = ak.Array(
+        {
+            "n_jets": [0, 1, 2, 5, 9, 3],
+            "met": [1.5, 20.0, 35.5, 3.0, 99.0, 250.0],
+        }
+    )
+    bounds = {"n_jets": [0, 2, 4, 6], "met": [0.0, 10.0, 40.5, 200.0]}
+    cells = compute_cell_indices(data, bounds)
+    assert cells.tolist() == [0, 1, 4, 6, -1, -1]
+    counts = count_cells(cells, (3, 3))
+    hist = build_nd_histogram(data, bounds, threads=1)
+    assert np.array_equal(counts, np.asarray(hist.view()))
+    # Out-of-range events land in the flow bins, as with Hist.fill
+    assert hist.view(flow=True).sum() == len(data)  # type: ignore
+
+
+def test_group_labels_recount():
+    hist = (
+        Hist.new.Var([0, 1, 2], name="n_muons", label="n_muons")
+        .Var([0, 1, 2], name="n_jets", label="n_jets")
+        .Int64()
+    )
+    hist[...] = np.array([[100, 1], [1, 100]])
+    groups, _ = merge_sparse_cells(hist, min_fraction=0.05)
+    labels = cell_group_labels(groups, ["n_muons", "n_jets"], (2, 2))
+    assert sorted(set(labels.tolist())) == [0, 1]
+    totals = group_counts_from_labels(labels, np.asarray(hist.view()), len(groups))
+    assert totals.tolist() == [group.count for group in groups]
+
+
+def test_cost_weighted_boundaries_and_histogram():
+    rng = np.random.default_rng(5)
+    data = ak.Array(
+        {
+            "n_jets": rng.poisson(4.0, size=3000),
+            "met": rng.exponential(50.0, size=3000),
+        }
+    )
+    ones = np.ones(len(data), dtype=np.int64)
+    assert compute_bin_boundaries(data, bins_per_axis=3, weights=ones) == compute_bin_boundaries(
+        data, bins_per_axis=3
+    )
+
+    costs = event_costs(data, CostModel(base=100.0, weights={"n_jets": 250.0}))
+    assert costs[0] == 100 + 250 * data["n_jets"][0]
+    boundaries = compute_bin_boundaries(data, bins_per_axis=3, weights=costs)
+    # Low jet counts are cheap, so the first cost-balanced bin has to reach further.
+    assert boundaries["n_jets"][1] > compute_bin_boundaries(data, bins_per_axis=3)["n_jets"][1]
+
+    hist = build_nd_histogram(data, boundaries, weights=costs, threads=2, chunk_size=500)
+    expected = Hist(*hist.axes).fill(
+        ak.to_numpy(data["n_jets"]), ak.to_numpy(data["met"]), weight=costs
+    )
+    assert np.array_equal(np.asarray(hist.view(flow=True)), np.asarray(expected.view(flow=True)))
+    assert hist.sum(flow=True) == costs.sum()
+
+    with pytest.raises(ValueError):
+        event_costs(data, CostModel(weights={"n_muons": 1.0}))
+
+
+def test_merge_sparse_boxes_tiles_grid(tmp_path):
+    rng = np.random.default_rng(7)
+    data = ak.Array(
+        {
+            "n_jets": rng.poisson(4.0, size=5000),
+            "n_muons": rng.poisson(0.5, size=5000),
+            "n_electrons": rng.poisson(1.0, size=5000),
+        }
+    )
+    boundaries = compute_bin_boundaries(data, bins_per_axis=4)
+    hist = build_nd_histogram(data, boundaries)
+    counts = np.asarray(hist.view())
+    groups, summary = merge_sparse_boxes(hist, min_fraction=0.03)
+
+    assert all(group.box is not None and not group.cells for group in groups)
+    assert min(group.fraction for group in groups) >= 0.03
+    assert summary["min_fraction"] >= 0.03
+    labels = cell_group_labels(groups, list(boundaries), counts.shape)
+    # The boxes tile the grid: every cell is in exactly one group.
+    assert np.all(labels >= 0)
+    sizes = [int(np.prod([hi - lo for lo, hi in g.box.values()])) for g in groups]
+    assert sum(sizes) == counts.size
+    totals = group_counts_from_labels(labels, counts, len(groups))
+    assert totals.tolist() == [group.count for group in groups]
+
+    path = tmp_path / "bin_boundaries.yaml"
+    write_bin_boundaries_yaml(
+        boundaries, str(path), merged_cells=MergedCells(min_fraction=0.03, groups=groups)
+    )
+    with open(path) as f:
+        written = yaml.safe_load(f)["merged_cells"]["groups"]
+    assert "cells" not in written[0] and "box" in written[0]
+
+    # Box selection agrees with the same groups listed cell by cell.
+    cell_groups = [
+        {
+            "cells": [
+                dict(zip(group.box, idx))
+                for idx in itertools.product(*(range(lo, hi) for lo, hi in group.box.values()))
+            ],
+            "fraction": group.fraction,
+        }
+        for group in groups
+    ]
+    box_groups = [{"box": group.box, "fraction": group.fraction} for group in groups]
+    for cuts in ({"n_muons": 1}, {"n_jets": 5, "n_electrons": 2}, {"n_muons": 50}):
+        assert selected_groups(boundaries, box_groups, cuts) == selected_groups(
+            boundaries, cell_groups, cuts
+        )
@@ -0,0 +1,112 @@
+import awkward as ak
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+import yaml
+from typer.testing import CliRunner
+
+import atlas_object_partitioning.partition as partition_module
+from atlas_object_partitioning.histograms import KDTreeNodes, write_bin_boundaries_yaml
+from atlas_object_partitioning.kdtree import KDTree
+
+AXES = ["n_jets", "n_muons", "n_electrons", "met"]
+
+
+def test_kdtree_small_sample():
+    data = ak.Array({"n_jets": [0, 1, 2, 3, 4, 5, 6, 7], "met": [1.0, 2, 3, 4, 5, 6, 7, 8]})
+    tree = KDTree.build(data, leaf_fraction=0.25)
+    # Split at the n_jets median, then each half at its met median.
+    top = float(np.nextafter(8.0, np.inf))
+    assert tree.counts.tolist() == [2, 2, 2, 2]
+    assert tree.lower.tolist() == [[0, 1], [0, 3], [4, 1], [4, 7]]
+    assert tree.upper.tolist() == [[4, 3], [4, top], [8, 7], [8, top]]
+    assert tree.assign(data).tolist() == [0, 0, 1, 1, 2, 2, 3, 3]
+    assert tree.selected_leaves({"n_jets": 4}) == [2, 3]
+    assert tree.usage_fraction({"n_jets": 4}) == 0.5
+
+
+def test_kdtree_leaves_are_balanced_boxes(make_counts):
+    data = make_counts(AXES, 20000, seed=11)
+    tree = KDTree.build(data, leaf_fraction=0.05)
+    assert 20 <= tree.n_groups <= 40
+    assert tree.fractions.max() <= 0.05
+    assert tree.counts.sum() == len(data)
+
+    leaves = tree.assign(data)
+    assert np.array_equal(np.bincount(leaves, minlength=tree.n_groups), tree.counts)
+    for i, axis in enumerate(tree.axes):
+        values = ak.to_numpy(data[axis])
+        assert np.all(tree.lower[leaves, i] <= values)
+        assert np.all(values < tree.upper[leaves, i])
+
+
+def test_kdtree_usage_and_yaml_roundtrip(tmp_path, make_counts):
+    data = make_counts(AXES, 20000, seed=11)
+    tree = KDTree.build(data, ignore_axes=["met"], leaf_fraction=0.1)
+    path = tmp_path / "bin_boundaries.yaml"
+    write_bin_boundaries_yaml(tree.bounds, str(path), kdtree=tree.nodes)
+    with open(path) as f:
+        written = yaml.safe_load(f)
+    loaded = KDTree(written["axes"], KDTreeNodes.model_validate(written["kdtree"]))
+    assert np.array_equal(loaded.assign(data), tree.assign(data))
+
+    for cuts in ({"n_muons": 1}, {"n_jets": 6, "n_electrons": 2}, {"n_jets": 100}):
+        passing = np.ones(len(data), dtype=bool)
+        for axis, value in cuts.items():
+            passing &= ak.to_numpy(data[axis]) >= value
+        # Selected leaves hold every passing event and only whole leaves.
+        selected = loaded.selected_leaves(cuts)
+        assert np.all(np.isin(loaded.assign(data)[passing], selected))
+        assert loaded.usage_fraction(cuts) >= passing.mean()
+    assert loaded.selected_leaves({"n_jets": 100}) == []
+    with pytest.raises(ValueError):
+        loaded.selected_leaves({"met": 10.0})
+
+
+def test_kdtree_weights_and_bad_settings(make_counts):
+    data = make_counts(AXES, 5000, seed=11)
+    weights = 1 + 10 * ak.to_numpy(data["n_jets"])
+    tree = KDTree.build(data, leaf_fraction=0.1, weights=weights)
+    assert tree.counts.sum() == weights.sum()
+    assert np.array_equal(
+        np.bincount(tree.assign(data), weights=weights, minlength=tree.n_groups), tree.counts
+    )
+    with pytest.raises(ValueError):
+        KDTree.build(data, leaf_fraction=0.0)
+    with pytest.raises(ValueError):
+        KDTree.build(data, weights=weights[:10])
+
+
+def test_partition_kdtree_mode(tmp_path, monkeypatch, make_counts):
+    data = make_counts(AXES, 20000, seed=11)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        partition_module, "collect_object_counts", lambda ds_name, axes, **kwargs: data[axes]
+    )
+    runner = CliRunner()
+    result = runner.invoke(
+        partition_module.app,
+        ["partition", "ds", "--mode", "kdtree", "-o", "counts.parquet"]
+        + [f"--ignore-axes={axis}" for axis in ("n_large_jets", "n_photons", "n_taus")],
+    )
+    assert result.exit_code == 0, result.output
+    assert "kd-tree summary" in result.output
+
+    result = runner.invoke(
+        partition_module.app, ["calc_usage", "bin_boundaries.yaml", "--n-muons", "2"]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Usage fraction" in result.output
+
+    result = runner.invoke(
+        partition_module.app, ["assign", "bin_boundaries.yaml", "counts.parquet"]
+    )
+    assert result.exit_code == 0, result.output
+    groups = pq.read_table("groups.parquet").column("group").to_numpy()
+    assert len(groups) == len(data) and groups.min() >= 0
+
+    result = runner.invoke(
+        partition_module.app,
+        ["partition", "ds", "--mode", "kdtree", "--merge-cell-min-fraction", "0.01"],
+    )
+    assert result.exit_code != 0
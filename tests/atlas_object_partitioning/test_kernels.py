@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from hist import Hist
+
+from atlas_object_partitioning import kernels
+from atlas_object_partitioning.histograms import (
+    cell_group_labels,
+    group_counts_from_labels,
+    merge_sparse_bins,
+    merge_sparse_cells,
+)
+
+
+def _hist(counts):
+    builder = Hist.new
+    for i, size in enumerate(counts.shape):
+        builder = builder.Var(list(range(size + 1)), name=f"n_{i}", label=f"n_{i}")
+    hist = builder.Int64()
+    hist[...] = counts
+    return hist
+
+
+def _both_paths(monkeypatch, function, *args, **kwargs):
+    results = []
+    for enabled in (False, True):
+        monkeypatch.setattr(kernels, "JIT_ENABLED", enabled)
+        results.append(function(*args, **kwargs))
+    return results
+
+
+@pytest.mark.parametrize("shape", [(7,), (4, 5), (3, 4, 3), (2, 3, 2, 3)])
+def test_merge_kernels_match_numpy(monkeypatch, shape):
+    rng = np.random.default_rng(sum(shape))
+    # Small counts give plenty of ties, which both paths must break the same way.
+    for counts in (rng.poisson(3.0, shape), rng.geometric(0.2, shape), np.zeros(shape, int)):
+        hist = _hist(counts)
+        for min_fraction in (0.0, 0.02, 0.1, 0.3, 1.0):
+            plain, compiled = _both_paths(monkeypatch, merge_sparse_cells, hist, min_fraction)
+            assert [g.model_dump() for g in plain[0]] == [g.model_dump() for g in compiled[0]]
+            assert plain[1] == compiled[1]
+            for min_bins in (1, 2):
+                plain, compiled = _both_paths(
+                    monkeypatch, merge_sparse_bins, hist, min_fraction, min_bins=min_bins
+                )
+                assert plain[1] == compiled[1]
+                assert np.array_equal(plain[0].view(), compiled[0].view())
+                assert [list(ax.edges) for ax in plain[0].axes] == [
+                    list(ax.edges) for ax in compiled[0].axes
+                ]
+
+
+def test_label_totals_match_numpy(monkeypatch):
+    counts = np.random.default_rng(4).poisson(20.0, (4, 5, 3))
+    groups, _ = merge_sparse_cells(_hist(counts), min_fraction=0.05)
+    labels = cell_group_labels(groups, ["n_0", "n_1", "n_2"], counts.shape)
+    labels[::7] = -1
+    plain, compiled = _both_paths(
+        monkeypatch, group_counts_from_labels, labels, counts, len(groups)
+    )
+    assert plain.dtype == compiled.dtype == np.int64
+    assert np.array_equal(plain, compiled)
@@ -0,0 +1,209 @@
+import subprocess
+
+import pytest
+
+import atlas_object_partitioning.local_mode as local_mode
+from atlas_object_partitioning.local_mode import CachedCodegen, WarmDockerPool, query_hash
+
+
+class _CountingCodegen:
+    def __init__(self):
+        self.calls = 0
+
+    def gen_code(self, query, directory, transformer_capabilities_file=None):
+        self.calls += 1
+        (directory / "query.cpp").write_text(f"// {query}\n")
+        return directory
+
+
+def test_codegen_is_cached_by_query(tmp_path):
+    inner = _CountingCodegen()
+    codegen = CachedCodegen(inner, cache_dir=tmp_path / "cache")
+    for i in range(3):
+        out = codegen.gen_code("Select(e, 1)", tmp_path / f"run{i}")
+        assert (out / "query.cpp").read_text() == "// Select(e, 1)\n"
+    assert inner.calls == 1
+    assert (tmp_path / "cache" / query_hash("Select(e, 1)")).is_dir()
+
+    codegen.gen_code("Select(e, 2)", tmp_path / "other")
+    assert inner.calls == 2
+
+
+def test_local_adaptor_is_reused(monkeypatch):
+    monkeypatch.setattr(local_mode, "LocalXAODCodegen", _CountingCodegen)
+    monkeypatch.setattr(local_mode, "DockerScienceImage", object)
+    monkeypatch.setattr(local_mode, "SXLocalAdaptor", lambda *args: args)
+    monkeypatch.setattr(local_mode, "_LOCAL_ADAPTORS", {})
+
+    first = local_mode.install_sx_local(workers=2)
+    assert local_mode.install_sx_local(workers=2) is first
+    codegen, runner = first[2][:2]
+    assert isinstance(codegen, CachedCodegen) and isinstance(runner, WarmDockerPool)
+    assert runner.workers == 2
+    assert local_mode.install_sx_local(workers=4)[2][1].workers == 4
+
+    with pytest.raises(ValueError):
+        WarmDockerPool(workers=0)
+
+
+def test_local_dataset_forms(tmp_path):
+    data = tmp_path / "physlite"
+    data.mkdir()
+    for name in ("b.pool.root.1", "a.pool.root.1", "notes.md"):
+        (data / name).write_text("")
+    expected = [str(data / "a.pool.root.1"), str(data / "b.pool.root.1")]
+    list_file = tmp_path / "files.txt"
+    list_file.write_text("# PHYSLITE\nphyslite/b.pool.root.1\n\nphyslite/a.pool.root.1\n")
+
+    for ds_name in (str(data), str(data / "*.root.1"), f"file://{data}", str(list_file)):
+        dataset_obj, location = local_mode.find_dataset(ds_name)
+        assert location == local_mode.SXLocationOptions.mustUseLocal
+        assert sorted(dataset_obj.files) == expected
+
+    with pytest.raises(ValueError):
+        local_mode.local_files(str(tmp_path / "*.root"))
+    with pytest.raises(ValueError):
+        local_mode.find_dataset(str(tmp_path / "missing" / "*.root"))
+    _, location = local_mode.find_dataset("mc20_13TeV:mc20_13TeV.*.PHYSLITE")
+    assert location == local_mode.SXLocationOptions.mustUseRemote
+
+
+def test_source_files_of_delivered_outputs(tmp_path, monkeypatch):
+    data = tmp_path / "physlite" / ("deep" * 10)
+    data.mkdir(parents=True)
+    inputs = [str(data / name) for name in ("a.pool.root.1", "b.pool.root.1")]
+    for path in inputs:
+        open(path, "w").close()
+    names = [local_mode.output_file_name(path) for path in inputs]
+    assert names[0] != names[1] and all(len(name) == 60 for name in names)
+    delivered = [str(tmp_path / "cache" / name) for name in reversed(names)]
+    assert local_mode.source_files(str(data), delivered) == inputs[::-1]
+    with pytest.raises(ValueError):
+        local_mode.source_files(str(data), [str(tmp_path / "cache" / "c.pool.root.1")])
+
+    # Rucio inputs are matched on the part of the replica path the name keeps.
+    dids = [f"mc23_13p6TeV:DAOD_PHYSLITE.37621._00000{i}.pool.root.1" for i in (1, 2)]
+    monkeypatch.setattr(local_mode, "rucio_files", lambda did: dids)
+    replicas = [
+        "root://eos.cern.ch//eos/atlas/rucio/mc23_13p6TeV/a1/b2/" + did.split(":")[1]
+        for did in dids
+    ]
+    delivered = [local_mode.output_file_name(replica) for replica in replicas]
+    assert local_mode.source_files("mc23_13p6TeV:DAOD_PHYSLITE.37621", delivered) == dids
+    short = local_mode.output_file_name("root://eos//" + dids[1].split(":")[1])
+    assert local_mode.source_files("mc23_13p6TeV:DAOD_PHYSLITE.37621", [short]) == dids[1:]
+
+
+class _FakeDocker:
+    """Stands in for the docker CLI and the transformer run inside containers."""
+
+    def __init__(self, output_root, produce=True):
+        self.output_root = output_root
+        self.produce = produce
+        self.running = set()
+        self.started = []
+        self.execs = []
+
+    def docker(self, *args):
+        if args[0] == "inspect":
+            running = args[-1] in self.running
+            return subprocess.CompletedProcess(args, 0 if running else 1, "true\n", "")
+        if args[0] == "run":
+            name = args[args.index("--name") + 1]
+            self.running.add(name)
+            self.started.append(name)
+        return subprocess.CompletedProcess(args, 0, "", "")
+
+    def run(self, command, log_file=None):
+        name, input_path, output = command[2], command[5], command[6]
+        self.execs.append((name, input_path))
+        if self.produce:
+            path = self.output_root / output.replace("/servicex/output/", "", 1)
+            path.write_text("")
+
+
+def _pool(tmp_path, monkeypatch, workers, produce=True):
+    fake = _FakeDocker(tmp_path / "out", produce=produce)
+    monkeypatch.setattr(local_mode, "_docker", fake.docker)
+    monkeypatch.setattr(local_mode, "run_command_with_logging", fake.run)
+    monkeypatch.setattr(local_mode, "write_file_runner_script", lambda code_dir: None)
+    monkeypatch.setattr(local_mode, "write_kickoff_script", lambda code_dir: None)
+    generated = tmp_path / "generated"
+    generated.mkdir(exist_ok=True)
+    (generated / "query.cpp").write_text("// query\n")
+    pool = WarmDockerPool(workers=workers, cache_dir=tmp_path / "code")
+    return pool, fake, generated
+
+
+def _inputs(tmp_path, names):
+    data = tmp_path / "data"
+    data.mkdir(exist_ok=True)
+    for name in names:
+        (data / name).write_text("")
+    return [str(data / name) for name in names]
+
+
+def test_warm_pool_shards_and_reuses_containers(tmp_path, monkeypatch):
+    pool, fake, generated = _pool(tmp_path, monkeypatch, workers=2)
+    inputs = _inputs(tmp_path, ["a.root", "b.root", "c.root"])
+    outputs = pool.transform(generated, inputs, tmp_path / "out" / "run1", "parquet")
+    assert [path.exists() for path in outputs] == [True] * 3
+    assert len(fake.started) == 2
+    shards = {name: [path for n, path in fake.execs if n == name] for name in fake.started}
+    assert sorted(shards.values()) == [
+        ["/input/0/a.root", "/input/0/c.root"],
+        ["/input/0/b.root"],
+    ]
+
+    # A second run of the same code and mounts finds the containers warm.
+    pool.transform(generated, inputs, tmp_path / "out" / "run1", "parquet")
+    assert len(fake.started) == 2 and len(fake.execs) == 6
+
+    # Inputs from two directories are mounted separately.
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "d.root").write_text("")
+    volumes, paths = pool._mounts(tmp_path, inputs[:1] + [str(other / "d.root")], tmp_path)
+    assert paths == ["/input/0/a.root", "/input/1/d.root"]
+    assert f"{other}:/input/1:ro" in volumes
+    with pytest.raises(FileNotFoundError):
+        pool._mounts(tmp_path, [str(other / "missing.root")], tmp_path)
+
+
+def test_warm_pool_moves_off_expiring_containers(tmp_path, monkeypatch):
+    pool, fake, generated = _pool(tmp_path, monkeypatch, workers=1)
+    inputs = _inputs(tmp_path, ["a.root"])
+    now = [pool.warm_seconds * 1000.0]
+    monkeypatch.setattr(local_mode.time, "time", lambda: now[0])
+    pool.transform(generated, inputs, tmp_path / "out" / "run", "parquet")
+    now[0] += pool.warm_seconds / 4
+    pool.transform(generated, inputs, tmp_path / "out" / "run", "parquet")
+    assert len(fake.started) == 1
+    # Past half its lifetime the container gets no new files.
+    now[0] += pool.warm_seconds / 2
+    pool.transform(generated, inputs, tmp_path / "out" / "run", "parquet")
+    assert len(fake.started) == 2
+    assert fake.execs[-1][0] == fake.started[-1]
+
+
+def test_warm_pool_reports_missing_output(tmp_path, monkeypatch):
+    pool, _, generated = _pool(tmp_path, monkeypatch, workers=1, produce=False)
+    inputs = _inputs(tmp_path, ["a.root"])
+    with pytest.raises(RuntimeError, match="produced no output"):
+        pool.transform(generated, inputs, tmp_path / "out" / "run", "parquet")
+
+
+def test_warm_pool_keeps_same_named_inputs_apart(tmp_path, monkeypatch):
+    pool, fake, generated = _pool(tmp_path, monkeypatch, workers=2)
+    inputs = []
+    for directory in ("run1", "run2"):
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / "DAOD_PHYSLITE.pool.root.1").write_text("")
+        inputs.append(str(tmp_path / directory / "DAOD_PHYSLITE.pool.root.1"))
+    listing = tmp_path / "files.txt"
+    listing.write_text("run1/DAOD_PHYSLITE.pool.root.1\nrun2/DAOD_PHYSLITE.pool.root.1\n")
+    assert local_mode.local_files(str(listing)) == inputs
+
+    outputs = pool.transform(generated, inputs, tmp_path / "out" / "run", "root")
+    assert len(set(outputs)) == 2 and all(path.exists() for path in outputs)
+    assert local_mode.source_files(str(listing), [str(path) for path in outputs]) == inputs
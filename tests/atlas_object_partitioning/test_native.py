@@ -0,0 +1,98 @@
+import awkward as ak
+import numpy as np
+import pytest
+import uproot
+from typer.testing import CliRunner
+
+import atlas_object_partitioning.partition as partition_module
+from atlas_object_partitioning.native import (
+    AXIS_BRANCHES,
+    EVENT_ID_BRANCHES,
+    MET_BRANCHES,
+    count_physlite_file,
+    count_physlite_files,
+    local_physlite_files,
+)
+
+
+def _write_physlite(path, n_events, seed):
+    """Write a file with the PHYSLITE branches the native backend reads."""
+    rng = np.random.default_rng(seed)
+    sizes = {}
+    branches = {}
+    for axis, branch in AXIS_BRANCHES.items():
+        sizes[axis] = rng.poisson(2.0, size=n_events)
+        values = rng.exponential(30000.0, size=sizes[axis].sum()).astype(np.float32)
+        branches[branch] = ak.unflatten(values, sizes[axis])
+    met_terms = rng.integers(1, 4, size=n_events)
+    for branch in MET_BRANCHES:
+        values = rng.normal(0.0, 30000.0, size=met_terms.sum()).astype(np.float32)
+        branches[branch] = ak.unflatten(values, met_terms)
+    branches[EVENT_ID_BRANCHES["run_number"]] = np.full(n_events, 410000, dtype=np.uint32)
+    branches[EVENT_ID_BRANCHES["event_number"]] = np.arange(n_events, dtype=np.uint64)
+    with uproot.recreate(path) as f:
+        f["CollectionTree"] = branches
+    mpx, mpy = (ak.to_numpy(ak.firsts(branches[b])) for b in MET_BRANCHES)
+    return sizes, np.hypot(mpx, mpy) / 1000.0
+
+
+def test_count_physlite_file(tmp_path):
+    path = str(tmp_path / "DAOD_PHYSLITE.root")
+    sizes, met = _write_physlite(path, 500, seed=1)
+    counts = count_physlite_file(path, ["n_jets", "n_muons", "met"], with_event_ids=True)
+    assert counts.fields == ["n_jets", "n_muons", "met", "run_number", "event_number"]
+    assert counts["n_jets"].dtype == np.int32
+    assert np.array_equal(counts["n_jets"], sizes["n_jets"])
+    assert np.array_equal(counts["n_muons"], sizes["n_muons"])
+    assert np.allclose(counts["met"], met, rtol=1e-6)
+    assert np.array_equal(counts["event_number"], np.arange(500))
+
+    with pytest.raises(ValueError):
+        count_physlite_file(path, ["n_pions"])
+    with uproot.recreate(tmp_path / "other.root") as f:
+        f["CollectionTree"] = {"AnalysisJetsAuxDyn.pt": ak.Array([[1.0], []])}
+    with pytest.raises(ValueError):
+        count_physlite_file(str(tmp_path / "other.root"), ["n_jets", "n_muons"])
+
+
+def test_count_physlite_files_workers(tmp_path):
+    paths = [str(tmp_path / f"DAOD_PHYSLITE.{i}.root") for i in range(3)]
+    for i, path in enumerate(paths):
+        _write_physlite(path, 200 + 100 * i, seed=i)
+    serial = count_physlite_files(paths, ["n_electrons", "met"], workers=1)
+    parallel = count_physlite_files(paths, ["n_electrons", "met"], workers=2)
+    assert [len(table) for table in serial] == [200, 300, 400]
+    for a, b in zip(serial, parallel):
+        assert np.array_equal(a["n_electrons"], b["n_electrons"])
+        assert np.array_equal(a["met"], b["met"])
+    assert local_physlite_files(paths[0]) == [paths[0]]
+    with pytest.raises(ValueError):
+        local_physlite_files("rucio://mc23_13p6TeV:some.dataset")
+
+
+def test_partition_native(tmp_path, monkeypatch):
+    path = str(tmp_path / "DAOD_PHYSLITE.root")
+    _write_physlite(path, 2000, seed=3)
+    monkeypatch.chdir(tmp_path)
+    runner = CliRunner()
+    result = runner.invoke(
+        partition_module.app,
+        [
+            "partition",
+            path,
+            "--native",
+            "--ignore-axes",
+            "met",
+            "--bins-per-axis",
+            "2",
+            "--file-composition",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "bin_boundaries.yaml").exists()
+    assert (tmp_path / "file_composition.parquet").exists()
+
+    result = runner.invoke(
+        partition_module.app, ["partition", path, "--native", "--backend", "chunked"]
+    )
+    assert result.exit_code != 0
@@ -0,0 +1,182 @@
+import awkward as ak
+import numpy as np
+import pytest
+import yaml
+from typer.testing import CliRunner
+
+import atlas_object_partitioning.partition as partition_module
+from atlas_object_partitioning.histograms import (
+    CostModel,
+    apply_tail_caps,
+    build_nd_histogram,
+    compute_bin_boundaries,
+    merge_sparse_bins,
+    merge_sparse_cells,
+)
+from atlas_object_partitioning.partitioner import Partitioner
+
+AXES = ["n_jets", "n_muons", "n_electrons"]
+
+
+def test_partitioner_small_sample():
+    data = ak.Array(
+        {
+            "n_jets": [0, 1, 1, 2, 2, 2, 3, 3, 4, 4],
+            "n_electrons": [1, 2, 1, 0, 1, 2, 3, 3, 2, 0],
+        }
+    )
+    p = Partitioner(data, bins_per_axis=2)
+    assert p.boundaries == {"n_jets": [0, 3, 5], "n_electrons": [0, 2, 4]}
+    assert np.asarray(p.histogram.view()).tolist() == [[4, 2], [1, 3]]
+    # The 10% cell joins its smaller neighbour, then the 20% cell joins the other.
+    p.merge_cells(0.3)
+    assert [(g.count, [list(c.values()) for c in g.cells]) for g in p.merged_groups] == [
+        (6, [[0, 0], [0, 1]]),
+        (4, [[1, 0], [1, 1]]),
+    ]
+    assert p.merged_summary["max_fraction"] == 0.6
+
+
+def test_partitioner_matches_functions(make_counts):
+    data = make_counts(AXES, 2000, seed=3)
+    p = Partitioner(
+        data,
+        bins_per_axis=3,
+        tail_cap_quantile=0.95,
+        merge_min_fraction=0.05,
+        merge_cell_min_fraction=0.02,
+    )
+    capped, caps = apply_tail_caps(data, tail_cap_quantile=0.95)
+    boundaries = compute_bin_boundaries(capped, bins_per_axis=3)
+    hist, merges = merge_sparse_bins(build_nd_histogram(capped, boundaries), min_fraction=0.05)
+    groups, _ = merge_sparse_cells(hist, min_fraction=0.02)
+
+    assert p.tail_caps == caps
+    assert p.bin_merges == merges
+    assert np.array_equal(np.asarray(p.histogram.view()), np.asarray(hist.view()))
+    assert [g.cells for g in p.merged_groups] == [g.cells for g in groups]
+
+
+def test_partitioner_recomputes_only_downstream(monkeypatch, make_counts):
+    import atlas_object_partitioning.partitioner as partitioner_module
+
+    calls = {"caps": 0, "fill": 0}
+    real_caps = partitioner_module.compute_tail_caps
+    real_fill = partitioner_module.build_nd_histogram
+
+    def counting_caps(*args, **kwargs):
+        calls["caps"] += 1
+        return real_caps(*args, **kwargs)
+
+    def counting_fill(*args, **kwargs):
+        calls["fill"] += 1
+        return real_fill(*args, **kwargs)
+
+    monkeypatch.setattr(partitioner_module, "compute_tail_caps", counting_caps)
+    monkeypatch.setattr(partitioner_module, "build_nd_histogram", counting_fill)
+
+    p = Partitioner(make_counts(AXES, 2000, seed=3), bins_per_axis=3, tail_cap_quantile=0.9)
+    p.merge_cells(0.01).merged_groups
+    p.merge_cells(0.05).merged_groups
+    assert calls == {"caps": 1, "fill": 1}
+
+    p.with_bins(2).merged_groups
+    assert calls == {"caps": 1, "fill": 2}
+
+    # Going back to earlier settings reuses the cached stages.
+    p.with_bins(3).merge_cells(0.01).merged_groups
+    assert calls == {"caps": 1, "fill": 2}
+
+    # Overrides that spell out the same bins share the cache entry.
+    p.with_bins(1, {"n_jets": 3, "n_muons": 3, "n_electrons": 3}).histogram
+    assert calls == {"caps": 1, "fill": 2}
+
+
+def test_partitioner_fixed_boundaries_and_write(tmp_path, make_counts):
+    data = make_counts(AXES, 2000, seed=3)
+    boundaries = {"n_jets": [0, 3, 5, 20], "n_muons": [0, 1, 5], "n_electrons": [0, 1, 2, 9]}
+    p = Partitioner(data).with_boundaries(boundaries)
+    assert p.bins_by_axis == {"n_jets": 3, "n_muons": 2, "n_electrons": 3}
+    assert p.histogram.sum() == len(data)
+
+    p.write(str(tmp_path / "bin_boundaries.yaml"), str(tmp_path / "histogram.pkl"))
+    with open(tmp_path / "bin_boundaries.yaml") as f:
+        written = yaml.safe_load(f)
+    assert written["axes"] == boundaries
+    assert (tmp_path / "histogram.pkl").exists()
+
+
+def test_partitioner_rejects_bad_settings(make_counts):
+    p = Partitioner(make_counts(AXES, 2000, seed=3), ignore_axes=["n_muons"])
+    assert p.axes == ["n_jets", "n_electrons"]
+    with pytest.raises(ValueError):
+        p.with_bins(0)
+    with pytest.raises(ValueError):
+        p.with_bins(2, {"n_muons": 2})
+    with pytest.raises(ValueError):
+        p.with_tail_caps(0.0)
+    with pytest.raises(ValueError):
+        p.merge_cells(1.5)
+
+
+def test_partitioner_cost_model(tmp_path, make_counts):
+    data = make_counts(AXES, 2000, seed=3)
+    cost_model = CostModel(base=1000.0, weights={"n_jets": 500.0, "n_muons": 300.0})
+    p = Partitioner(
+        data,
+        ignore_axes=["n_muons"],
+        bins_per_axis=3,
+        merge_cell_min_fraction=0.05,
+        cost_model=cost_model,
+    )
+    total = int(p.costs.sum())
+    assert p.histogram.sum(flow=True) == total
+    assert sum(g.count for g in p.merged_groups) == total
+
+    # Dropping the cost model goes back to counting events.
+    assert p.with_cost_model(None).histogram.sum(flow=True) == len(data)
+
+    p.with_cost_model(cost_model).write(str(tmp_path / "bin_boundaries.yaml"), None)
+    with open(tmp_path / "bin_boundaries.yaml") as f:
+        written = yaml.safe_load(f)
+    assert CostModel.model_validate(written["cost_model"]) == cost_model
+    assert sorted(written["axes"]) == ["n_electrons", "n_jets"]
+
+    with pytest.raises(ValueError):
+        p.with_cost_model(CostModel(weights={"n_photons": 1.0}))
+
+
+def test_adaptive_search_warm_start(tmp_path, monkeypatch, make_counts):
+    data = make_counts(AXES, 20000, seed=3)
+    data = ak.with_field(data, np.random.default_rng(5).exponential(40.0, len(data)), "met")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        partition_module, "collect_object_counts", lambda ds_name, axes, **kwargs: data[axes]
+    )
+    ignore = [f"--ignore-axes={ax}" for ax in ("n_large_jets", "n_taus", "n_photons")]
+    runner = CliRunner()
+
+    def run(*args):
+        result = runner.invoke(
+            partition_module.app, ["partition", "ds", "--bins-per-axis", "6", *ignore, *args]
+        )
+        assert result.exit_code == 0, result.output
+        evaluated = [line for line in result.output.splitlines() if "evaluated" in line]
+        with open("bin_boundaries.yaml") as f:
+            written = yaml.safe_load(f)
+        return int(evaluated[0].split()[3]), written
+
+    cold_evaluations, cold = run("--adaptive-bins")
+    assert cold["bins_per_axis"]["met"] < 6
+    (tmp_path / "bin_boundaries.yaml").rename(tmp_path / "previous.yaml")
+    warm_evaluations, warm = run("--adaptive-start", "previous.yaml")
+    assert warm["bins_per_axis"] == cold["bins_per_axis"]
+    assert warm["axes"] == cold["axes"]
+    assert warm_evaluations < cold_evaluations
+
+    # Starting too coarse, the search adds bins back.
+    cold["bins_per_axis"] = {ax: 1 for ax in cold["axes"]}
+    with open("coarse.yaml", "w") as f:
+        yaml.safe_dump(cold, f)
+    _, grown = run("--adaptive-start", "coarse.yaml")
+    assert sum(grown["bins_per_axis"].values()) > len(cold["axes"])
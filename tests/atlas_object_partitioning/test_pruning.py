@@ -0,0 +1,184 @@
+import awkward as ak
+import numpy as np
+import pytest
+import yaml
+from typer.testing import CliRunner
+
+import atlas_object_partitioning.partition as partition_module
+import atlas_object_partitioning.partitioner as partitioner_module
+from atlas_object_partitioning.histograms import (
+    _compute_continuous_boundaries,
+    compute_bin_boundaries,
+)
+from atlas_object_partitioning.partitioner import Partitioner
+from atlas_object_partitioning.pruning import Marginal, fit_cell_budget
+
+AXES = ["n_jets", "n_taus", "n_photons", "met"]
+
+
+def test_marginal_and_budget_small_sample():
+    jets = Marginal(np.arange(8))
+    assert jets.edges(2) == [0, 4, 8] and jets.edges(4) == [0, 2, 4, 6, 8]
+    assert jets.score([0, 4, 8]) == 1.0
+    # Bin means 1.5 and 5.5 around 3.5: 4 of the variance of 5.25 is between bins.
+    assert jets.score([0, 4, 8], "variance") == pytest.approx(4 / 5.25)
+    taus = Marginal(np.array([0, 0, 0, 0, 0, 0, 0, 1]))
+    assert taus.edges(2) == [0, 1, 2]
+    assert taus.score([0, 1, 2]) == pytest.approx(-(7 / 8) * np.log2(7 / 8) + 3 / 8)
+
+    data = ak.Array({"n_jets": np.arange(8), "n_taus": [0, 0, 0, 0, 0, 0, 0, 1]})
+    budget = fit_cell_budget(data, {"n_jets": 2, "n_taus": 2}, max_cells=2)
+    assert budget.bins == {"n_jets": 2} and budget.pruned_axes == ["n_taus"]
+    assert budget.cells == 2 and budget.scores == {"n_jets": 1.0, "n_taus": 0.0}
+
+
+def test_marginal_edges_and_scores(make_counts):
+    data = make_counts(AXES, 20000, seed=7)
+    weights = np.asarray(data["n_jets"]) * 100 + 1000
+    for axis in data.fields:
+        values = ak.to_numpy(data[axis])
+        marginal = Marginal(values, weights=weights, cap=8)
+        expected = compute_bin_boundaries(
+            data,
+            ignore_axes=[ax for ax in data.fields if ax != axis],
+            bins_per_axis=4,
+            weights=weights,
+            caps={axis: 8},
+        )[axis]
+        assert marginal.edges(4) == expected
+
+    marginal = Marginal(ak.to_numpy(data["n_jets"]))
+    for score in ("entropy", "variance"):
+        values = [marginal.score(marginal.edges(n), score) for n in (1, 2, 4)]
+        assert values[0] == 0.0
+        assert values[0] < values[1] < values[2]
+    assert marginal.score(marginal.edges(20), "variance") <= 1.0
+    with pytest.raises(ValueError):
+        marginal.score(marginal.edges(2), "gini")
+
+
+def test_fit_cell_budget_prunes_flat_axes(make_counts):
+    data = make_counts(AXES, 20000, seed=7)
+    bins = {axis: 4 for axis in data.fields}
+    budget = fit_cell_budget(data, bins, max_cells=16)
+    assert budget.cells <= 16
+    assert "n_taus" in budget.pruned_axes
+    assert budget.bins["n_jets"] >= 2 and "n_jets" not in budget.pruned_axes
+    # A yes/no axis is fully resolved by two bins, so it keeps them by variance.
+    budget = fit_cell_budget(data, bins, max_cells=16, score="variance")
+    assert budget.cells <= 16
+    assert budget.scores["n_taus"] == pytest.approx(1.0)
+    assert fit_cell_budget(data, bins, max_cells=1000).bins == {
+        "n_jets": 4,
+        "n_taus": 4,
+        "n_photons": 4,
+        "met": 4,
+    }
+    with pytest.raises(ValueError):
+        fit_cell_budget(data, bins, max_cells=0)
+
+
+def test_partitioner_cell_budget_before_fill(monkeypatch, make_counts):
+    fills = []
+    real_fill = partitioner_module.build_nd_histogram
+    monkeypatch.setattr(
+        partitioner_module,
+        "build_nd_histogram",
+        lambda *args, **kwargs: fills.append(1) or real_fill(*args, **kwargs),
+    )
+    p = Partitioner(make_counts(AXES, 20000, seed=7), bins_per_axis=4)
+    budget = p.with_cell_budget(20)
+    assert fills == []
+    assert p.axes == list(budget.bins)
+    assert np.asarray(p.histogram.view()).size == budget.cells <= 20
+    assert fills == [1]
+    with pytest.raises(ValueError):
+        Partitioner(make_counts(AXES, 20000, seed=7), bins_per_axis=4).with_cell_budget(1)
+
+
+def test_partitioner_cell_budget_keeps_requested_bins(make_counts):
+    p = Partitioner(make_counts(AXES, 20000, seed=7), bins_per_axis=4)
+    full = p.boundaries
+    small = p.with_cell_budget(20)
+    assert small.pruned_axes and p.axes == list(small.bins)
+    with pytest.raises(ValueError):
+        p.with_cell_budget(1)
+    assert p.cell_budget == small
+
+    # A larger budget gives back the pruned axes and bins.
+    large = p.with_cell_budget(10_000)
+    assert large.pruned_axes == [] and p.axes == ["n_jets", "n_taus", "n_photons", "met"]
+    assert p.boundaries == full
+    assert p.with_cell_budget(None) is None and p.bins_by_axis == {ax: 4 for ax in p.axes}
+
+    # Changing the requested bins refits the budget.
+    p.with_cell_budget(20)
+    p.with_bins(6)
+    assert p.cell_budget.cells <= 20
+    assert np.asarray(p.histogram.view()).size == p.cell_budget.cells
+
+
+def test_partition_with_max_cells(tmp_path, monkeypatch, make_counts):
+    data = make_counts(AXES, 20000, seed=7)
+    for axis in ("n_electrons", "n_muons", "n_large_jets"):
+        data = ak.with_field(data, np.zeros(len(data), dtype=np.int64), axis)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        partition_module, "collect_object_counts", lambda ds_name, axes, **kwargs: data[axes]
+    )
+    result = CliRunner().invoke(
+        partition_module.app,
+        ["partition", "ds", "--bins-per-axis", "4", "--max-cells", "30"]
+        + ["--prune-score", "variance"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "pruned axes" in result.output
+    with open("bin_boundaries.yaml") as f:
+        axes = yaml.safe_load(f)["axes"]
+    assert "n_muons" not in axes and "n_jets" in axes
+    assert np.prod([len(edges) - 1 for edges in axes.values()]) <= 30
+
+
+@pytest.mark.parametrize(
+    "search",
+    [
+        ["--target-max-fraction", "0.2", "--target-bins-min", "2", "--target-bins-max", "8"],
+        ["--adaptive-bins", "--adaptive-min-fraction", "0.01"],
+    ],
+)
+def test_partition_searches_within_max_cells(tmp_path, monkeypatch, search, make_counts):
+    data = make_counts(AXES, 20000, seed=7)
+    for axis in ("n_electrons", "n_muons", "n_large_jets"):
+        data = ak.with_field(data, np.zeros(len(data), dtype=np.int64), axis)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        partition_module, "collect_object_counts", lambda ds_name, axes, **kwargs: data[axes]
+    )
+    cells = []
+    real_fill = partitioner_module.build_nd_histogram
+
+    def fill(*args, **kwargs):
+        hist = real_fill(*args, **kwargs)
+        cells.append(np.asarray(hist.view()).size)
+        return hist
+
+    monkeypatch.setattr(partitioner_module, "build_nd_histogram", fill)
+    result = CliRunner().invoke(
+        partition_module.app,
+        ["partition", "ds", "--bins-per-axis", "8", "--max-cells", "30"] + search,
+    )
+    assert result.exit_code == 0, result.output
+    assert cells and max(cells) <= 30
+
+
+def test_marginal_continuous_edges_from_sample():
+    rng = np.random.default_rng(6)
+    values = rng.exponential(40.0, 50000).astype(np.float32)
+    weights = rng.integers(1, 5, len(values))
+    for kwargs in ({}, {"weights": weights}, {"cap": 90.0}, {"weights": weights, "cap": 90.0}):
+        marginal = Marginal(values, sample_size=2000, **kwargs)
+        assert len(marginal.support) == 2000
+        for n_bins in (1, 3, 8):
+            assert marginal.edges(n_bins) == _compute_continuous_boundaries(
+                values, n_bins, sample_size=2000, **kwargs
+            )
@@ -0,0 +1,109 @@
+import awkward as ak
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import uproot
+
+import atlas_object_partitioning.scan_ds as scan_ds
+from atlas_object_partitioning.chunked import ChunkedCounts
+from atlas_object_partitioning.local_mode import output_file_name
+from atlas_object_partitioning.scan_ds import (
+    ALL_AXES,
+    add_provenance,
+    build_count_query_lambda,
+    select_axes,
+)
+
+
+def test_select_axes_drops_ignored():
+    axes = select_axes(["met", "n_taus"])
+    assert "met" not in axes
+    assert "n_taus" not in axes
+    assert axes == [ax for ax in ALL_AXES if ax not in ("met", "n_taus")]
+
+
+def test_select_axes_unknown():
+    with pytest.raises(ValueError):
+        select_axes(["n_gluons"])
+
+
+def test_build_count_query_lambda_projects_columns():
+    query = build_count_query_lambda(["n_muons", "n_jets"])
+    assert "MissingET" not in query
+    assert "Electrons" not in query
+    assert query.index("'n_jets'") < query.index("'n_muons'")
+
+
+def test_build_count_query_lambda_canonical_order():
+    assert build_count_query_lambda(["n_muons", "n_jets"]) == build_count_query_lambda(
+        ["n_jets", "n_muons"]
+    )
+
+
+def test_build_count_query_lambda_empty():
+    with pytest.raises(ValueError):
+        build_count_query_lambda([])
+
+
+def test_build_count_query_lambda_event_ids():
+    query = build_count_query_lambda(["n_jets"], with_event_ids=True)
+    assert "'run_number': e.EventInfo('EventInfo').runNumber()" in query
+    assert query.index("'n_jets'") < query.index("'event_number'")
+    assert "EventInfo" not in build_count_query_lambda(["n_jets"])
+
+
+def test_add_provenance():
+    counts = add_provenance([ak.Array({"n_jets": [1, 2, 3]}), ak.Array({"n_jets": [4]})])
+    assert counts.fields == ["n_jets", "file_index", "entry"]
+    assert counts["file_index"].tolist() == [0, 0, 0, 1]
+    assert counts["entry"].tolist() == [0, 1, 2, 0]
+
+
+def test_provenance_refers_to_input_files(tmp_path, monkeypatch):
+    inputs = [tmp_path / "physlite" / name for name in ("a.pool.root.1", "b.pool.root.1")]
+    inputs[0].parent.mkdir()
+    delivered = []
+    for i, path in enumerate(inputs):
+        with uproot.recreate(path) as f:
+            f["CollectionTree"] = {"EventInfoAuxDyn.eventNumber": np.arange(3 + i)}
+        output = tmp_path / "cache" / f"{output_file_name(str(path))}.parquet"
+        output.parent.mkdir(exist_ok=True)
+        pq.write_table(pa.table({"n_jets": np.arange(3 + i)}), output)
+        delivered.append(str(output))
+    monkeypatch.setattr(scan_ds, "deliver_object_counts", lambda *args, **kwargs: delivered)
+    counts, files, exact = scan_ds.collect_object_counts_with_provenance(
+        str(inputs[0].parent), axes=["n_jets"]
+    )
+    assert files == [str(path) for path in inputs] and exact
+    assert counts["file_index"].tolist() == [0, 0, 0, 1, 1, 1, 1]
+
+
+def test_check_entries(tmp_path):
+    path = str(tmp_path / "a.pool.root.1")
+    with uproot.recreate(path) as f:
+        f["CollectionTree"] = {"EventInfoAuxDyn.eventNumber": np.arange(3)}
+    assert scan_ds.check_entries([ak.Array({"n_jets": [1, 2, 3]})], [path])
+    # Inputs that are not local cannot be checked.
+    assert not scan_ds.check_entries(
+        [ak.Array({"n_jets": [1, 2, 3]}), ak.Array({"n_jets": [4]})],
+        [path, "mc23_13p6TeV:DAOD_PHYSLITE.pool.root.1"],
+    )
+    with pytest.raises(ValueError, match="not entries"):
+        scan_ds.check_entries([ak.Array({"n_jets": [1, 2]})], [path])
+
+
+def test_sketches_are_streamed_from_delivered_files(tmp_path, monkeypatch):
+    delivered = []
+    for i in range(2):
+        path = tmp_path / f"counts_{i}.parquet"
+        pq.write_table(pa.table({"n_jets": np.arange(4) + i, "met": np.arange(4) * 1.5}), path)
+        delivered.append(str(path))
+    monkeypatch.setattr(scan_ds, "deliver_object_counts", lambda *args, **kwargs: delivered)
+    counts, sketches = scan_ds.collect_object_counts_with_sketches(
+        "ds", axes=["n_jets", "met"], step_size=3, workers=1
+    )
+    assert isinstance(counts, ChunkedCounts)
+    assert counts.paths == delivered and counts.fields == ["n_jets", "met"]
+    assert sketches["n_jets"].counts == {0: 1, 1: 2, 2: 2, 3: 2, 4: 1}  # type: ignore
+    assert sketches["met"].n == 8
@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+from hist import Hist
+
+from atlas_object_partitioning.histograms import (
+    MergedCells,
+    histogram_boundaries,
+    merge_sparse_cells,
+    write_bin_boundaries_yaml,
+    write_histogram_pickle,
+)
+from atlas_object_partitioning.service import (
+    LoadedPartition,
+    PartitionService,
+    create_server,
+)
+
+
+def _write_partition(tmp_path, counts):
+    hist = (
+        Hist.new.Var([0, 1, 3], name="n_electrons", label="n_electrons")
+        .Var([0, 2, 4], name="n_muons", label="n_muons")
+        .Int64()
+    )
+    hist[...] = np.array(counts)
+    groups, _ = merge_sparse_cells(hist, min_fraction=0.0)
+    boundaries_file = tmp_path / "bin_boundaries.yaml"
+    write_bin_boundaries_yaml(
+        histogram_boundaries(hist),
+        str(boundaries_file),
+        merged_cells=MergedCells(min_fraction=0.0, groups=groups),
+    )
+    histogram_file = tmp_path / "histogram.pkl"
+    write_histogram_pickle(hist, str(histogram_file))
+    return str(boundaries_file), str(histogram_file)
+
+
+def test_service_queries(tmp_path):
+    boundaries_file, histogram_file = _write_partition(tmp_path, [[40, 0], [30, 30]])
+    service = PartitionService(
+        [LoadedPartition("p", boundaries_file, histogram_file=histogram_file)]
+    )
+    assert service.usage(None, {"n_electrons": 1})["usage_fraction"] == pytest.approx(0.6)
+    lookup = service.lookup("p", {"n_electrons": 2, "n_muons": 3})
+    assert lookup["cell"] == {"n_electrons": 1, "n_muons": 1}
+    assert lookup["count"] == 30
+    assert service.lookup("p", {"n_electrons": 5, "n_muons": 0})["group"] is None
+    summary = service.summary("p")
+    assert summary["groups"] == 4
+    assert summary["total_count"] == 100
+    rebin = service.rebin("p", None, 1, 0.35)
+    assert rebin["groups"] < 4
+    with pytest.raises(ValueError):
+        service.usage("p", {"n_jets": 1})
+    with pytest.raises(KeyError):
+        service.summary("missing")
+
+
+def test_service_hot_reload(tmp_path):
+    boundaries_file, _ = _write_partition(tmp_path, [[40, 0], [30, 30]])
+    service = PartitionService([LoadedPartition("p", boundaries_file)])
+    assert service.summary("p")["total_count"] == 100
+    _write_partition(tmp_path, [[10, 0], [5, 5]])
+    stat = os.stat(boundaries_file)
+    os.utime(boundaries_file, (stat.st_atime, stat.st_mtime + 10))
+    assert service.summary("p")["total_count"] == 20
+
+
+def test_service_keeps_partition_on_failed_reload(tmp_path):
+    boundaries_file, _ = _write_partition(tmp_path, [[40, 0], [30, 30]])
+    service = PartitionService([LoadedPartition("p", boundaries_file)])
+    assert service.summary("p")["total_count"] == 100
+    with open(boundaries_file, "w") as f:
+        f.write("axes: [unterminated\n")
+    stat = os.stat(boundaries_file)
+    os.utime(boundaries_file, (stat.st_atime, stat.st_mtime + 10))
+    assert service.summary("p")["total_count"] == 100
+    os.remove(boundaries_file)
+    assert service.summary("p")["total_count"] == 100
+    # Once the file is whole again it is picked up.
+    _write_partition(tmp_path, [[10, 0], [5, 5]])
+    assert service.summary("p")["total_count"] == 20
+
+
+def test_service_http(tmp_path):
+    boundaries_file, _ = _write_partition(tmp_path, [[40, 0], [30, 30]])
+    service = PartitionService([LoadedPartition("p", boundaries_file)])
+    server = create_server(service, port=0)
+    port = server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{port}/usage?partition=p&n_electrons=1"
+        with urllib.request.urlopen(url) as response:
+            body = json.loads(response.read())
+        assert body["usage_fraction"] == pytest.approx(0.6)
+        assert body["latency_ms"] >= 0.0
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as response:
+            stats = json.loads(response.read())
+        assert stats["/usage"]["count"] == 1
+
+        def broken(name):
+            raise RuntimeError("boom")
+
+        service.summary = broken
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/summary")
+        assert excinfo.value.code == 500
+        assert "boom" in json.loads(excinfo.value.read())["error"]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as response:
+            assert json.loads(response.read())["/summary"]["count"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,104 @@
+import awkward as ak
+import numpy as np
+import pytest
+
+from atlas_object_partitioning.histograms import apply_tail_caps, compute_bin_boundaries
+from atlas_object_partitioning.sketches import (
+    KLLSketch,
+    ValueCountSketch,
+    build_sketches,
+    cap_sketches,
+    compute_bin_boundaries_from_sketches,
+    load_sketches_yaml,
+    merge_sketches,
+    tail_caps_from_sketches,
+    write_sketches_yaml,
+)
+
+AXES = ["n_jets", "n_muons", "met"]
+MET = ("exponential", (30.0,))
+
+
+def test_sketch_boundaries_small_sample():
+    counts = ValueCountSketch().update(np.array([0, 0, 1, 1, 1, 2, 5, 5]))
+    assert counts.counts == {0: 2, 1: 3, 2: 1, 5: 2}
+    assert counts.boundaries(2) == [0, 2, 6]
+    assert counts.boundaries(4) == [0, 1, 2, 3, 6]
+    # Fewer values than k: the KLL sketch keeps them all and its edges are exact.
+    kll = KLLSketch().update(np.array([3.0, 1.0, 4.0, 1.5, 5.0, 9.0, 2.0, 6.0]))
+    top = float(np.nextafter(9.0, np.inf))
+    assert kll.boundaries(2) == [1.0, 4.0, top]
+    assert kll.boundaries(4) == [1.0, 2.0, 4.0, 6.0, top]
+
+
+def test_value_count_sketch_matches_full_data(make_counts):
+    data = make_counts(AXES, met=MET, seed=1)
+    sketches = build_sketches(data)
+    assert isinstance(sketches["n_jets"], ValueCountSketch)
+    assert isinstance(sketches["met"], KLLSketch)
+    full = compute_bin_boundaries(data, ignore_axes=["met"], bins_per_axis=4)
+    from_sketch = compute_bin_boundaries_from_sketches(
+        sketches, ignore_axes=["met"], bins_per_axis=4
+    )
+    assert from_sketch == full
+
+
+def test_value_count_sketch_quantile_matches_numpy():
+    values = np.random.default_rng(2).poisson(3.0, size=1001)
+    sketch = ValueCountSketch().update(values)
+    for q in (0.0, 0.1, 0.5, 0.95, 0.98, 1.0):
+        assert sketch.quantile(q) == pytest.approx(np.quantile(values, q))
+
+
+def test_merged_sketches_equal_single_pass(make_counts):
+    parts = [make_counts(AXES, met=MET, seed=seed) for seed in range(4)]
+    merged = merge_sketches(build_sketches(part) for part in parts)
+    whole = build_sketches(ak.concatenate(parts))
+    assert merged["n_jets"].counts == whole["n_jets"].counts  # type: ignore
+    assert merged["met"].n == whole["met"].n
+    assert merged["met"].minimum() == whole["met"].minimum()
+    assert merged["met"].maximum() == whole["met"].maximum()
+
+
+def test_kll_sketch_bounded_and_accurate():
+    values = np.random.default_rng(3).exponential(30.0, size=200_000)
+    sketch = KLLSketch(k=200).update(values)
+    assert sum(len(level) for level in sketch.levels) < 2000
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        rank = np.searchsorted(np.sort(values), sketch.quantile(q)) / len(values)
+        assert rank == pytest.approx(q, abs=0.02)
+
+
+def test_kll_boundaries_cover_range():
+    values = np.random.default_rng(4).exponential(30.0, size=10000)
+    edges = KLLSketch().update(values).boundaries(4)
+    assert len(edges) == 5
+    assert edges[0] == values.min()
+    assert edges[-1] > values.max()
+
+
+def test_tail_caps_from_sketches_match_data(make_counts):
+    data = make_counts(AXES, met=MET, seed=5)
+    sketches = build_sketches(data)
+    caps = tail_caps_from_sketches(sketches, ignore_axes=["met"], tail_cap_quantile=0.9)
+    _, data_caps = apply_tail_caps(data, ignore_axes=["met"], tail_cap_quantile=0.9)
+    assert caps == data_caps
+    capped = cap_sketches(sketches, caps)
+    assert capped["n_jets"].maximum() == caps["n_jets"]
+    assert capped["n_jets"].n == len(data)
+
+
+def test_sketches_yaml_roundtrip(tmp_path, make_counts):
+    sketches = build_sketches(make_counts(AXES, met=MET, seed=6))
+    path = tmp_path / "axis_sketches.yaml"
+    write_sketches_yaml(sketches, str(path))
+    loaded = load_sketches_yaml(str(path))
+    assert loaded["n_jets"].counts == sketches["n_jets"].counts  # type: ignore
+    assert loaded["met"].boundaries(3) == sketches["met"].boundaries(3)
+
+
+def test_merge_sketches_axis_mismatch():
+    a = build_sketches(ak.Array({"n_jets": [1, 2]}))
+    b = build_sketches(ak.Array({"n_muons": [1, 2]}))
+    with pytest.raises(ValueError):
+        merge_sketches([a, b])
@@ -0,0 +1,105 @@
+import awkward as ak
+import numpy as np
+import pytest
+import yaml
+from typer.testing import CliRunner
+
+import atlas_object_partitioning.partition as partition_module
+from atlas_object_partitioning.assign import PartitionAssigner
+from atlas_object_partitioning.histograms import compute_bin_boundaries
+from atlas_object_partitioning.partitioner import Partitioner
+from atlas_object_partitioning.stability import (
+    bootstrap_stability,
+    deduplicate,
+    replicate_edges,
+)
+
+AXES = ["n_jets", "n_muons", "met"]
+MUONS = ("poisson", (0.7,))
+
+
+def test_stability_small_sample():
+    rows, multiplicity = deduplicate({"n_jets": np.array([2, 1, 2, 1, 3])})
+    assert rows["n_jets"].tolist() == [1, 2, 3] and multiplicity.tolist() == [2, 2, 1]
+    # Half of the first replicate is below 2, half of the second below 4.
+    weights = np.array([[1.0, 1.0, 1.0, 1.0], [1.0, 0.0, 0.0, 3.0]])
+    edges = replicate_edges(np.arange(4), weights, 2, continuous=False)
+    assert edges.tolist() == [[2.0], [4.0]]
+
+    data = ak.Array({"n_jets": [0, 0, 1, 1, 1, 1, 2, 2]})
+    assigner = PartitionAssigner({"n_jets": [0, 2, 3]}, [])
+    report = bootstrap_stability(data, assigner, {"n_jets": 2}, n_replicates=50)
+    assert report.n_events == 8 and report.n_distinct == 3
+    assert [interval.fraction for interval in report.fractions] == [0.75, 0.25]
+    assert report.boundaries["n_jets"][0].edge == 2.0
+
+
+def test_replicate_edges_match_boundaries(make_counts):
+    data = make_counts(AXES, 20000, seed=9, n_muons=MUONS)
+    rows, multiplicity = deduplicate({"n_jets": ak.to_numpy(data["n_jets"])})
+    assert multiplicity.sum() == len(data)
+    weights = np.stack([multiplicity, multiplicity * 2]).astype(float)
+    edges = replicate_edges(rows["n_jets"], weights, 4, continuous=False)
+    expected = compute_bin_boundaries(data, ignore_axes=["n_muons", "met"], bins_per_axis=4)
+    assert edges.shape == (2, 3)
+    assert list(edges[0]) == list(edges[1]) == expected["n_jets"][1:-1]
+
+
+def test_bootstrap_stability(make_counts):
+    data = make_counts(AXES, 20000, seed=9, n_muons=MUONS)
+    p = Partitioner(data, bins_per_axis=3, merge_cell_min_fraction=0.03)
+    assigner = PartitionAssigner(p.boundaries, p.merged_groups)
+    report = bootstrap_stability(
+        data, assigner, p.requested_bins, n_replicates=300, confidence=0.9
+    )
+    assert report.n_events == 20000 and report.n_replicates == 300
+    assert report.fractions_of == "groups"
+    assert len(report.fractions) == len(p.merged_groups)
+    for interval, group in zip(report.fractions, p.merged_groups):
+        assert interval.fraction == pytest.approx(group.fraction, abs=1e-9)
+        assert interval.low <= interval.fraction <= interval.high
+    assert set(report.boundaries) == {"n_jets", "n_muons", "met"}
+    assert [edge.edge for edge in report.boundaries["n_jets"]] == p.boundaries["n_jets"][1:-1]
+    assert all(0.0 <= edge.flip_probability <= 1.0 for edge in report.boundaries["met"])
+
+    # Fewer events give wider intervals.
+    small = bootstrap_stability(
+        make_counts(AXES, 500, seed=9, n_muons=MUONS), assigner, p.requested_bins, n_replicates=300
+    )
+    assert max(f.high - f.low for f in small.fractions) > max(
+        f.high - f.low for f in report.fractions
+    )
+    cells = bootstrap_stability(
+        data, PartitionAssigner(p.boundaries, []), p.requested_bins, n_replicates=10
+    )
+    assert cells.fractions_of == "cells" and len(cells.fractions) == 27
+    with pytest.raises(ValueError):
+        bootstrap_stability(data, assigner, p.requested_bins, n_replicates=0)
+
+
+def test_stability_command(tmp_path, monkeypatch, make_counts):
+    data = make_counts(AXES, 20000, seed=9, n_muons=MUONS)
+    for axis in ("n_electrons", "n_large_jets", "n_taus", "n_photons"):
+        data = ak.with_field(data, np.zeros(len(data), dtype=np.int64), axis)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        partition_module, "collect_object_counts", lambda ds_name, axes, **kwargs: data[axes]
+    )
+    runner = CliRunner()
+    result = runner.invoke(
+        partition_module.app,
+        ["partition", "ds", "--bins-per-axis", "3", "--merge-cell-min-fraction", "0.02"]
+        + ["--output", "counts.parquet"],
+    )
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(
+        partition_module.app,
+        ["stability", "bin_boundaries.yaml", "counts.parquet", "--replicates", "100"]
+        + ["-o", "stability.yaml"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "Bootstrapped 100 replicates of 20,000 events" in result.output
+    with open("stability.yaml") as f:
+        report = yaml.safe_load(f)
+    assert report["fractions_of"] == "groups"
+    assert "n_jets" in report["boundaries"]